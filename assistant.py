@@ -1,61 +1,223 @@
+import asyncio
 import logging
-import sqlite3
-from ete4 import NCBITaxa
-import json
-import pandas as pd
-import re
-from Bio import Entrez
-from aws_handler import AwsHandler
-from utils import is_null, set_prompt_text
-from constants import DEFAULT_EMAIL, OLD_REPORTS_PATH, DATA_PATH, ACRONYMS_PATH
+import os
+import threading
+import time
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from entrez_client import EntrezClient
+from exemplar_index import ExemplarIndex
+from genome_cache import GenomeSizeCache
+from knowledge_base import KnowledgeBase, load_knowledge_base
+from name_index import (
+    NameIndex,
+    NameMatch,
+    load_or_build_name_index,
+    restamp_name_index,
+)
+from relative_index import (
+    RelativeIndex,
+    load_or_build_relative_index,
+    restamp_relative_index,
+)
+from report_store import ReportStore, StoredReport
+from taxdump import TaxonomyChanges
+from taxonomy_db import DEFAULT_TAXONOMY_DB, TaxonomyDB
+from tracing import count, span
+from utils import LRUCache, is_null, set_prompt_text
+from constants import (
+    KNOWLEDGE_BASE_PATH,
+    LOOKUP_CACHE_SIZE,
+    NAME_INDEX_PATH,
+    RELATIVE_INDEX_PATH,
+    GENOME_CACHE_PATH,
+    ENRICHMENT_WORKERS,
+    EXEMPLAR_SEED,
+    EXEMPLAR_TOKEN_BUDGET,
+)
 
-Entrez.email = DEFAULT_EMAIL
+# Default of cache lookups, telling a cached miss (None) from no entry
+_MISSING = object()
+
+
+def NCBITaxa(dbfile: str | None = None):
+    """
+    Open the local NCBI taxonomy database (ete's default one unless dbfile
+    is given). ete4 is imported here because importing it takes over a second.
+    """
+    from ete4 import NCBITaxa
+
+    return NCBITaxa(dbfile=dbfile)
+
+
+def _failed_report(tax_id: str | int, language: str, error: Exception) -> str:
+    logging.error(f"Report of TaxID {tax_id} in {language} failed: {error}")
+    return f"Error: {error}"
 
 
 class MetagenomicsAssistant:
-    def __init__(self, llm_handler):
-        self.ncbi = NCBITaxa()
+    """
+    Assemble organism knowledge and generate reports.
+    The knowledge base, the taxonomy database and the Entrez client are
+    loaded on first access, so building an assistant is cheap.
+    """
+
+    def __init__(
+        self,
+        llm_handler,
+        genome_cache: GenomeSizeCache | None = None,
+        offline: bool = False,
+        entrez: EntrezClient | None = None,
+        kb: KnowledgeBase | None = None,
+        taxonomy_db: str | None = None,
+        relative_index_path: str = RELATIVE_INDEX_PATH,
+        name_index_path: str = NAME_INDEX_PATH,
+        exemplar_budget: int = EXEMPLAR_TOKEN_BUDGET,
+        exemplar_seed: int = EXEMPLAR_SEED,
+        report_store: ReportStore | None = None,
+    ):
+        self._local = threading.local()
         self.llm_handler = llm_handler
-        self.df_text = pd.read_pickle(OLD_REPORTS_PATH)
-        self.df_data = pd.read_csv(DATA_PATH)
-        self.df_acronym = pd.read_csv(ACRONYMS_PATH)
+        self.genome_cache = genome_cache or GenomeSizeCache(GENOME_CACHE_PATH)
+        self.offline = offline
+        self.taxonomy_db = taxonomy_db
+        self.relative_index_path = relative_index_path
+        self.name_index_path = name_index_path
+        self.exemplar_budget = exemplar_budget
+        self.exemplar_seed = exemplar_seed
+        self.report_store = report_store
+        if entrez is not None:
+            self.entrez = entrez
+        if kb is not None:
+            self.kb = kb
+
+        self._kb_lock = threading.Lock()
+        self._row_cache = {
+            "data": LRUCache(LOOKUP_CACHE_SIZE),
+            "acronyms": LRUCache(LOOKUP_CACHE_SIZE),
+        }
+        self._relative_index = None
+        self._relative_index_lock = threading.Lock()
+        self._name_index = None
+        self._name_index_lock = threading.Lock()
 
-        self.df_data["TaxID"] = self.df_data["TaxID"].astype(str)
-        self.df_acronym["TaxID"] = self.df_acronym["TaxID"].astype(str)
+    @cached_property
+    def kb(self) -> KnowledgeBase:
+        """
+        Compiled knowledge base (old reports and curated CSVs). Threads
+        asking for it at once wait for a single build.
+        """
+        with self._kb_lock:
+            if "kb" in self.__dict__:
+                return self.__dict__["kb"]
+            return load_knowledge_base(KNOWLEDGE_BASE_PATH)
 
-    def set_text_to_prompt(self) -> list[str]:
+    @cached_property
+    def exemplar_index(self) -> ExemplarIndex:
         """
-        Return 2 random texts from 'treated_clean_final.csv'
+        TF-IDF index of the old reports, built once on first use
         """
-        text_to_prompt = self.df_text["content"].sample(n=2).to_list()
+        with span("exemplars:build_index"):
+            return ExemplarIndex(self.kb.reports())
+
+    @cached_property
+    def entrez(self) -> EntrezClient:
+        return EntrezClient()
+
+    @cached_property
+    def _enrichment_pool(self) -> ThreadPoolExecutor:
+        """
+        Threads running network-bound lookups next to the local ones
+        """
+        return ThreadPoolExecutor(
+            max_workers=ENRICHMENT_WORKERS, thread_name_prefix="enrichment"
+        )
+
+    @property
+    def taxonomy_path(self) -> str:
+        return self.taxonomy_db or DEFAULT_TAXONOMY_DB
+
+    @cached_property
+    def taxonomy(self) -> TaxonomyDB:
+        """
+        Read-only taxonomy database shared by all threads, each with its own
+        connection. ete4 is only loaded when the database is still missing
+        and has to be downloaded.
+        """
+        dbfile = self.taxonomy_path
+        if not os.path.exists(dbfile):
+            dbfile = self.ncbi.dbfile
+        with span("taxonomy:open"):
+            return TaxonomyDB(dbfile)
+
+    @property
+    def ncbi(self):
+        """
+        NCBITaxa connection for the current thread, used to download and
+        update the taxonomy database. Reads go through self.taxonomy.
+        """
+        ncbi = getattr(self._local, "ncbi", None)
+        if ncbi is None:
+            with span("taxonomy:open"):
+                ncbi = self._local.ncbi = NCBITaxa(dbfile=self.taxonomy_db)
+        return ncbi
+
+    def set_text_to_prompt(
+        self,
+        organism_info: dict | None = None,
+        tax_id: str | int | None = None,
+        language: str | None = None,
+    ) -> list[str]:
+        """
+        Return the old reports closest to the organism (same organism, genus
+        or family first) that fit in the exemplar token budget
+        """
+        text_to_prompt = self.exemplar_index.select(
+            organism_info,
+            tax_id=tax_id,
+            language=language,
+            budget_tokens=self.exemplar_budget,
+            seed=self.exemplar_seed,
+        )
         return text_to_prompt
 
-    def get_organism_rank(self, tax_id: str | int, rank: str) -> str | None:
+    def get_organism_ranks(
+        self, tax_id: str | int, ranks: tuple[str, ...] = ("family", "genus")
+    ) -> dict[str, str | None]:
         """
-        Get family or genus of organism by TaxID
+        Get several ranks (family, genus...) of organism by TaxID
+        from a single lineage fetch
         """
         try:
-            organism_lineage = self.ncbi.get_lineage(tax_id)
-            organism_ranks = self.ncbi.get_rank(organism_lineage)
-            organism_names = self.ncbi.get_taxid_translator(organism_lineage)
+            with span("taxonomy:lineage"):
+                organism_lineage = self.taxonomy.get_lineage(tax_id)
+                organism_ranks = self.taxonomy.get_ranks(organism_lineage)
+                organism_names = self.taxonomy.get_names(organism_lineage)
 
+            found = dict.fromkeys(ranks)
             for taxon_id in organism_lineage:
-                if organism_ranks.get(taxon_id) == rank:
-                    return organism_names.get(taxon_id)
-            return None
+                rank = organism_ranks.get(taxon_id)
+                if rank in found and found[rank] is None:
+                    found[rank] = organism_names.get(taxon_id)
+            return found
         except Exception as e:
-            print(f"Erro ao obter rank {rank} para TaxID {tax_id}: {e}")
-            logging.error(f"Error getting rank {rank} for TaxID {tax_id}: {e}")
-            return None
+            print(f"Erro ao obter ranks {ranks} para TaxID {tax_id}: {e}")
+            logging.error(f"Error getting ranks {ranks} for TaxID {tax_id}: {e}")
+            return dict.fromkeys(ranks)
+
+    def get_organism_rank(self, tax_id: str | int, rank: str) -> str | None:
+        """
+        Get family or genus of organism by TaxID
+        """
+        return self.get_organism_ranks(tax_id, (rank,))[rank]
 
     def get_organism_name(self, tax_id: str | int) -> str:
         """
         Get only organism name from dict
         """
         try:
-            tax_id_int = int(tax_id) if isinstance(tax_id, str) else tax_id
-            taxid_dict = self.ncbi.get_taxid_translator([tax_id_int])
-            return taxid_dict.get(tax_id_int, "")
+            return self.taxonomy.get_names([tax_id]).get(int(tax_id), "")
         except Exception as e:
             print(f"Error when catching organism name for {tax_id}: {e}")
             logging.error(f"Error when catching organism name for {tax_id}: {e}")
@@ -63,168 +225,388 @@ class MetagenomicsAssistant:
 
     def get_organism_tax_id(self, organism_name: str) -> str:
         """
-        Get TaxID from organism name
+        Get TaxID from organism name: the exact NCBI name first, then the
+        closest name in the name index
         """
         try:
-            name_dict = self.ncbi.get_name_translator([organism_name])
-            if organism_name in name_dict:
-                taxids = name_dict[organism_name]
-                return taxids[0] if taxids else ""
-            return ""
+            taxids = self.taxonomy.get_taxids([organism_name]).get(organism_name)
+            if taxids:
+                return taxids[0]
         except Exception as e:
             print(f"Error when catching TaxID for {organism_name}: {e}")
             logging.error(f"Error when catching TaxID for {organism_name}: {e}")
-            return ""
 
-    def _get_data_with_fallback(
-        self, tax_id: str | int, dataframe: pd.DataFrame, column_name: str
-    ) -> str | None:
+        match = self.match_organism_name(organism_name)
+        return int(match.tax_id) if match else ""
+
+    def match_organism_name(self, organism_name: str) -> NameMatch | None:
         """
-        Helper to get data with fallback strategies:
-        1. Direct lookup
-        2. Merged IDs (reverse lookup in ete3 sqlite)
-        3. Descendants lookup
+        Closest organism name in the name index (case, punctuation and
+        spelling differences allowed)
         """
+        index = self.name_index
+        if index is None:
+            return None
+        with span("name_index:resolve"):
+            match = index.resolve(organism_name)
+        if match is None:
+            count("name_index.not_found")
+        elif match.name != organism_name:
+            count(f"name_index.{match.match}")
+            print(
+                f"Using '{match.name}' (TaxID {match.tax_id}, {match.match} match, "
+                f"score {match.score:.2f}) for '{organism_name}'"
+            )
+        return match
+
+    def resolve_organism_names(self, organism_names: list[str]) -> dict[str, int]:
+        """
+        TaxIDs of many organism names at once, for batch inputs.
+        Names that could not be resolved are left out.
+        """
+        names = [name for name in dict.fromkeys(organism_names) if name]
+        resolved = {}
         try:
-            # 1. Direct Lookup
-            tax_id_str = str(tax_id)
-            result = dataframe.loc[dataframe["TaxID"] == tax_id_str, column_name]
-            if not result.empty:
-                value = result.values[0]
-                return value if not is_null(value) else None
-
-            # If not found, prepare candidates
-            candidates = set()
-
-            # 2. Merged Check (Reverse lookup: finding old IDs merged INTO this tax_id)
-            # We need to query the internal sqlite db of ete3
-            try:
-                db_path = self.ncbi.dbfile
-                if db_path:
-                    # We create a new connection to be safe with threading/handling
-                    with sqlite3.connect(db_path) as conn:
-                        cursor = conn.cursor()
-                        cursor.execute(
-                            "SELECT taxid_old FROM merged WHERE taxid_new = ?",
-                            (int(tax_id),),
-                        )
-                        merged_rows = cursor.fetchall()
-                        for row in merged_rows:
-                            candidates.add(str(row[0]))
-            except Exception as e:
-                logging.warning(f"Failed to query merged table for {tax_id}: {e}")
-
-            # 3. Descendants Check
-            # Check if any descendant is in the CSV
-            try:
-                # 3a. Direct Children via SQL (Reliable for 'no rank' nodes)
-                if db_path:
-                    with sqlite3.connect(db_path) as conn:
-                        cursor = conn.cursor()
-                        cursor.execute(
-                            "SELECT taxid FROM species WHERE parent = ?", (int(tax_id),)
-                        )
-                        children = cursor.fetchall()
-                        for child in children:
-                            candidates.add(str(child[0]))
-
-                # 3b. Deep Descendants via ete3
-                descendants = self.ncbi.get_descendant_taxa(tax_id)
-                # Limit to reasonable number to avoid query explosion if high up in tree
-                # But for a species/genus it should be fine.
-                for desc_id in descendants:
-                    candidates.add(str(desc_id))
-            except Exception as e:
-                logging.warning(f"Failed to get descendants for {tax_id}: {e}")
-
-            if not candidates:
-                return None
-
-            # 4. Check candidates in Dataframe
-            # We filter the dataframe for TaxIDs in candidates
-            matches = dataframe[dataframe["TaxID"].isin(list(candidates))]
-            if not matches.empty:
-                # We return the first match.
-                # Ideally we might want the "closest", but any match is better than none.
-                value = matches.iloc[0][column_name]
-                return value if not is_null(value) else None
+            translated = self.taxonomy.get_taxids(names)
+            for name in names:
+                if translated.get(name):
+                    resolved[name] = translated[name][0]
+        except Exception as e:
+            logging.error(f"Error translating organism names: {e}")
+
+        missing = [name for name in names if name not in resolved]
+        index = self.name_index if missing else None
+        if index is not None:
+            with span("name_index:resolve_many", names=len(missing)):
+                matches = index.resolve_many(missing)
+            for name, match in matches.items():
+                if match:
+                    count(f"name_index.{match.match}")
+                    resolved[name] = int(match.tax_id)
+        return resolved
+
+    @property
+    def name_index(self) -> NameIndex | None:
+        """
+        Organism name index, opened (or built) on first use
+        """
+        with self._name_index_lock:
+            if self._name_index is None:
+                try:
+                    self._name_index = self.build_name_index()
+                except Exception as e:
+                    logging.warning(f"Name index unavailable: {e}")
+                    return None
+            return self._name_index
+
+    def build_name_index(self, rebuild: bool = False) -> NameIndex:
+        """
+        Open or build the index of the NCBI names and the organism names
+        of the curated tables
+        """
+        self._name_index = load_or_build_name_index(
+            self.name_index_path,
+            self.taxonomy.dbfile,
+            self.kb.curated_names(),
+            rebuild,
+        )
+        return self._name_index
+
+    @property
+    def relative_index(self) -> RelativeIndex | None:
+        """
+        Nearest-annotated-relative index, loaded (or built) on first use
+        """
+        with self._relative_index_lock:
+            if self._relative_index is None:
+                try:
+                    self._relative_index = self.build_relative_index()
+                except Exception as e:
+                    logging.warning(f"Relative index unavailable: {e}")
+                    return None
+            return self._relative_index
+
+    def build_relative_index(self, rebuild: bool = False) -> RelativeIndex:
+        """
+        Load or build the index mapping taxonomy nodes to their nearest
+        TaxID in 'data_for_biojarvis.csv' / 'acronyms.csv'
+        """
+        annotated = {
+            table: [
+                tax_id
+                for tax_id in self.kb.annotated_tax_ids(table)
+                if tax_id.isdigit()
+            ]
+            for table in ("data", "acronyms")
+        }
+        self._relative_index = load_or_build_relative_index(
+            self.relative_index_path, self.taxonomy.dbfile, annotated, rebuild=rebuild
+        )
+        return self._relative_index
+
+    def refresh_after_taxonomy_update(
+        self, changes: TaxonomyChanges | None = None
+    ) -> dict[str, str | int]:
+        """
+        Bring what was derived from the taxonomy database up to date.
+        Indexes are rebuilt only when what they depend on changed (always
+        when changes is unknown); cached genome sizes and stored reports of
+        the TaxIDs whose name, rank or lineage changed are dropped, along
+        with the stored reports below a renamed node, which name it. When
+        changes is unknown, every cached size and stored report is dropped.
+        """
+        # a full rebuild replaces the file under any open connection, and
+        # kept indexes are reloaded with their new signature on next use
+        if "taxonomy" in self.__dict__:
+            self.__dict__.pop("taxonomy").close()
+        self._relative_index = self._name_index = None
+        for cache in self._row_cache.values():
+            cache.clear()
+
+        dbfile = self.taxonomy_path
+        outcome = {}
+        if changes is None or changes.structure_changed:
+            self.build_relative_index(rebuild=True)
+            outcome["relative index"] = "rebuilt"
+        elif restamp_relative_index(
+            self.relative_index_path, dbfile, changes.previous_signature
+        ):
+            outcome["relative index"] = "kept"
+
+        if changes is None or changes.names_changed:
+            self.build_name_index(rebuild=True)
+            outcome["name index"] = "rebuilt"
+        elif restamp_name_index(
+            self.name_index_path, dbfile, changes.previous_signature
+        ):
+            outcome["name index"] = "kept"
 
+        if changes is None:
+            # nothing says which organisms changed, so none can be trusted
+            outcome["cached genome sizes dropped"] = self.genome_cache.clear()
+            if self.report_store is not None:
+                outcome["stored reports dropped"] = self.report_store.clear()
+            return outcome
+        affected = changes.affected_tax_ids
+        if affected:
+            outcome["cached genome sizes dropped"] = self.genome_cache.delete(affected)
+            if self.report_store is not None:
+                # a species report names its genus and family
+                outcome["stored reports dropped"] = self.report_store.delete(
+                    affected | changes.below_renamed
+                )
+        return outcome
+
+    def _find_matching_row(self, tax_id: str | int, table: str) -> dict | None:
+        """
+        Find the row of a curated table describing tax_id with fallback strategies:
+        1. Direct lookup
+        2. Nearest annotated relative (merged IDs, then closest descendant),
+           precomputed in the relative index
+        All columns of the matching row are returned together.
+        """
+        # 1. Direct Lookup
+        tax_id_str = str(tax_id)
+        row = self.kb.get_row(table, tax_id_str)
+        if row is not None:
+            count(f"lookup.{table}.direct")
+            return row
+
+        # 2. Merged / Descendants via the precomputed index
+        index = self.relative_index
+        relative_id = index.lookup(table, tax_id_str) if index else None
+        if not relative_id:
+            count(f"lookup.{table}.not_found")
             return None
 
+        count(f"lookup.{table}.relative")
+        return self.kb.get_row(table, relative_id)
+
+    def _get_row_with_fallback(self, tax_id: str | int, table: str) -> dict | None:
+        """
+        Memoized _find_matching_row for one of the curated tables
+        ('data' or 'acronyms'). Misses are cached too.
+        """
+        cache = self._row_cache[table]
+        key = str(tax_id)
+        row = cache.get(key, _MISSING)
+        if row is not _MISSING:
+            count(f"cache.{table}.hit")
+            return row
+
+        count(f"cache.{table}.miss")
+        try:
+            with span(f"knowledge_base:{table}"):
+                row = self._find_matching_row(tax_id, table)
         except Exception as e:
-            logging.error(f"Error in _get_data_with_fallback for {tax_id}: {e}")
+            logging.error(f"Error in _get_row_with_fallback for {tax_id}: {e}")
             return None
 
+        if row is not None:
+            row = {
+                column: (None if is_null(value) else value)
+                for column, value in row.items()
+            }
+        cache.set(key, row)
+        return row
+
+    def _get_data_with_fallback(
+        self, tax_id: str | int, table: str, column_name: str
+    ) -> str | None:
+        """
+        Helper to get one column of the curated row resolved for tax_id
+        """
+        row = self._get_row_with_fallback(tax_id, table)
+        if row is None:
+            return None
+        return row.get(column_name)
+
+    def get_organism_data(self, tax_id: str | int) -> dict:
+        """
+        Get all curated columns from 'data_for_biojarvis.csv' by TaxID
+        """
+        return self._get_row_with_fallback(tax_id, "data") or {}
+
     def get_organism_disease(self, tax_id: str | int) -> str | None:
         """
         Get organism disease from 'data_for_biojarvis.csv' by TaxID
         """
-        return self._get_data_with_fallback(tax_id, self.df_data, "Diseases")
+        return self._get_data_with_fallback(tax_id, "data", "Diseases")
 
     def get_organism_transmission(self, tax_id: str | int) -> str | None:
         """
         Get organism transmission from 'data_for_biojarvis.csv' by TaxID
         """
-        return self._get_data_with_fallback(tax_id, self.df_data, "Transmissions")
+        return self._get_data_with_fallback(tax_id, "data", "Transmissions")
 
     def get_organism_hosts(self, tax_id: str | int) -> str | None:
         """
         Get organism hosts from 'data_for_biojarvis.csv' by TaxID
         """
-        return self._get_data_with_fallback(tax_id, self.df_data, "Hosts")
+        return self._get_data_with_fallback(tax_id, "data", "Hosts")
 
     def get_organism_acronym(self, tax_id: str | int) -> str | None:
         """
         Get organism Acronym (if exists) from 'acronym.csv' by TaxID
         """
-        return self._get_data_with_fallback(tax_id, self.df_acronym, "Acronym")
+        return self._get_data_with_fallback(tax_id, "acronyms", "Acronym")
 
     def get_genome_size(self, tax_id: str | int) -> int | str:
         """
-        Access 'nucleotide' database and get organism size.
+        Get organism genome size, from the local cache when possible.
+        In offline mode only the cache is used.
         """
         try:
             scientific_name = self.get_organism_name(tax_id)
             if not scientific_name:
                 return ""
 
-            handle_data = Entrez.esearch(
-                db="nucleotide",
-                term=f"{scientific_name} [Organism] RefSeq [filter] AND complete genome AND (bp OR nucleotides)",
-                retmax=20,
+            entry = self.genome_cache.get(
+                tax_id, scientific_name, allow_stale=self.offline
             )
-            record_articles = Entrez.read(handle_data)
-            handle_data.close()
+            if entry is not None:
+                count("cache.genome_size.hit")
+                return entry.size if entry.size is not None else ""
+            count("cache.genome_size.miss")
+            if self.offline:
+                return ""
 
-            for sequence_id in record_articles.get("IdList", []):
-                handle_data = Entrez.efetch(
-                    db="nucleotide", id=sequence_id, rettype="gb", retmode="text"
-                )
-                gb_text = handle_data.read()
-                handle_data.close()
-                match_search = re.search(r"LOCUS\s+\S+\s+(\d+)\s+bp", gb_text)
-                if match_search:
-                    return int(match_search.group(1))
-            return ""
+            size = self.fetch_genome_size(scientific_name)
+            self.genome_cache.set(tax_id, scientific_name, size)
+            return size if size is not None else ""
         except Exception as e:
             print(f"Erro ao obter tamanho do genoma para TaxID {tax_id}: {e}")
             logging.error(f"Error getting genome size for TaxID {tax_id}: {e}")
             return ""
 
-    def set_organism_fields(self, tax_id: str | int) -> dict:
+    def fetch_genome_size(self, scientific_name: str) -> int | None:
         """
-        Set organism fields for primary source for prompt
+        Access 'nucleotide' database and get organism size.
+        Returns None when there is no RefSeq complete genome.
         """
-        organism_informations = {
-            "Name": self.get_organism_name(tax_id),
-            "Acronym": self.get_organism_acronym(tax_id),
-            "Size": f"{self.get_genome_size(tax_id)}",
-            "Diseases": self.get_organism_disease(tax_id),
-            "Transmissions": self.get_organism_transmission(tax_id),
-            "Hosts": self.get_organism_hosts(tax_id),
-            "Family": self.get_organism_rank(tax_id, "family"),
-            "Genus": self.get_organism_rank(tax_id, "genus"),
-        }
+        return self.entrez.get_genome_size(scientific_name)
+
+    def prefetch_genome_sizes(self, tax_ids: list[str | int]) -> None:
+        """
+        Warm the genome size cache for many TaxIDs with one Entrez search
+        per organism and batched summaries, so later get_genome_size calls
+        are cache hits.
+        """
+        if self.offline:
+            return
+
+        tax_ids = list(dict.fromkeys(str(tax_id) for tax_id in tax_ids))
+        try:
+            names = self.taxonomy.get_names(tax_ids)
+        except Exception as e:
+            logging.error(f"Error getting organism names to prefetch: {e}")
+            return
+
+        pending = {}
+        for tax_id in tax_ids:
+            scientific_name = names.get(int(tax_id), "")
+            if (
+                scientific_name
+                and self.genome_cache.get(tax_id, scientific_name) is None
+            ):
+                pending[tax_id] = scientific_name
+        if not pending:
+            return
+
+        try:
+            sizes = self.entrez.get_genome_sizes(pending)
+        except Exception as e:
+            logging.error(f"Error prefetching genome sizes: {e}")
+            return
+
+        for tax_id, size in sizes.items():
+            self.genome_cache.set(tax_id, pending[tax_id], size)
+
+    def set_organism_fields(
+        self, tax_id: str | int, timings: dict | None = None
+    ) -> dict:
+        """
+        Set organism fields for primary source for prompt.
+        The network-bound genome size lookup runs in the background while
+        the local lookups run here. If a timings dict is given, it receives
+        the seconds spent on each field.
+        """
+        timings = {} if timings is None else timings
+
+        def timed(field: str, lookup, *args):
+            started = time.perf_counter()
+            with span(f"field:{field}"):
+                value = lookup(*args)
+            timings[field] = time.perf_counter() - started
+            return value
+
+        with span("set_organism_fields", tax_id=str(tax_id)):
+            size_future = self._enrichment_pool.submit(
+                timed, "Size", self.get_genome_size, tax_id
+            )
+
+            name = timed("Name", self.get_organism_name, tax_id)
+            acronym = timed("Acronym", self.get_organism_acronym, tax_id)
+            diseases = timed("Diseases", self.get_organism_disease, tax_id)
+            transmissions = timed(
+                "Transmissions", self.get_organism_transmission, tax_id
+            )
+            hosts = timed("Hosts", self.get_organism_hosts, tax_id)
+            ranks = timed("Family/Genus", self.get_organism_ranks, tax_id)
+
+            with span("field:Size (wait)"):
+                size = size_future.result()
+
+            organism_informations = {
+                "Name": name,
+                "Acronym": acronym,
+                "Size": f"{size}",
+                "Diseases": diseases,
+                "Transmissions": transmissions,
+                "Hosts": hosts,
+                "Family": ranks.get("family"),
+                "Genus": ranks.get("genus"),
+            }
         organism_informations = {
             dict_organism_info_key: dict_organism_info_value
             for dict_organism_info_key, dict_organism_info_value in organism_informations.items()
@@ -232,14 +614,50 @@ class MetagenomicsAssistant:
         }
         return organism_informations
 
-    def generate_report(
+    def get_stored_report(
+        self, tax_id: str | int, language: str
+    ) -> StoredReport | None:
+        """
+        Pre-generated report of the organism in language, if any. Reports
+        generated with another knowledge base (before a --build-kb) are
+        stale and count as misses.
+        """
+        if self.report_store is None:
+            return None
+        try:
+            stored = self.report_store.get(tax_id, language)
+        except Exception as e:
+            logging.error(f"Error reading the report store for {tax_id}: {e}")
+            return None
+        if stored is not None and stored.kb_hash != self.kb.content_hash:
+            count("report_store.stale")
+            stored = None
+        count("report_store.hit" if stored else "report_store.miss")
+        return stored
+
+    def build_report_prompt(
+        self, tax_id: str | int, language: str, organism_info: dict | None = None
+    ) -> tuple[str | None, str | None]:
+        """
+        Build the LLM prompt for a report.
+        Returns (prompt, None), or (None, error message) when the organism
+        information could not be retrieved.
+        """
+        prompts, error = self.build_report_prompts(tax_id, [language], organism_info)
+        return (None, error) if error else (prompts[language], None)
+
+    def build_report_prompts(
         self,
         tax_id: str | int,
-        language: str = "english",
+        languages: list[str],
         organism_info: dict | None = None,
-    ) -> str:
+    ) -> tuple[dict[str, str], str | None]:
         """
-        Generate report using the configured LLM handler
+        Build the LLM prompts of a report in several languages from one
+        organism lookup and one exemplar selection (language-neutral when
+        there are several languages).
+        Returns ({language: prompt}, None), or ({}, error message) when the
+        organism information could not be retrieved.
         """
         if organism_info:
             information_dict = organism_info
@@ -247,8 +665,172 @@ class MetagenomicsAssistant:
             information_dict = self.set_organism_fields(tax_id)
 
         if not information_dict or not information_dict.get("Name"):
-            return f"Error: Failed to retrieve basic organism information for TaxID {tax_id}. The TaxID might be invalid or not present in the local database. Try updating the database using the --update-db flag."
+            return (
+                {},
+                f"Error: Failed to retrieve basic organism information for TaxID {tax_id}. The TaxID might be invalid or not present in the local database. Try updating the database using the --update-db flag.",
+            )
+
+        with span("prompt:build"):
+            text_reference = self.set_text_to_prompt(
+                information_dict,
+                tax_id=tax_id,
+                language=languages[0] if len(languages) == 1 else None,
+            )
+            prompts = {
+                language: set_prompt_text(information_dict, text_reference, language)
+                for language in languages
+            }
+            return prompts, None
+
+    def generate_report(
+        self,
+        tax_id: str | int,
+        language: str = "english",
+        organism_info: dict | None = None,
+    ) -> str:
+        """
+        Generate report using the configured LLM handler,
+        unless it was pre-generated
+        """
+        stored = self.get_stored_report(tax_id, language)
+        if stored:
+            return stored.report
+
+        with span("generate_report", tax_id=str(tax_id)):
+            prompt_text, error = self.build_report_prompt(
+                tax_id, language, organism_info
+            )
+            if error:
+                return error
+            return self._generate_text(prompt_text)
+
+    def stream_report(
+        self,
+        tax_id: str | int,
+        language: str = "english",
+        organism_info: dict | None = None,
+    ) -> Iterator[str]:
+        """
+        Generate report with the LLM handler streaming, yielding text chunks.
+        A pre-generated report is yielded whole.
+        """
+        stored = self.get_stored_report(tax_id, language)
+        if stored:
+            yield stored.report
+            return
+
+        prompt_text, error = self.build_report_prompt(tax_id, language, organism_info)
+        if error:
+            yield error
+            return
+        with span("llm:stream_text", "llm"):
+            yield from self.llm_handler.stream_text(prompt_text)
+
+    async def agenerate_report(
+        self,
+        tax_id: str | int,
+        language: str = "english",
+        organism_info: dict | None = None,
+    ) -> str:
+        """
+        Async variant of generate_report.
+        Local lookups run in a worker thread; the LLM call is awaited.
+        """
+        stored = await asyncio.to_thread(self.get_stored_report, tax_id, language)
+        if stored:
+            return stored.report
+
+        prompt_text, error = await asyncio.to_thread(
+            self.build_report_prompt, tax_id, language, organism_info
+        )
+        if error:
+            return error
+        with span("llm:agenerate_text", "llm"):
+            return await self.llm_handler.agenerate_text(prompt_text)
+
+    def _pending_languages(
+        self, tax_id: str | int, languages: list[str]
+    ) -> tuple[dict[str, str], list[str]]:
+        """
+        Pre-generated reports of tax_id, and the languages still missing
+        """
+        reports, pending = {}, []
+        for language in languages:
+            stored = self.get_stored_report(tax_id, language)
+            if stored:
+                reports[language] = stored.report
+            else:
+                pending.append(language)
+        return reports, pending
+
+    def _generate_text(self, prompt_text: str) -> str:
+        with span("llm:generate_text", "llm"):
+            return self.llm_handler.generate_text(prompt_text)
+
+    def generate_reports(
+        self,
+        tax_id: str | int,
+        languages: list[str],
+        organism_info: dict | None = None,
+    ) -> dict[str, str]:
+        """
+        Generate the report in every language, keyed by language.
+        The organism lookup and exemplar selection are shared and the LLM
+        calls run concurrently; pre-generated reports are reused. A failed
+        call gives an 'Error: ...' report without losing the others.
+        """
+        languages = list(dict.fromkeys(languages))
+        reports, pending = self._pending_languages(tax_id, languages)
+        if pending:
+            with span("generate_reports", tax_id=str(tax_id)):
+                prompts, error = self.build_report_prompts(
+                    tax_id, pending, organism_info
+                )
+                if error:
+                    reports.update(dict.fromkeys(pending, error))
+                else:
+                    with ThreadPoolExecutor(max_workers=len(pending)) as pool:
+                        futures = {
+                            language: pool.submit(self._generate_text, prompt)
+                            for language, prompt in prompts.items()
+                        }
+                        for language, future in futures.items():
+                            try:
+                                reports[language] = future.result()
+                            except Exception as e:
+                                reports[language] = _failed_report(tax_id, language, e)
+        return {language: reports[language] for language in languages}
 
-        text_reference = self.set_text_to_prompt()
-        prompt_text = set_prompt_text(information_dict, text_reference, language)
-        return self.llm_handler.generate_text(prompt_text)
+    async def agenerate_reports(
+        self,
+        tax_id: str | int,
+        languages: list[str],
+        organism_info: dict | None = None,
+    ) -> dict[str, str]:
+        """
+        Async variant of generate_reports, awaiting the LLM calls together
+        """
+        languages = list(dict.fromkeys(languages))
+        reports, pending = await asyncio.to_thread(
+            self._pending_languages, tax_id, languages
+        )
+        if pending:
+            prompts, error = await asyncio.to_thread(
+                self.build_report_prompts, tax_id, pending, organism_info
+            )
+            if error:
+                reports.update(dict.fromkeys(pending, error))
+            else:
+                with span("llm:agenerate_text", "llm"):
+                    texts = await asyncio.gather(
+                        *(
+                            self.llm_handler.agenerate_text(prompt)
+                            for prompt in prompts.values()
+                        ),
+                        return_exceptions=True,
+                    )
+                for language, text in zip(prompts, texts):
+                    if isinstance(text, Exception):
+                        text = _failed_report(tax_id, language, text)
+                    reports[language] = text
+        return {language: reports[language] for language in languages}
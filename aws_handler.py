@@ -1,10 +1,37 @@
 # Libraries
+import asyncio
 import os
 import json
+from collections.abc import Iterator
 import boto3
+from botocore.config import Config
+from botocore.exceptions import ConnectionError as BotoConnectionError
+from botocore.exceptions import HTTPClientError
 from dotenv import load_dotenv
 
-from constants import MODEL_ID_1
+from cassette import recorded, recorded_stream
+from constants import (
+    BEDROCK_REQUESTS_PER_MINUTE,
+    BEDROCK_TOKENS_PER_MINUTE,
+    LLM_MAX_OUTPUT_TOKENS,
+    MODEL_ID_1,
+)
+from exemplar_index import estimate_tokens
+from rate_limit import FATAL, THROTTLED, TRANSIENT, parse_retry_after, shared_scheduler
+from tracing import count, record_usage, span
+
+# Bedrock error codes meaning "over quota" and "try again later"
+THROTTLING_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceQuotaExceededException",
+}
+TRANSIENT_CODES = {
+    "InternalServerException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+    "ModelTimeoutException",
+}
 
 
 class AwsHandler:
@@ -21,10 +48,43 @@ class AwsHandler:
         # IMPORTANT:
         # AWS_BEARER_TOKEN_BEDROCK is automatically picked up by the SDK
         # It should NOT be passed as aws_session_token
+        # Retries are left to the scheduler, which shares them with the
+        # quota and concurrency limits of every Bedrock call
         self.bedrock_client = boto3.client(
-            service_name="bedrock-runtime", region_name=region
+            service_name="bedrock-runtime",
+            region_name=region,
+            config=Config(retries={"mode": "standard", "total_max_attempts": 1}),
+        )
+        self.scheduler = shared_scheduler(
+            "bedrock",
+            float(
+                os.getenv("BEDROCK_REQUESTS_PER_MINUTE", BEDROCK_REQUESTS_PER_MINUTE)
+            ),
+            float(os.getenv("BEDROCK_TOKENS_PER_MINUTE", BEDROCK_TOKENS_PER_MINUTE)),
+            self.classify_error,
         )
 
+    @staticmethod
+    def classify_error(error: Exception) -> tuple[str, float | None]:
+        """
+        Whether a failed Bedrock call was throttled, may succeed if retried
+        or is fatal, with the retry-after hint of the answer
+        """
+        response = getattr(error, "response", None) or {}
+        code = response.get("Error", {}).get("Code", "")
+        metadata = response.get("ResponseMetadata", {})
+        status = metadata.get("HTTPStatusCode") or 0
+        retry_after = parse_retry_after(
+            metadata.get("HTTPHeaders", {}).get("retry-after")
+        )
+        if code in THROTTLING_CODES or status == 429:
+            return THROTTLED, retry_after
+        if code in TRANSIENT_CODES or status >= 500:
+            return TRANSIENT, retry_after
+        if isinstance(error, (BotoConnectionError, HTTPClientError, ConnectionError)):
+            return TRANSIENT, None
+        return FATAL, None
+
     @staticmethod
     def get_bedrock_prompt_response(prompt_text: str) -> bytes:
         """
@@ -33,7 +93,11 @@ class AwsHandler:
         return json.dumps(
             {
                 "messages": [{"role": "user", "content": [{"text": prompt_text}]}],
-                "inferenceConfig": {"maxTokens": 300, "temperature": 0.4, "topP": 0.4},
+                "inferenceConfig": {
+                    "maxTokens": LLM_MAX_OUTPUT_TOKENS,
+                    "temperature": 0.4,
+                    "topP": 0.4,
+                },
             }
         ).encode("utf-8")
 
@@ -44,19 +108,27 @@ class AwsHandler:
         response_bytes = self.get_bedrock_prompt_response(prompt)
         return self.return_bedrock_response(response_bytes)
 
+    async def agenerate_text(self, prompt: str) -> str:
+        """
+        Async variant of generate_text.
+        boto3 has no async client, so the blocking call runs in a worker thread.
+        """
+        return await asyncio.to_thread(self.generate_text, prompt)
+
     def return_bedrock_response(self, request_body: bytes) -> str:
         """
         Invoke the Bedrock model and return the generated text
         """
-        response = self.bedrock_client.invoke_model(
-            modelId=MODEL_ID_1,
-            body=request_body,
-            contentType="application/json",
-            accept="application/json",
+        result = recorded(
+            "bedrock",
+            self.cassette_request(request_body),
+            lambda: self.scheduler.call(
+                lambda: self._invoke_model(request_body),
+                tokens=self.estimate_request_tokens(request_body),
+                used_tokens=self.used_tokens,
+            ),
         )
-
-        response_body = response["body"].read().decode("utf-8")
-        result = json.loads(response_body)
+        self.record_bedrock_usage(result)
 
         try:
             return result["output"]["message"]["content"][0]["text"]
@@ -64,3 +136,82 @@ class AwsHandler:
             raise ValueError(
                 f"Unexpected Bedrock response format. Keys: {result.keys()}"
             )
+
+    def _invoke_model(self, request_body: bytes) -> dict:
+        count("network.bedrock")
+        with span("bedrock:invoke_model", "llm"):
+            response = self.bedrock_client.invoke_model(
+                modelId=MODEL_ID_1,
+                body=request_body,
+                contentType="application/json",
+                accept="application/json",
+            )
+            return json.loads(response["body"].read().decode("utf-8"))
+
+    @staticmethod
+    def cassette_request(request_body: bytes) -> dict:
+        """
+        What identifies a request in a cassette: the model and the body
+        """
+        return {"model": MODEL_ID_1, "body": json.loads(request_body)}
+
+    @staticmethod
+    def estimate_request_tokens(request_body: bytes) -> int:
+        """
+        Tokens a request may cost: its prompt plus the longest answer
+        """
+        return estimate_tokens(request_body.decode("utf-8")) + LLM_MAX_OUTPUT_TOKENS
+
+    @staticmethod
+    def used_tokens(result: dict) -> int | None:
+        usage = result.get("usage")
+        if not usage:
+            return None
+        return usage.get("inputTokens", 0) + usage.get("outputTokens", 0)
+
+    def stream_text(self, prompt: str) -> Iterator[str]:
+        """
+        Generate text with Bedrock response streaming, yielding text chunks
+        as they arrive.
+        """
+        request_body = self.get_bedrock_prompt_response(prompt)
+        return recorded_stream(
+            "bedrock_stream",
+            self.cassette_request(request_body),
+            lambda: self.scheduler.stream(
+                lambda: self._stream_chunks(request_body),
+                tokens=self.estimate_request_tokens(request_body),
+            ),
+        )
+
+    def _stream_chunks(self, request_body: bytes) -> Iterator[str]:
+        count("network.bedrock")
+        with span("bedrock:invoke_model_with_response_stream", "llm"):
+            response = self.bedrock_client.invoke_model_with_response_stream(
+                modelId=MODEL_ID_1,
+                body=request_body,
+                contentType="application/json",
+                accept="application/json",
+            )
+
+            for event in response["body"]:
+                chunk = event.get("chunk")
+                if not chunk:
+                    continue
+                payload = json.loads(chunk["bytes"].decode("utf-8"))
+                self.record_bedrock_usage(payload.get("metadata", {}))
+                text = payload.get("contentBlockDelta", {}).get("delta", {}).get("text")
+                if text:
+                    yield text
+
+    @staticmethod
+    def record_bedrock_usage(payload: dict) -> None:
+        """
+        Record the token counts of the 'usage' block of a Bedrock answer
+        (the final metadata event when streaming)
+        """
+        usage = payload.get("usage")
+        if usage:
+            record_usage(
+                "bedrock", usage.get("inputTokens", 0), usage.get("outputTokens", 0)
+            )
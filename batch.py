@@ -0,0 +1,342 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+
+from output_writers import ReportWriter, language_output_paths, open_writer
+
+DEFAULT_WORKERS = 4
+
+
+@dataclass
+class BatchRow:
+    """
+    One line of a batch input file
+    """
+
+    sample_id: str
+    tax_id: str = ""
+    organism_name: str = ""
+
+
+@dataclass
+class BatchResult:
+    """
+    Outcome of generating the report for one batch row
+    """
+
+    row: BatchRow
+    tax_id: str = ""
+    reports: dict[str, str] = field(default_factory=dict)  # by language
+    organism_info: dict = field(default_factory=dict)
+    timings: dict = field(default_factory=dict)
+    error: str = ""
+    # Languages without a report: all of them when the lookup failed
+    failed_languages: list[str] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.error
+
+    @property
+    def report(self) -> str:
+        """
+        Report in the first language
+        """
+        return next(iter(self.reports.values()), "")
+
+    def check_reports(self) -> None:
+        """
+        Record the languages whose report failed, and their errors as the
+        error of the row. The other reports are still saved.
+        """
+        self.failed_languages = [
+            language
+            for language, report in self.reports.items()
+            if report.startswith("Error:")
+        ]
+        if self.failed_languages:
+            self.error = "; ".join(
+                f"{language}: {self.reports[language]}"
+                for language in self.failed_languages
+            )
+
+    def record_failure(self, error: Exception, languages: list[str]) -> None:
+        """
+        Record a failure of the whole row, before any report was written
+        """
+        logging.error(f"Batch row {self.row.sample_id} failed: {error}")
+        self.error = str(error)
+        self.failed_languages = list(languages)
+
+
+def read_batch_file(path: str) -> list[BatchRow]:
+    """
+    Read a batch input file.
+
+    Accepts either a plain list (one TaxID or organism name per line) or a
+    TSV with sample_id/taxid/name columns. A header line is optional; blank
+    lines and lines starting with '#' are ignored.
+    """
+    rows = []
+    columns = ["sample_id", "taxid", "name"]
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.rstrip("\n").rstrip("\r")
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+
+            fields = [value.strip() for value in line.split("\t")]
+            lowered = [value.lower() for value in fields]
+            if not rows and ("taxid" in lowered or "name" in lowered):
+                columns = lowered
+                continue
+
+            if len(fields) == 1:
+                value = fields[0]
+                if value.isdigit():
+                    rows.append(BatchRow(sample_id=value, tax_id=value))
+                else:
+                    rows.append(BatchRow(sample_id=value, organism_name=value))
+                continue
+
+            record = dict(zip(columns, fields))
+            tax_id = record.get("taxid", "")
+            organism_name = record.get("name", "")
+            sample_id = record.get("sample_id") or tax_id or organism_name
+            if not tax_id and not organism_name:
+                raise ValueError(
+                    f"Line {line_number} of {path} has neither a TaxID nor a name"
+                )
+            rows.append(
+                BatchRow(
+                    sample_id=sample_id, tax_id=tax_id, organism_name=organism_name
+                )
+            )
+
+    return rows
+
+
+def _languages(language: str | list[str]) -> list[str]:
+    return [language] if isinstance(language, str) else list(dict.fromkeys(language))
+
+
+def _enrich_row(
+    assistant, row: BatchRow, result: BatchResult, languages: list[str]
+) -> None:
+    """
+    Resolve the TaxID of a row and fill its organism information
+    (taken from a pre-generated report when there is one)
+    """
+    tax_id = row.tax_id
+    if not tax_id:
+        tax_id = assistant.get_organism_tax_id(row.organism_name)
+        if not tax_id:
+            raise ValueError(f"Could not find TaxID for organism '{row.organism_name}'")
+    result.tax_id = str(tax_id)
+    for language in languages:
+        stored = assistant.get_stored_report(tax_id, language)
+        if stored:
+            result.organism_info = stored.organism_info
+            return
+    result.organism_info = assistant.set_organism_fields(tax_id, timings=result.timings)
+
+
+def process_row(assistant, row: BatchRow, languages: list[str]) -> BatchResult:
+    """
+    Resolve, enrich and generate the reports of one row in every language.
+    Errors are captured in the result instead of being raised.
+    """
+    started = time.perf_counter()
+    result = BatchResult(row=row)
+    try:
+        _enrich_row(assistant, row, result, languages)
+        result.reports = assistant.generate_reports(
+            result.tax_id, languages, organism_info=result.organism_info
+        )
+        result.check_reports()
+    except Exception as e:
+        result.record_failure(e, languages)
+
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+async def aprocess_row(
+    assistant, row: BatchRow, languages: list[str], semaphore: asyncio.Semaphore
+) -> BatchResult:
+    """
+    Async variant of process_row, holding the semaphore for the whole row
+    """
+    async with semaphore:
+        started = time.perf_counter()
+        result = BatchResult(row=row)
+        try:
+            await asyncio.to_thread(_enrich_row, assistant, row, result, languages)
+            result.reports = await assistant.agenerate_reports(
+                result.tax_id, languages, organism_info=result.organism_info
+            )
+            result.check_reports()
+        except Exception as e:
+            result.record_failure(e, languages)
+
+        result.elapsed = time.perf_counter() - started
+        return result
+
+
+def _open_writers(
+    output: str | None, file_type: str, languages: list[str]
+) -> dict[str, ReportWriter]:
+    if not output:
+        return {}
+    return {
+        language: open_writer(path, file_type)
+        for language, path in language_output_paths(output, languages).items()
+    }
+
+
+def _close_writers(writers: dict[str, ReportWriter]) -> None:
+    for writer in writers.values():
+        writer.close()
+
+
+def run_batch(
+    assistant,
+    rows: list[BatchRow],
+    language: str | list[str] = "English",
+    workers: int = DEFAULT_WORKERS,
+    output: str | None = None,
+    file_type: str = "json",
+) -> list[BatchResult]:
+    """
+    Generate reports for every row on a bounded thread pool, sharing one
+    assistant. Results are streamed to the output writers from the calling
+    thread as they complete. With several languages each row is looked up
+    once and saved to one output per language.
+    """
+    results = []
+    started = time.perf_counter()
+    languages = _languages(language)
+    writers = _open_writers(output, file_type, languages)
+    _prefetch(assistant, rows)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = [
+                executor.submit(process_row, assistant, row, languages) for row in rows
+            ]
+            for future in as_completed(futures):
+                _record_result(future.result(), results, len(rows), writers)
+    finally:
+        _close_writers(writers)
+
+    print_batch_summary(results, time.perf_counter() - started)
+    return results
+
+
+async def arun_batch(
+    assistant,
+    rows: list[BatchRow],
+    language: str | list[str] = "English",
+    concurrency: int = DEFAULT_WORKERS,
+    output: str | None = None,
+    file_type: str = "json",
+) -> list[BatchResult]:
+    """
+    Generate reports for every row from one event loop, with at most
+    `concurrency` rows (and so LLM requests) in flight at once.
+    """
+    results = []
+    started = time.perf_counter()
+    languages = _languages(language)
+    writers = _open_writers(output, file_type, languages)
+    await asyncio.to_thread(_prefetch, assistant, rows)
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    tasks = [aprocess_row(assistant, row, languages, semaphore) for row in rows]
+    try:
+        for task in asyncio.as_completed(tasks):
+            _record_result(await task, results, len(rows), writers)
+    finally:
+        _close_writers(writers)
+
+    print_batch_summary(results, time.perf_counter() - started)
+    return results
+
+
+def _prefetch(assistant, rows: list[BatchRow]) -> None:
+    """
+    Resolve the organism names in one bulk lookup, then the genome sizes
+    of all known TaxIDs (one search per organism, summaries batched)
+    """
+    names = [row.organism_name for row in rows if not row.tax_id and row.organism_name]
+    if names:
+        resolved = assistant.resolve_organism_names(names)
+        for row in rows:
+            if not row.tax_id and row.organism_name in resolved:
+                row.tax_id = str(resolved[row.organism_name])
+
+    known_tax_ids = [row.tax_id for row in rows if row.tax_id]
+    if known_tax_ids:
+        assistant.prefetch_genome_sizes(known_tax_ids)
+
+
+def _record_result(
+    result: BatchResult,
+    results: list[BatchResult],
+    total: int,
+    writers: dict[str, ReportWriter],
+) -> None:
+    """
+    Collect a finished row, print progress and save its reports (those
+    that did not fail when only some languages did)
+    """
+    results.append(result)
+
+    status = "ok" if result.ok else f"FAILED ({result.error})"
+    print(
+        f"[{len(results)}/{total}] {result.row.sample_id} "
+        f"(TaxID {result.tax_id or '?'}) {status} in {result.elapsed:.1f}s"
+    )
+
+    for language, writer in writers.items():
+        if language in result.failed_languages or language not in result.reports:
+            continue
+        writer.write(
+            result.tax_id,
+            result.reports[language],
+            organism_info=result.organism_info,
+            sample_id=result.row.sample_id,
+        )
+
+
+def print_batch_summary(results: list[BatchResult], elapsed: float) -> None:
+    """
+    Print throughput and failures of a batch run
+    """
+    failures = [result for result in results if not result.ok]
+    succeeded = len(results) - len(failures)
+    throughput = (len(results) / elapsed * 60) if elapsed > 0 else 0.0
+
+    print(
+        f"\nBatch finished: {succeeded} succeeded, {len(failures)} failed, "
+        f"{len(results)} total in {elapsed:.1f}s ({throughput:.1f} reports/min)"
+    )
+    field_totals = {}
+    for result in results:
+        for field_name, seconds in result.timings.items():
+            field_totals.setdefault(field_name, []).append(seconds)
+    if field_totals:
+        breakdown = ", ".join(
+            f"{field_name} {sum(values) / len(values):.2f}s"
+            for field_name, values in sorted(
+                field_totals.items(), key=lambda item: -sum(item[1])
+            )
+        )
+        print(f"Mean lookup time per field: {breakdown}")
+
+    for result in failures:
+        print(f"  - {result.row.sample_id}: {result.error}")
@@ -0,0 +1,192 @@
+"""
+Offline stand-ins for Bedrock, Gemini and the NCBI E-utilities.
+
+The fakes replace the SDK clients / HTTP session underneath the real
+handlers, so the benchmarked code paths are the production ones. Every call
+sleeps for a configurable latency instead of going to the network.
+"""
+
+import asyncio
+import io
+import json
+import time
+import zlib
+from types import SimpleNamespace
+
+from aws_handler import AwsHandler
+from entrez_client import EntrezClient
+from gemini_handler import GeminiHandler
+from rate_limit import TokenBucket
+
+FAKE_REPORT = (
+    "Organism overview. Clinical relevance, transmission routes and "
+    "recommended follow-up for the sample."
+)
+
+
+def _token_count(text: str | bytes) -> int:
+    # Rough 4 characters per token, enough to exercise usage accounting
+    return max(1, len(text) // 4)
+
+
+def _split_text(text: str, chunks: int) -> list[str]:
+    size = max(1, len(text) // chunks)
+    return [text[start : start + size] for start in range(0, len(text), size)]
+
+
+class FakeBedrockClient:
+    """
+    bedrock-runtime client answering invoke_model and
+    invoke_model_with_response_stream after `latency` seconds
+    """
+
+    def __init__(self, latency: float = 0.0, text: str = FAKE_REPORT, chunks=8):
+        self.latency = latency
+        self.text = text
+        self.chunks = chunks
+
+    def invoke_model(self, modelId, body, contentType, accept):
+        time.sleep(self.latency)
+        payload = {
+            "output": {"message": {"content": [{"text": self.text}]}},
+            "usage": {
+                "inputTokens": _token_count(body),
+                "outputTokens": _token_count(self.text),
+            },
+        }
+        return {"body": io.BytesIO(json.dumps(payload).encode("utf-8"))}
+
+    def invoke_model_with_response_stream(self, modelId, body, contentType, accept):
+        def events():
+            pieces = _split_text(self.text, self.chunks)
+            for piece in pieces:
+                time.sleep(self.latency / len(pieces))
+                delta = {"contentBlockDelta": {"delta": {"text": piece}}}
+                yield {"chunk": {"bytes": json.dumps(delta).encode("utf-8")}}
+            usage = {
+                "inputTokens": _token_count(body),
+                "outputTokens": _token_count(self.text),
+            }
+            metadata = {"metadata": {"usage": usage}}
+            yield {"chunk": {"bytes": json.dumps(metadata).encode("utf-8")}}
+
+        return {"body": events()}
+
+
+class _FakeGeminiModels:
+    def __init__(self, latency: float, text: str, chunks: int):
+        self.latency = latency
+        self.text = text
+        self.chunks = chunks
+
+    def _response(self, contents: str, text: str, final: bool = True):
+        usage = None
+        if final:
+            usage = SimpleNamespace(
+                prompt_token_count=_token_count(contents),
+                candidates_token_count=_token_count(self.text),
+            )
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+    def generate_content(self, model, contents):
+        time.sleep(self.latency)
+        return self._response(contents, self.text)
+
+    def generate_content_stream(self, model, contents):
+        pieces = _split_text(self.text, self.chunks)
+        for position, piece in enumerate(pieces):
+            time.sleep(self.latency / len(pieces))
+            yield self._response(contents, piece, final=position == len(pieces) - 1)
+
+
+class _FakeGeminiAsyncModels(_FakeGeminiModels):
+    async def generate_content(self, model, contents):
+        await asyncio.sleep(self.latency)
+        return self._response(contents, self.text)
+
+
+class FakeGeminiClient:
+    """
+    genai.Client with sync, async and streaming generate_content
+    """
+
+    def __init__(self, latency: float = 0.0, text: str = FAKE_REPORT, chunks=8):
+        self.models = _FakeGeminiModels(latency, text, chunks)
+        self.aio = SimpleNamespace(models=_FakeGeminiAsyncModels(latency, text, chunks))
+
+
+class _FakeResponse:
+    def __init__(self, payload: dict):
+        self.status_code = 200
+        self.headers = {}
+        self._payload = payload
+
+    def raise_for_status(self) -> None:
+        pass
+
+    def json(self) -> dict:
+        return self._payload
+
+
+class FakeEutilsSession:
+    """
+    requests.Session answering esearch/epost/esummary POSTs.
+    Every organism gets one nucleotide UID with a length derived from its
+    name, so results are deterministic.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+        self._history = {}
+
+    def post(self, url: str, data: dict, timeout: float):
+        time.sleep(self.latency)
+        self.calls += 1
+        utility = url.rsplit("/", 1)[-1].removesuffix(".fcgi")
+        return _FakeResponse(getattr(self, f"_{utility}")(data))
+
+    def _esearch(self, data: dict) -> dict:
+        name = data["term"].split(" [Organism]")[0]
+        uid = str(zlib.crc32(name.encode("utf-8")))
+        return {"esearchresult": {"idlist": [uid]}}
+
+    def _epost(self, data: dict) -> dict:
+        webenv = f"WEBENV_{len(self._history)}"
+        self._history[webenv] = data["id"].split(",")
+        return {"webenv": webenv, "querykey": "1"}
+
+    def _esummary(self, data: dict) -> dict:
+        if "WebEnv" in data:
+            start = int(data["retstart"])
+            ids = self._history[data["WebEnv"]][start : start + int(data["retmax"])]
+        else:
+            ids = data["id"].split(",")
+        result = {"uids": ids}
+        for uid in ids:
+            result[uid] = {"slen": 1_000_000 + int(uid) % 9_000_000}
+        return {"result": result}
+
+
+def fake_aws_handler(latency: float = 0.0) -> AwsHandler:
+    handler = AwsHandler()
+    handler.bedrock_client = FakeBedrockClient(latency)
+    return handler
+
+
+def fake_gemini_handler(latency: float = 0.0) -> GeminiHandler:
+    handler = GeminiHandler()
+    handler.client = FakeGeminiClient(latency)
+    return handler
+
+
+def fake_entrez_client(latency: float = 0.0) -> EntrezClient:
+    """
+    EntrezClient over the fake session. Its own generous token bucket keeps
+    NCBI's rate limit out of the measurements.
+    """
+    return EntrezClient(
+        api_key="benchmark",
+        session=FakeEutilsSession(latency),
+        rate_limiter=TokenBucket(rate=1_000_000),
+    )
@@ -0,0 +1,159 @@
+"""
+Small synthetic taxonomy and knowledge base for the benchmarks.
+
+The taxonomy uses ete4's sqlite schema, so NCBITaxa opens it like the real
+database: root > Bacteria > families > genera > species, plus merged IDs.
+"""
+
+import os
+import sqlite3
+from contextlib import closing
+from dataclasses import dataclass, field
+
+from knowledge_base import create_knowledge_base
+
+ETE_DB_VERSION = 2
+MERGED_OFFSET = 900_000
+
+
+@dataclass
+class BenchmarkFixture:
+    """
+    Files of the fixture and the TaxIDs exercising each lookup path
+    """
+
+    taxonomy_db: str
+    knowledge_base: str
+    relative_index: str
+    name_index: str = ""
+    species: dict[int, str] = field(default_factory=dict)
+    hit_ids: list[int] = field(default_factory=list)
+    merged_ids: list[int] = field(default_factory=list)
+    descendant_ids: list[int] = field(default_factory=list)
+    miss_ids: list[int] = field(default_factory=list)
+
+
+def _family_id(f: int) -> int:
+    return 100 + f
+
+
+def _genus_id(f: int, g: int) -> int:
+    return 10_000 + f * 100 + g
+
+
+def _species_id(f: int, g: int, s: int) -> int:
+    return 100_000 + f * 10_000 + g * 100 + s
+
+
+def make_taxonomy_db(
+    path: str, families: int = 10, genera: int = 5, species: int = 4
+) -> BenchmarkFixture:
+    """
+    Write the fixture taxonomy to path. Returns a fixture with the
+    species names filled in (the knowledge base paths are left empty).
+    """
+    fixture = BenchmarkFixture(taxonomy_db=path, knowledge_base="", relative_index="")
+    rows = [
+        (1, 1, "root", "", "no rank", "1"),
+        (2, 1, "Bacteria", "", "superkingdom", "2,1"),
+    ]
+    merged = []
+    for f in range(families):
+        family = _family_id(f)
+        rows.append((family, 2, f"Fam{f}aceae", "", "family", f"{family},2,1"))
+        for g in range(genera):
+            genus = _genus_id(f, g)
+            genus_name = f"Genus{f}x{g}"
+            rows.append(
+                (genus, family, genus_name, "", "genus", f"{genus},{family},2,1")
+            )
+            for s in range(species):
+                taxid = _species_id(f, g, s)
+                name = f"{genus_name} species{s}"
+                rows.append(
+                    (taxid, genus, name, "", "species", f"{taxid},{genus},{family},2,1")
+                )
+                fixture.species[taxid] = name
+                merged.append((MERGED_OFFSET + taxid, taxid))
+
+    if os.path.exists(path):
+        os.remove(path)
+    with closing(sqlite3.connect(path)) as conn:
+        conn.executescript("""
+            CREATE TABLE stats (version INT PRIMARY KEY);
+            CREATE TABLE species (taxid INT PRIMARY KEY, parent INT,
+                spname VARCHAR(50) COLLATE NOCASE, common VARCHAR(50) COLLATE NOCASE,
+                rank VARCHAR(50), track TEXT);
+            CREATE TABLE synonym (taxid INT, spname VARCHAR(50) COLLATE NOCASE,
+                PRIMARY KEY (spname, taxid));
+            CREATE TABLE merged (taxid_old INT, taxid_new INT);
+            CREATE INDEX spname1 ON species (spname COLLATE NOCASE);
+            CREATE INDEX spname2 ON synonym (spname COLLATE NOCASE);
+            """)
+        conn.execute("INSERT INTO stats VALUES (?)", (ETE_DB_VERSION,))
+        conn.executemany("INSERT INTO species VALUES (?, ?, ?, ?, ?, ?)", rows)
+        conn.executemany("INSERT INTO merged VALUES (?, ?)", merged)
+        conn.commit()
+    return fixture
+
+
+def make_fixture(
+    directory: str, families: int = 10, genera: int = 5, species: int = 4
+) -> BenchmarkFixture:
+    """
+    Build the taxonomy and a matching knowledge base in directory.
+
+    Curated rows exist for the first species of every genus (direct hits)
+    and, under an old merged TaxID, for the second one (merged path).
+    Genera have no row of their own and resolve to a descendant.
+    """
+    os.makedirs(directory, exist_ok=True)
+    fixture = make_taxonomy_db(
+        os.path.join(directory, "taxa.sqlite"), families, genera, species
+    )
+    fixture.knowledge_base = os.path.join(directory, "knowledge_base.sqlite")
+    fixture.relative_index = os.path.join(directory, "relative_index.json")
+    fixture.name_index = os.path.join(directory, "name_index.sqlite")
+
+    data, acronyms, reports = [], [], []
+    for f in range(families):
+        for g in range(genera):
+            hit = _species_id(f, g, 0)
+            fixture.hit_ids.append(hit)
+            fixture.descendant_ids.append(_genus_id(f, g))
+            annotated = [(hit, hit)]
+            if species > 1:
+                current = _species_id(f, g, 1)
+                fixture.merged_ids.append(current)
+                annotated.append((MERGED_OFFSET + current, current))
+            if species > 2:
+                fixture.miss_ids.append(_species_id(f, g, species - 1))
+
+            for curated_id, taxid in annotated:
+                name = fixture.species[taxid]
+                data.append(
+                    {
+                        "TaxID": str(curated_id),
+                        "Diseases": f"Infection caused by {name}",
+                        "Transmissions": "Contact",
+                        "Hosts": "Humans",
+                    }
+                )
+                acronyms.append({"TaxID": str(curated_id), "Acronym": f"G{f}{g}"})
+                reports.append(
+                    {
+                        "content": f"{name} is a bacterium. " * 40,
+                        "language": "English",
+                        "tax_id": str(taxid),
+                        "scientific_name": name,
+                        "family": f"Fam{f}aceae",
+                        "genus": f"Genus{f}x{g}",
+                    }
+                )
+
+    create_knowledge_base(
+        fixture.knowledge_base,
+        reports=reports,
+        tables={"data": data, "acronyms": acronyms},
+    )
+    return fixture
@@ -0,0 +1,360 @@
+"""
+Benchmark the report pipeline offline.
+
+    python -m benchmarks.run [--quick] [--output results.json] [--compare old.json]
+
+Bedrock, Gemini and Entrez are replaced by local fakes with configurable
+latency, and the taxonomy and knowledge base by a small synthetic fixture.
+Results are written as JSON so runs of different commits can be compared.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from assistant import MetagenomicsAssistant
+from batch import BatchRow, arun_batch, run_batch
+from benchmarks.fakes import fake_aws_handler, fake_entrez_client, fake_gemini_handler
+from benchmarks.fixtures import BenchmarkFixture, make_fixture
+from genome_cache import GenomeSizeCache
+from knowledge_base import KnowledgeBase
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_DIR, "benchmarks", "results")
+THREAD_WORKERS = (1, 4, 16)
+ASYNC_CONCURRENCY = (1, 8, 32)
+
+
+def summarize(samples: list[float]) -> dict:
+    """
+    Milliseconds statistics of timing samples given in seconds
+    """
+    ordered = sorted(samples)
+    return {
+        "n": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "median_ms": statistics.median(ordered) * 1000,
+        "p95_ms": ordered[int(0.95 * (len(ordered) - 1))] * 1000,
+        "min_ms": ordered[0] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def measure(fn, inputs, repeat: int, setup=None) -> dict:
+    """
+    Time fn(x) for `repeat` inputs cycled from `inputs`.
+    setup() runs before every call and is not timed.
+    """
+    samples = []
+    for value in itertools.islice(itertools.cycle(inputs), repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        fn(value)
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+class PipelineBenchmarks:
+    """
+    The benchmark cases, sharing one fixture and fake clients
+    """
+
+    def __init__(
+        self,
+        fixture: BenchmarkFixture,
+        workdir: str,
+        repeat: int,
+        llm_latency: float,
+        entrez_latency: float,
+        batch_size: int,
+    ):
+        self.fixture = fixture
+        self.workdir = workdir
+        self.repeat = repeat
+        self.llm_latency = llm_latency
+        self.entrez_latency = entrez_latency
+        self.batch_size = batch_size
+        self._caches = itertools.count()
+
+    def new_assistant(self, llm_handler=None) -> MetagenomicsAssistant:
+        genome_cache = GenomeSizeCache(
+            os.path.join(self.workdir, f"genome_sizes_{next(self._caches)}.sqlite")
+        )
+        return MetagenomicsAssistant(
+            llm_handler=llm_handler or fake_aws_handler(self.llm_latency),
+            genome_cache=genome_cache,
+            entrez=fake_entrez_client(self.entrez_latency),
+            kb=KnowledgeBase(self.fixture.knowledge_base),
+            taxonomy_db=self.fixture.taxonomy_db,
+            relative_index_path=self.fixture.relative_index,
+            name_index_path=self.fixture.name_index,
+        )
+
+    def cold_start(self) -> dict:
+        import_samples = []
+        for _ in range(max(2, self.repeat // 20)):
+            started = time.perf_counter()
+            subprocess.run(
+                [sys.executable, "-c", "import parse_config"], cwd=REPO_DIR, check=True
+            )
+            import_samples.append(time.perf_counter() - started)
+
+        species = list(self.fixture.species)
+        first_samples = []
+        for tax_id in species[: max(2, self.repeat // 20)]:
+            started = time.perf_counter()
+            assistant = self.new_assistant()
+            assistant.set_organism_fields(tax_id)
+            first_samples.append(time.perf_counter() - started)
+
+        return {
+            "import_parse_config": summarize(import_samples),
+            "first_set_organism_fields": summarize(first_samples),
+        }
+
+    def lookups(self) -> dict:
+        assistant = self.new_assistant()
+        assistant.relative_index  # load the index outside the measurements
+
+        def clear_row_caches():
+            for cache in assistant._row_cache.values():
+                cache.clear()
+
+        def lookup(tax_id):
+            assistant._get_data_with_fallback(tax_id, "data", "Diseases")
+
+        results = {}
+        for path, ids in (
+            ("hit", self.fixture.hit_ids),
+            ("merged", self.fixture.merged_ids),
+            ("descendant", self.fixture.descendant_ids),
+            ("miss", self.fixture.miss_ids),
+        ):
+            results[f"data_with_fallback_{path}"] = measure(
+                lookup, ids, self.repeat, setup=clear_row_caches
+            )
+        results["data_with_fallback_cached"] = measure(
+            lookup, self.fixture.hit_ids, self.repeat
+        )
+        results["get_organism_rank"] = measure(
+            lambda tax_id: assistant.get_organism_rank(tax_id, "genus"),
+            list(self.fixture.species),
+            self.repeat,
+        )
+
+        index = assistant.name_index
+        names = list(self.fixture.species.values())
+        # Same names lowercased with one letter dropped
+        misspelled = [name[:4] + name[5:] for name in names]
+        results["resolve_name_exact"] = measure(index.resolve, names, self.repeat)
+        results["resolve_name_fuzzy"] = measure(index.resolve, misspelled, self.repeat)
+        return results
+
+    def enrichment(self) -> dict:
+        assistant = self.new_assistant()
+        species = list(self.fixture.species)
+        repeat = min(self.repeat, len(species))
+
+        def clear_row_caches():
+            for cache in assistant._row_cache.values():
+                cache.clear()
+
+        # First pass: every genome size comes from the fake Entrez
+        cold = measure(
+            assistant.set_organism_fields,
+            species,
+            repeat,
+            setup=clear_row_caches,
+        )
+        warm = measure(assistant.set_organism_fields, species[:repeat], repeat)
+
+        infos = {tax_id: assistant.set_organism_fields(tax_id) for tax_id in species}
+        prompt = measure(
+            lambda tax_id: assistant.build_report_prompt(
+                tax_id, "English", organism_info=infos[tax_id]
+            ),
+            species,
+            self.repeat,
+        )
+        return {
+            "set_organism_fields_cold": cold,
+            "set_organism_fields_warm": warm,
+            "build_report_prompt": prompt,
+        }
+
+    def batch(self) -> dict:
+        species = list(self.fixture.species)[: self.batch_size]
+        rows = [
+            BatchRow(sample_id=str(tax_id), tax_id=str(tax_id)) for tax_id in species
+        ]
+        results = {}
+
+        def record(name: str, started: float, batch_results) -> None:
+            elapsed = time.perf_counter() - started
+            results[name] = {
+                "rows": len(rows),
+                "failed": sum(not result.ok for result in batch_results),
+                "elapsed_s": elapsed,
+                "reports_per_min": len(rows) / elapsed * 60,
+            }
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            for workers in THREAD_WORKERS:
+                assistant = self.new_assistant(fake_aws_handler(self.llm_latency))
+                started = time.perf_counter()
+                batch_results = run_batch(assistant, rows, workers=workers)
+                record(f"threads_{workers}", started, batch_results)
+
+            for concurrency in ASYNC_CONCURRENCY:
+                assistant = self.new_assistant(fake_gemini_handler(self.llm_latency))
+                started = time.perf_counter()
+                batch_results = asyncio.run(
+                    arun_batch(assistant, rows, concurrency=concurrency)
+                )
+                record(f"async_{concurrency}", started, batch_results)
+        return results
+
+    def run_all(self) -> dict:
+        return {
+            "cold_start": self.cold_start(),
+            "lookups": self.lookups(),
+            "enrichment": self.enrichment(),
+            "batch": self.batch(),
+        }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(
+    repeat: int = 200,
+    llm_latency: float = 0.2,
+    entrez_latency: float = 0.05,
+    batch_size: int = 64,
+) -> dict:
+    """
+    Run every benchmark on a fresh fixture and return the JSON document
+    """
+    settings = {
+        "repeat": repeat,
+        "llm_latency_s": llm_latency,
+        "entrez_latency_s": entrez_latency,
+        "batch_size": batch_size,
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        fixture = make_fixture(os.path.join(workdir, "fixture"))
+        benchmarks = PipelineBenchmarks(
+            fixture, workdir, repeat, llm_latency, entrez_latency, batch_size
+        )
+        results = benchmarks.run_all()
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "settings": settings,
+        },
+        "results": results,
+    }
+
+
+def _headline(value: dict) -> float | None:
+    """
+    Number compared between runs: median latency or batch throughput
+    """
+    if "median_ms" in value:
+        return value["median_ms"]
+    return value.get("reports_per_min")
+
+
+def compare(current: dict, baseline: dict) -> list[str]:
+    """
+    One line per benchmark with its change against baseline
+    """
+    lines = []
+    for group, cases in current["results"].items():
+        for name, value in cases.items():
+            old = baseline.get("results", {}).get(group, {}).get(name)
+            new_value = _headline(value)
+            old_value = _headline(old) if old else None
+            unit = "ms" if "median_ms" in value else "reports/min"
+            if not old_value:
+                lines.append(f"{group}/{name}: {new_value:.3f} {unit} (new)")
+                continue
+            change = (new_value - old_value) / old_value * 100
+            lines.append(
+                f"{group}/{name}: {old_value:.3f} -> {new_value:.3f} {unit} ({change:+.1f}%)"
+            )
+    return lines
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="JSON file for the results (default: benchmarks/results/<commit>.json)",
+    )
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    parser.add_argument(
+        "--quick",
+        action="store_true",
+        help="Few repetitions and a small batch (smoke run)",
+    )
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--entrez-latency", type=float, default=0.05)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.repeat = min(args.repeat, 20)
+        args.batch_size = min(args.batch_size, 16)
+
+    document = run_benchmarks(
+        args.repeat, args.llm_latency, args.entrez_latency, args.batch_size
+    )
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{document['meta']['commit'] or 'results'}.json"
+    )
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2)
+    print(f"Results written to {output}")
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    for line in compare(document, baseline or {}):
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+import asyncio
+import contextlib
+import hashlib
+import json
+import os
+import threading
+import time
+from collections.abc import Awaitable, Callable, Iterator
+from typing import TypeVar
+
+from tracing import count
+
+MODES = ("record", "replay")
+# How replayed answers are timed: at once, or after their recorded latency
+TIMINGS = ("instant", "recorded")
+
+# Fields of a request that identify the caller, not what is asked
+IGNORED_FIELDS = {"api_key", "email", "tool"}
+
+T = TypeVar("T")
+
+_cassette = None
+
+
+class CassetteMiss(LookupError):
+    """
+    A replayed request was never recorded
+    """
+
+
+def _normalize(value):
+    if isinstance(value, dict):
+        return {
+            str(key): _normalize(item)
+            for key, item in value.items()
+            if key not in IGNORED_FIELDS
+        }
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    if isinstance(value, str):
+        # prompts differing only in indentation or line breaks are the same
+        return " ".join(value.split())
+    if isinstance(value, bool) or value is None:
+        return value
+    return str(value)
+
+
+def request_key(kind: str, request: dict) -> str:
+    """
+    Stable key of a request: the hash of its normalized JSON, without
+    credentials, whitespace differences or number/string differences
+    """
+    canonical = json.dumps(
+        {"kind": kind, "request": _normalize(request)},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """
+    Responses of Entrez and LLM calls saved in a JSON lines file, with the
+    latency they were observed with.
+
+    In record mode every call goes to the network and its response is
+    appended to the file (a later recording of the same request wins). In
+    replay mode the responses are served from the file, at once or after
+    their recorded latency, and a request never recorded raises
+    CassetteMiss. Safe to use from several threads.
+    """
+
+    def __init__(self, path: str, mode: str = "replay", timing: str = "instant"):
+        if mode not in MODES:
+            raise ValueError(f"Unsupported cassette mode: {mode}")
+        if timing not in TIMINGS:
+            raise ValueError(f"Unsupported replay timing: {timing}")
+        self.path = path
+        self.mode = mode
+        self.timing = timing
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._file = None
+
+        if mode == "replay" or os.path.exists(path):
+            self._load()
+        if mode == "record":
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(path, "a", encoding="utf-8")
+
+    def _load(self) -> None:
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.entries[entry["key"]] = entry
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _save(self, kind: str, request: dict, response, latency) -> None:
+        entry = {
+            "key": request_key(kind, request),
+            "kind": kind,
+            "request": request,
+            "response": response,
+            "latency": latency,
+        }
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            self.entries[entry["key"]] = entry
+            self._file.write(line)
+            self._file.flush()
+        count(f"cassette.{kind}.recorded")
+
+    def _lookup(self, kind: str, request: dict) -> dict:
+        entry = self.entries.get(request_key(kind, request))
+        if entry is None:
+            count(f"cassette.{kind}.miss")
+            raise CassetteMiss(f"No recorded {kind} response for this request")
+        count(f"cassette.{kind}.replayed")
+        return entry
+
+    def call(
+        self,
+        kind: str,
+        request: dict,
+        fn: Callable[[], T],
+        encode: Callable[[T], object] | None = None,
+        decode: Callable[[object], T] | None = None,
+    ) -> T:
+        """
+        Replay the response of request, or run fn and record it. encode
+        and decode convert responses that are not JSON.
+        """
+        if self.mode == "replay":
+            entry = self._lookup(kind, request)
+            if self.timing == "recorded":
+                time.sleep(entry["latency"])
+            return decode(entry["response"]) if decode else entry["response"]
+
+        started = time.perf_counter()
+        result = fn()
+        latency = time.perf_counter() - started
+        self._save(kind, request, encode(result) if encode else result, latency)
+        return result
+
+    async def acall(
+        self,
+        kind: str,
+        request: dict,
+        fn: Callable[[], Awaitable[T]],
+        encode: Callable[[T], object] | None = None,
+        decode: Callable[[object], T] | None = None,
+    ) -> T:
+        """
+        Async variant of call
+        """
+        if self.mode == "replay":
+            entry = self._lookup(kind, request)
+            if self.timing == "recorded":
+                await asyncio.sleep(entry["latency"])
+            return decode(entry["response"]) if decode else entry["response"]
+
+        started = time.perf_counter()
+        result = await fn()
+        latency = time.perf_counter() - started
+        self._save(kind, request, encode(result) if encode else result, latency)
+        return result
+
+    def stream(
+        self, kind: str, request: dict, fn: Callable[[], Iterator[str]]
+    ) -> Iterator[str]:
+        """
+        Replay the chunks of a streamed answer, or stream fn() and record
+        them with the time each arrived. Broken streams are not recorded.
+        """
+        if self.mode == "replay":
+            entry = self._lookup(kind, request)
+            started = time.perf_counter()
+            for chunk, offset in zip(entry["response"], entry["latency"]):
+                if self.timing == "recorded":
+                    time.sleep(max(0.0, offset - (time.perf_counter() - started)))
+                yield chunk
+            return
+
+        started = time.perf_counter()
+        chunks = []
+        offsets = []
+        for chunk in fn():
+            chunks.append(chunk)
+            offsets.append(time.perf_counter() - started)
+            yield chunk
+        self._save(kind, request, chunks, offsets)
+
+
+def get_cassette() -> Cassette | None:
+    return _cassette
+
+
+def set_cassette(cassette: Cassette | None) -> None:
+    global _cassette
+    _cassette = cassette
+
+
+def recorded(
+    kind: str,
+    request: dict,
+    fn: Callable[[], T],
+    encode: Callable[[T], object] | None = None,
+    decode: Callable[[object], T] | None = None,
+) -> T:
+    """
+    Run fn through the active cassette, or just run it when there is none
+    """
+    if _cassette is None:
+        return fn()
+    return _cassette.call(kind, request, fn, encode, decode)
+
+
+async def arecorded(
+    kind: str,
+    request: dict,
+    fn: Callable[[], Awaitable[T]],
+    encode: Callable[[T], object] | None = None,
+    decode: Callable[[object], T] | None = None,
+) -> T:
+    """
+    Async variant of recorded
+    """
+    if _cassette is None:
+        return await fn()
+    return await _cassette.acall(kind, request, fn, encode, decode)
+
+
+def recorded_stream(
+    kind: str, request: dict, fn: Callable[[], Iterator[str]]
+) -> Iterator[str]:
+    """
+    Stream fn() through the active cassette, or directly when there is none
+    """
+    if _cassette is None:
+        return fn()
+    return _cassette.stream(kind, request, fn)
+
+
+@contextlib.contextmanager
+def cassette_session(
+    record: str | None = None, replay: str | None = None, timing: str = "instant"
+) -> Iterator[Cassette | None]:
+    """
+    Record the Entrez and LLM calls of the enclosed work to a cassette
+    file, or replay them from one. Without a file this does nothing.
+    """
+    if not (record or replay):
+        yield None
+        return
+
+    cassette = Cassette(record or replay, "record" if record else "replay", timing)
+    set_cassette(cassette)
+    try:
+        yield cassette
+    finally:
+        set_cassette(None)
+        cassette.close()
@@ -0,0 +1,304 @@
+import csv
+import gzip
+import logging
+import os
+import re
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from typing import NamedTuple
+
+from batch import BatchResult, BatchRow
+
+FORMATS = ("kraken", "bracken", "centrifuge")
+
+# One-letter rank codes of Kraken-style reports (Kraken2, Bracken's
+# .kreport, centrifuge-kreport); a digit suffix marks ranks below them
+RANK_CODES = {
+    "superkingdom": "D",
+    "kingdom": "K",
+    "phylum": "P",
+    "class": "C",
+    "order": "O",
+    "family": "F",
+    "genus": "G",
+    "species": "S",
+}
+
+KRAKEN_RANK_CODE = re.compile(r"-|[URDKPCOFGS]\d*")
+
+# Columns of the tabular reports: TaxID, name, rank, reads, abundance
+# (as a fraction of the sample)
+TABLE_COLUMNS = {
+    "bracken": (
+        "taxonomy_id",
+        "name",
+        "taxonomy_lvl",
+        "new_est_reads",
+        "fraction_total_reads",
+    ),
+    "centrifuge": ("taxID", "name", "taxRank", "numReads", "abundance"),
+}
+
+# Taxa rolled up through the taxonomy database at once
+ROLLUP_CHUNK_SIZE = 5000
+
+SAMPLE_MAP_COLUMNS = ("sample_id", "tax_id", "name", "reads", "abundance", "report")
+
+
+class Hit(NamedTuple):
+    """
+    Reads of one sample assigned to a taxon at the target rank
+    """
+
+    tax_id: int
+    name: str
+    reads: int
+    abundance: float  # percent of the sample
+
+
+def _open_text(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def sample_id_from_path(path: str) -> str:
+    """
+    Sample name of a report file: its name up to the first dot
+    """
+    return os.path.basename(path).split(".", 1)[0]
+
+
+def _is_kraken_line(fields: list[str]) -> bool:
+    if len(fields) not in (6, 8):
+        return False
+    try:
+        float(fields[0])
+    except ValueError:
+        return False
+    code = fields[-3].strip()
+    return bool(KRAKEN_RANK_CODE.fullmatch(code))
+
+
+def detect_format(path: str) -> str:
+    """
+    Format of a classifier report, from its first line: a Kraken-style
+    report (also written by Bracken and centrifuge-kreport) or the
+    tabular output of Bracken or Centrifuge
+    """
+    with _open_text(path) as f:
+        for line in f:
+            if line.strip():
+                break
+        else:
+            raise ValueError(f"{path} is empty")
+    fields = line.rstrip("\r\n").split("\t")
+    for fmt, columns in TABLE_COLUMNS.items():
+        if set(columns) <= set(fields):
+            return fmt
+    if _is_kraken_line(fields):
+        return "kraken"
+    raise ValueError(f"{path} is not a Kraken2, Bracken or Centrifuge report")
+
+
+def _kraken_hits(lines: Iterable[str], rank: str) -> Iterator[Hit]:
+    """
+    Rows at the target rank, with the reads of their whole clade. Strains
+    and subspecies (S1, S2...) are already counted in their species row.
+    """
+    code = RANK_CODES[rank]
+    for line in lines:
+        fields = line.rstrip("\r\n").split("\t")
+        if len(fields) < 6 or fields[-3].strip() != code:
+            continue
+        yield Hit(
+            tax_id=int(fields[-2]),
+            name=fields[-1].strip(),
+            reads=int(fields[1]),
+            abundance=float(fields[0]),
+        )
+
+
+def _add(totals: dict, tax_id: int, name: str, reads: int, abundance: float) -> None:
+    previous = totals.get(tax_id)
+    if previous is not None:
+        name = previous.name or name
+        reads += previous.reads
+        abundance += previous.abundance
+    totals[tax_id] = Hit(tax_id, name, reads, abundance)
+
+
+def _table_hits(
+    lines: Iterable[str], fmt: str, rank: str, taxonomy=None
+) -> Iterator[Hit]:
+    """
+    Rows at the target rank, with the reads of rows at other ranks summed
+    into their ancestor at the target rank (looked up in bulk once the
+    file is read). Memory grows with the number of taxa, not of lines.
+    """
+    tax_id_col, name_col, rank_col, reads_col, abundance_col = TABLE_COLUMNS[fmt]
+    code = RANK_CODES[rank]
+    totals = {}
+    rollup = {}
+    skipped = 0
+    for record in csv.DictReader(lines, delimiter="\t"):
+        tax_id = int(record[tax_id_col])
+        reads = int(float(record[reads_col]))
+        abundance = float(record[abundance_col]) * 100
+        if record[rank_col].strip() in (rank, code):
+            _add(totals, tax_id, record[name_col].strip(), reads, abundance)
+        elif taxonomy is None:
+            skipped += 1
+        else:
+            _add(rollup, tax_id, "", reads, abundance)
+
+    if skipped:
+        logging.warning(
+            f"{skipped} taxa not at rank {rank} were skipped: "
+            "rolling them up needs the taxonomy database"
+        )
+    for hit in _roll_up(rollup, rank, taxonomy):
+        _add(totals, *hit)
+    yield from totals.values()
+
+
+def _roll_up(rollup: dict[int, Hit], rank: str, taxonomy) -> Iterator[Hit]:
+    """
+    Sum the hits of each taxon into its ancestor at rank. Taxa above
+    rank, or without an ancestor at it, are dropped.
+    """
+    tax_ids = list(rollup)
+    totals = {}
+    for start in range(0, len(tax_ids), ROLLUP_CHUNK_SIZE):
+        lineages = taxonomy.get_lineages(tax_ids[start : start + ROLLUP_CHUNK_SIZE])
+        ranks = taxonomy.get_ranks(
+            {node for lineage in lineages.values() for node in lineage}
+        )
+        for tax_id, lineage in lineages.items():
+            ancestor = next((node for node in lineage if ranks.get(node) == rank), None)
+            if ancestor is not None:
+                hit = rollup[tax_id]
+                _add(totals, ancestor, "", hit.reads, hit.abundance)
+
+    names = taxonomy.get_names(totals) if totals else {}
+    for hit in totals.values():
+        yield hit._replace(name=names.get(hit.tax_id, ""))
+
+
+def read_classifier_report(
+    path: str,
+    rank: str = "species",
+    min_reads: int = 0,
+    min_abundance: float = 0.0,
+    taxonomy=None,
+    fmt: str | None = None,
+) -> Iterator[Hit]:
+    """
+    Stream the hits of a Kraken2, Bracken or Centrifuge report (optionally
+    gzipped) at the target rank with at least min_reads reads and
+    min_abundance percent of the sample. The taxonomy (a TaxonomyDB) rolls
+    up the taxa of tabular reports that are not at the target rank.
+    """
+    if rank not in RANK_CODES:
+        raise ValueError(f"Unsupported rank: {rank}")
+    fmt = fmt or detect_format(path)
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported report format: {fmt}")
+    with _open_text(path) as f:
+        if fmt == "kraken":
+            hits = _kraken_hits(f, rank)
+        else:
+            hits = _table_hits(f, fmt, rank, taxonomy)
+        for hit in hits:
+            if hit.reads >= min_reads and hit.abundance >= min_abundance:
+                yield hit
+
+
+@dataclass
+class Ingestion:
+    """
+    Hits of every sample, deduplicated into the organisms to report on
+    """
+
+    samples: dict[str, list[Hit]] = field(default_factory=dict)
+    names: dict[int, str] = field(default_factory=dict)
+
+    @property
+    def tax_ids(self) -> list[int]:
+        """
+        Unique TaxIDs of all samples, in the order they were first seen
+        """
+        return list(self.names)
+
+    @property
+    def total_hits(self) -> int:
+        return sum(len(hits) for hits in self.samples.values())
+
+    def add(self, sample_id: str, hits: Iterable[Hit]) -> None:
+        sample = self.samples.setdefault(sample_id, [])
+        for hit in hits:
+            sample.append(hit)
+            if not self.names.get(hit.tax_id):
+                self.names[hit.tax_id] = hit.name
+
+    def batch_rows(self) -> list[BatchRow]:
+        """
+        One batch row per unique organism; samples share its report
+        """
+        return [
+            BatchRow(sample_id=str(tax_id), tax_id=str(tax_id), organism_name=name)
+            for tax_id, name in self.names.items()
+        ]
+
+
+def ingest_reports(
+    paths: Iterable[str],
+    rank: str = "species",
+    min_reads: int = 0,
+    min_abundance: float = 0.0,
+    taxonomy=None,
+) -> Ingestion:
+    """
+    Read the classifier report of each sample and collect the organisms
+    passing the thresholds
+    """
+    ingestion = Ingestion()
+    for path in paths:
+        sample_id = sample_id_from_path(path)
+        if sample_id in ingestion.samples:
+            raise ValueError(f"Two reports are named after sample {sample_id}")
+        ingestion.add(
+            sample_id,
+            read_classifier_report(path, rank, min_reads, min_abundance, taxonomy),
+        )
+    return ingestion
+
+
+def write_sample_map(
+    path: str, ingestion: Ingestion, results: Iterable[BatchResult]
+) -> None:
+    """
+    TSV mapping each sample and organism to the outcome of the shared
+    report (ok, or the error)
+    """
+    outcomes = {
+        result.tax_id: "ok" if result.ok else result.error for result in results
+    }
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter="\t", lineterminator="\n")
+        writer.writerow(SAMPLE_MAP_COLUMNS)
+        for sample_id, hits in ingestion.samples.items():
+            for hit in hits:
+                writer.writerow(
+                    (
+                        sample_id,
+                        hit.tax_id,
+                        hit.name,
+                        hit.reads,
+                        f"{hit.abundance:.4f}",
+                        outcomes.get(str(hit.tax_id), ""),
+                    )
+                )
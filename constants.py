@@ -1,16 +1,78 @@
-from Bio import Entrez
-
 # ID from AWS MODEL: Amazon Nova Micro
 MODEL_ID_1 = "amazon.nova-micro-v1:0"
 MODEL_ID_GEMINI = "gemini-2.5-flash-lite"
 
-# Default e-mail to access NCBI with biopython
-DEFAULT_EMAIL = Entrez.email = "email@email.com"
+# Tokens an LLM may write per report
+LLM_MAX_OUTPUT_TOKENS = 300
+
+# Default LLM quotas (requests and tokens per minute), overridden by the
+# BEDROCK_/GEMINI_REQUESTS_PER_MINUTE and _TOKENS_PER_MINUTE variables
+BEDROCK_REQUESTS_PER_MINUTE = 200
+BEDROCK_TOKENS_PER_MINUTE = 400_000
+GEMINI_REQUESTS_PER_MINUTE = 60
+GEMINI_TOKENS_PER_MINUTE = 250_000
+
+# Hedged requests (--fallback-provider): percentile of the primary's
+# latency after which the prompt is also sent to the fallback, latencies
+# kept per provider, and how many are needed before hedging starts
+HEDGE_PERCENTILE = 95
+LATENCY_WINDOW = 500
+HEDGE_MIN_SAMPLES = 20
+# Threads running the calls of a hedged handler
+HEDGE_WORKERS = 64
+
+# Report languages accepted on the command line and by the service
+LANGUAGES = {"EN": "English", "PT": "Brazilian Portuguese"}
+
+# Default address of the report service (--serve)
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+
+# Prompt exemplars chosen from the old reports
+EXEMPLAR_COUNT = 2
+# Room for two of the curated reports (the longest is about 420 tokens)
+EXEMPLAR_TOKEN_BUDGET = 850
+EXEMPLAR_SEED = 0
+
+# Default e-mail sent to NCBI E-utilities
+DEFAULT_EMAIL = "email@email.com"
+
+# NCBI E-utilities
+EUTILS_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
+# Requests per second allowed by NCBI without / with an API key (NCBI_API_KEY)
+NCBI_RATE_LIMIT = 3
+NCBI_RATE_LIMIT_WITH_KEY = 10
+# Number of RefSeq complete genomes looked at per organism. The first one
+# with a length is used, nearly always the first hit, so 5 (down from the
+# 20 of the old GenBank lookup) keeps the shared esummary small
+GENOME_SEARCH_RETMAX = 5
 
 # File Paths
 OLD_REPORTS_PATH = "./files/old_reports.pkl"
 DATA_PATH = "./files/data_for_biojarvis.csv"
 ACRONYMS_PATH = "./files/acronyms.csv"
+KNOWLEDGE_BASE_PATH = "./files/knowledge_base.sqlite"
+RELATIVE_INDEX_PATH = "./files/relative_index.json"
+NAME_INDEX_PATH = "./files/name_index.sqlite"
+GENOME_CACHE_PATH = "./files/genome_sizes.sqlite"
+REPORT_STORE_PATH = "./files/report_store.sqlite"
+PRECOMPUTE_CHECKPOINT_PATH = "./files/precompute_checkpoint.jsonl"
+
+# Days before a cached genome size (or a cached "no genome found") is fetched again
+GENOME_CACHE_TTL_DAYS = 30
+GENOME_CACHE_NEGATIVE_TTL_DAYS = 7
+
+# Classifier reports (-k): rank hits are rolled up to, and the reads and
+# percent of a sample an organism needs to be reported
+CLASSIFIER_RANK = "species"
+CLASSIFIER_MIN_READS = 10
+CLASSIFIER_MIN_ABUNDANCE = 0.0
+
+# Threads per assistant running network-bound lookups of set_organism_fields
+ENRICHMENT_WORKERS = 8
+
+# Maximum number of TaxIDs kept in the curated-data lookup cache (per table)
+LOOKUP_CACHE_SIZE = 4096
 
 # Prompt Template
 PROMPT_TEMPLATE = """
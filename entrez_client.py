@@ -0,0 +1,217 @@
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from dotenv import load_dotenv
+
+from cassette import recorded
+from constants import (
+    DEFAULT_EMAIL,
+    EUTILS_URL,
+    GENOME_SEARCH_RETMAX,
+    NCBI_RATE_LIMIT,
+    NCBI_RATE_LIMIT_WITH_KEY,
+)
+from rate_limit import TokenBucket, parse_retry_after, shared_bucket
+from tracing import count, span
+
+# Above this many UIDs, summaries are fetched through the Entrez history server
+ESUMMARY_DIRECT_LIMIT = 200
+ESUMMARY_PAGE_SIZE = 500
+
+
+def retry_after_seconds(value: str | None, default: float) -> float:
+    """
+    Seconds to wait from a Retry-After header, given in seconds or as an
+    HTTP date, or default when it is missing or unreadable
+    """
+    delay = parse_retry_after(value)
+    if delay is not None:
+        return delay
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def genome_search_term(scientific_name: str) -> str:
+    """
+    esearch term for the RefSeq complete genomes of an organism
+    """
+    return f"{scientific_name} [Organism] RefSeq [filter] AND complete genome AND (bp OR nucleotides)"
+
+
+class EntrezClient:
+    """
+    Rate-limited NCBI E-utilities client reusing one HTTP session.
+
+    All clients in a process share one token bucket per rate, keeping
+    requests under NCBI's limit (3 rps, or 10 rps with an API key).
+    """
+
+    def __init__(
+        self,
+        email: str = DEFAULT_EMAIL,
+        api_key: str | None = None,
+        tool: str = "bio_jarvis",
+        session: "requests.Session | None" = None,
+        rate_limiter: TokenBucket | None = None,
+        timeout: float = 30,
+        max_retries: int = 3,
+    ):
+        load_dotenv()
+        self.email = email
+        self.api_key = api_key or os.getenv("NCBI_API_KEY")
+        self.tool = tool
+        self.timeout = timeout
+        self.max_retries = max_retries
+
+        rate = NCBI_RATE_LIMIT_WITH_KEY if self.api_key else NCBI_RATE_LIMIT
+        self.rate_limiter = rate_limiter or shared_bucket("ncbi-eutils", rate)
+
+        if session is None:
+            # requests is imported here to keep module import cheap
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=16)
+            session.mount("https://", adapter)
+        self.session = session
+
+    def _request(self, utility: str, params: dict) -> dict:
+        """
+        POST one E-utility call and return its JSON payload, replayed from
+        or recorded to the active cassette if any
+        """
+        return recorded(
+            "entrez",
+            {"utility": utility, **params},
+            lambda: self._post(utility, params),
+        )
+
+    def _post(self, utility: str, params: dict) -> dict:
+        """
+        POST one E-utility call; HTTP 429 answers are retried after the
+        advertised delay
+        """
+        data = {**params, "retmode": "json", "tool": self.tool, "email": self.email}
+        if self.api_key:
+            data["api_key"] = self.api_key
+
+        for attempt in range(self.max_retries + 1):
+            with span("entrez:rate_limit_wait", "network"):
+                self.rate_limiter.acquire()
+            count(f"network.entrez.{utility}")
+            with span(f"entrez:{utility}", "network"):
+                response = self.session.post(
+                    f"{EUTILS_URL}{utility}.fcgi", data=data, timeout=self.timeout
+                )
+            if response.status_code == 429 and attempt < self.max_retries:
+                count("network.entrez.throttled")
+                delay = retry_after_seconds(
+                    response.headers.get("Retry-After"), 1 + attempt
+                )
+                logging.warning(f"NCBI throttled {utility}, retrying in {delay}s")
+                time.sleep(delay)
+                continue
+            response.raise_for_status()
+            return response.json()
+
+    def esearch(self, db: str, term: str, retmax: int = 20) -> list[str]:
+        """
+        Return the UIDs matching term
+        """
+        payload = self._request("esearch", {"db": db, "term": term, "retmax": retmax})
+        return payload.get("esearchresult", {}).get("idlist", [])
+
+    def epost(self, db: str, ids: list[str]) -> tuple[str, str]:
+        """
+        Upload UIDs to the history server, returning (WebEnv, query_key)
+        """
+        payload = self._request("epost", {"db": db, "id": ",".join(ids)})
+        return payload["webenv"], payload["querykey"]
+
+    def esummary(self, db: str, ids: list[str]) -> dict[str, dict]:
+        """
+        Return the document summaries of ids keyed by UID.
+        Large lists are posted once and paged through the history server.
+        """
+        if not ids:
+            return {}
+
+        if len(ids) <= ESUMMARY_DIRECT_LIMIT:
+            pages = [{"id": ",".join(ids)}]
+        else:
+            webenv, query_key = self.epost(db, ids)
+            pages = [
+                {
+                    "WebEnv": webenv,
+                    "query_key": query_key,
+                    "retstart": start,
+                    "retmax": ESUMMARY_PAGE_SIZE,
+                }
+                for start in range(0, len(ids), ESUMMARY_PAGE_SIZE)
+            ]
+
+        summaries = {}
+        for page in pages:
+            result = self._request("esummary", {"db": db, **page}).get("result", {})
+            for uid in result.get("uids", []):
+                summaries[uid] = result.get(uid, {})
+        return summaries
+
+    def get_genome_sizes(self, names: dict[str, str]) -> dict[str, int | None]:
+        """
+        Resolve the genome size of many organisms.
+
+        names maps any key (usually a TaxID) to a scientific name. Lengths
+        come from compact nucleotide summaries (slen) fetched for all
+        organisms together instead of full GenBank records. The value is
+        None when there is no RefSeq complete genome; keys whose search
+        failed are left out.
+
+        Only the summaries are batched: each organism still has its own
+        esearch, so N organisms take N requests plus one esummary per 500
+        hits. An OR-ed search is not used because its hits cannot be
+        mapped back reliably. Organisms with many genomes crowd the others
+        out of retmax, and [Organism] also matches strains and synonyms,
+        whose summaries carry another TaxID and name.
+        """
+        id_lists = {}
+        for key, scientific_name in names.items():
+            try:
+                id_lists[key] = self.esearch(
+                    "nucleotide",
+                    genome_search_term(scientific_name),
+                    retmax=GENOME_SEARCH_RETMAX,
+                )
+            except Exception as e:
+                logging.error(f"Error searching genomes for {scientific_name}: {e}")
+
+        all_ids = list(dict.fromkeys(uid for ids in id_lists.values() for uid in ids))
+        summaries = self.esummary("nucleotide", all_ids)
+
+        sizes = {}
+        for key, ids in id_lists.items():
+            sizes[key] = None
+            for uid in ids:
+                length = summaries.get(uid, {}).get("slen")
+                if length:
+                    sizes[key] = int(length)
+                    break
+        return sizes
+
+    def get_genome_size(self, scientific_name: str) -> int | None:
+        """
+        Genome size of a single organism, None when there is none
+        """
+        sizes = self.get_genome_sizes({scientific_name: scientific_name})
+        if scientific_name not in sizes:
+            raise RuntimeError(f"Genome search failed for {scientific_name}")
+        return sizes[scientific_name]
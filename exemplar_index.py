@@ -0,0 +1,181 @@
+import re
+
+from constants import EXEMPLAR_COUNT, EXEMPLAR_SEED, EXEMPLAR_TOKEN_BUDGET, LANGUAGES
+
+TOKEN_PATTERN = re.compile(r"[^\W\d_]{2,}")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+# Bonus added to the text similarity for exemplars of related organisms
+SAME_ORGANISM_BONUS = 3.0
+SAME_GENUS_BONUS = 2.0
+SAME_FAMILY_BONUS = 1.0
+SAME_LANGUAGE_BONUS = 0.5
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough LLM token count (about 4 characters per token)
+    """
+    return max(1, len(text) // 4)
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """
+    Longest prefix of whole sentences fitting in budget tokens
+    (the first sentence cut short if even it does not fit)
+    """
+    if estimate_tokens(text) <= budget:
+        return text
+    kept = ""
+    for sentence in SENTENCE_END.split(text):
+        candidate = f"{kept} {sentence}".strip()
+        if estimate_tokens(candidate) > budget:
+            break
+        kept = candidate
+    return kept or text[: budget * 4]
+
+
+def _language_code(language: str | None) -> str | None:
+    """
+    Map 'English' / 'EN' to the prefix of the report language column
+    """
+    if not language:
+        return None
+    for code, name in LANGUAGES.items():
+        if language.upper() == code or language.lower() == name.lower():
+            return code
+    return None
+
+
+class ExemplarIndex:
+    """
+    TF-IDF index over the old reports for choosing prompt exemplars.
+
+    Exemplars are ranked by text similarity to the organism information
+    plus bonuses for the same organism, genus, family and report language,
+    then added while they fit in the token budget. Ties are broken with a
+    seeded jitter, so the same inputs always give the same prompt.
+    """
+
+    def __init__(self, reports: list[dict]):
+        # NumPy is imported here to keep it out of CLI startup
+        import numpy as np
+
+        self._np = np
+        self.reports = [report for report in reports if report.get("content")]
+        self.contents = [report["content"] for report in self.reports]
+
+        documents = [
+            tokenize(
+                " ".join(
+                    report.get(key) or ""
+                    for key in ("content", "scientific_name", "genus", "family")
+                )
+            )
+            for report in self.reports
+        ]
+        self.vocabulary = {
+            term: position
+            for position, term in enumerate(
+                sorted({t for doc in documents for t in doc})
+            )
+        }
+
+        counts = np.zeros((len(documents), len(self.vocabulary)), dtype=np.float32)
+        for row, document in enumerate(documents):
+            for term in document:
+                counts[row, self.vocabulary[term]] += 1
+
+        document_frequency = (counts > 0).sum(axis=0)
+        self.idf = (np.log((1 + len(documents)) / (1 + document_frequency)) + 1).astype(
+            np.float32
+        )
+        self.matrix = self._normalize(np.log1p(counts) * self.idf)
+
+        self.tax_ids = np.array([str(r.get("tax_id") or "") for r in self.reports])
+        self.genera = np.array([(r.get("genus") or "").lower() for r in self.reports])
+        self.families = np.array(
+            [(r.get("family") or "").lower() for r in self.reports]
+        )
+        self.languages = np.array(
+            [(r.get("language") or "").upper() for r in self.reports]
+        )
+        self.token_counts = np.array([estimate_tokens(c) for c in self.contents])
+
+    def _normalize(self, matrix):
+        norms = self._np.linalg.norm(matrix, axis=-1, keepdims=True)
+        norms[norms == 0] = 1
+        return matrix / norms
+
+    def _query_vector(self, text: str):
+        vector = self._np.zeros(len(self.vocabulary), dtype=self._np.float32)
+        for term in tokenize(text):
+            position = self.vocabulary.get(term)
+            if position is not None:
+                vector[position] += 1
+        return self._normalize(self._np.log1p(vector) * self.idf)
+
+    def scores(
+        self,
+        organism_info: dict,
+        tax_id: str | int | None = None,
+        language: str | None = None,
+    ):
+        """
+        Relevance of every report to the organism
+        """
+        np = self._np
+        query = " ".join(str(value) for value in organism_info.values() if value)
+        scores = self.matrix @ self._query_vector(query)
+
+        if tax_id is not None:
+            scores += SAME_ORGANISM_BONUS * (self.tax_ids == str(tax_id))
+        genus = (organism_info.get("Genus") or "").lower()
+        if genus:
+            scores += SAME_GENUS_BONUS * (self.genera == genus)
+        family = (organism_info.get("Family") or "").lower()
+        if family:
+            scores += SAME_FAMILY_BONUS * (self.families == family)
+        code = _language_code(language)
+        if code:
+            scores += SAME_LANGUAGE_BONUS * np.char.startswith(self.languages, code)
+        return scores
+
+    def select(
+        self,
+        organism_info: dict | None = None,
+        tax_id: str | int | None = None,
+        language: str | None = None,
+        budget_tokens: int = EXEMPLAR_TOKEN_BUDGET,
+        max_exemplars: int = EXEMPLAR_COUNT,
+        seed: int = EXEMPLAR_SEED,
+    ) -> list[str]:
+        """
+        Most relevant report texts fitting together in budget_tokens
+        """
+        if not self.reports or max_exemplars < 1 or budget_tokens < 1:
+            return []
+
+        np = self._np
+        jitter = np.random.default_rng(seed).random(len(self.reports)) * 1e-6
+        ranked = np.argsort(
+            -(self.scores(organism_info or {}, tax_id, language) + jitter),
+            kind="stable",
+        )
+
+        chosen, remaining = [], budget_tokens
+        for position in ranked:
+            if len(chosen) == max_exemplars:
+                break
+            if self.token_counts[position] <= remaining:
+                chosen.append(self.contents[position])
+                remaining -= int(self.token_counts[position])
+
+        if not chosen:
+            # Even the best exemplar is too long: keep its first sentences
+            chosen.append(truncate_to_tokens(self.contents[ranked[0]], budget_tokens))
+        return chosen
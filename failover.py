@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from constants import HEDGE_MIN_SAMPLES, HEDGE_PERCENTILE, HEDGE_WORKERS, LATENCY_WINDOW
+from tracing import count, span
+
+
+class LatencyWindow:
+    """
+    Latencies of the last successful calls of a provider, with their
+    percentiles. Safe to use from several threads.
+    """
+
+    def __init__(self, size: int = LATENCY_WINDOW):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, percent: float) -> float | None:
+        """
+        Nearest-rank percentile of the window, or None when it is empty
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        rank = max(math.ceil(percent / 100 * len(samples)), 1)
+        return samples[rank - 1]
+
+
+class HedgedHandler:
+    """
+    LLM handler sending each prompt to a primary provider and, when it is
+    slower than its usual latency or fails, to a secondary one.
+
+    A call still running past the hedge_percentile latency of the primary
+    is hedged: the secondary gets the same prompt and the first answer
+    wins. A failed call fails over to the secondary at once. Hedging
+    starts once min_samples latencies are known; a hedge_percentile of 0
+    only fails over.
+
+    The losing request is cancelled when it has not started yet or runs on
+    an async client; a blocking call already in flight cannot be
+    interrupted, so its answer is discarded.
+    """
+
+    def __init__(
+        self,
+        primary,
+        secondary,
+        primary_name: str = "primary",
+        secondary_name: str = "secondary",
+        hedge_percentile: float = HEDGE_PERCENTILE,
+        min_samples: int = HEDGE_MIN_SAMPLES,
+        max_workers: int = HEDGE_WORKERS,
+    ):
+        self.handlers = {primary_name: primary, secondary_name: secondary}
+        self.primary_name = primary_name
+        self.secondary_name = secondary_name
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        self.latencies = {name: LatencyWindow() for name in self.handlers}
+        self._max_workers = max_workers
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def hedge_delay(self) -> float | None:
+        """
+        Seconds to wait for the primary before hedging, or None to never
+        hedge (disabled, or too few latencies known)
+        """
+        window = self.latencies[self.primary_name]
+        if not self.hedge_percentile or len(window) < self.min_samples:
+            return None
+        return window.percentile(self.hedge_percentile)
+
+    def percentiles(self, percents=(50, 95, 99)) -> dict[str, dict[int, float]]:
+        """
+        Latency percentiles of each provider, for reports and logs
+        """
+        return {
+            name: {percent: window.percentile(percent) for percent in percents}
+            for name, window in self.latencies.items()
+            if len(window)
+        }
+
+    def _submit(self, name: str, prompt: str):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._max_workers, thread_name_prefix="hedge"
+                )
+        return self._executor.submit(self._generate, name, prompt)
+
+    def _generate(self, name: str, prompt: str) -> str:
+        started = time.perf_counter()
+        with span(f"hedge:{name}", "llm"):
+            text = self.handlers[name].generate_text(prompt)
+        self.latencies[name].add(time.perf_counter() - started)
+        return text
+
+    async def _agenerate(self, name: str, prompt: str) -> str:
+        started = time.perf_counter()
+        try:
+            with span(f"hedge:{name}_async", "llm"):
+                text = await self.handlers[name].agenerate_text(prompt)
+        except asyncio.CancelledError:
+            # the losing call of a hedge: its latency is at least this much,
+            # and leaving it out would pull the percentiles down
+            self.latencies[name].add(time.perf_counter() - started)
+            raise
+        self.latencies[name].add(time.perf_counter() - started)
+        return text
+
+    def _failed(self, name: str, error: Exception, secondary_started: bool) -> None:
+        count(f"hedge.{name}.error")
+        if name == self.primary_name and not secondary_started:
+            count("hedge.failover")
+            logging.warning(
+                f"{name} call failed ({error}), failing over to {self.secondary_name}"
+            )
+
+    def _won(self, name: str, hedged: bool) -> None:
+        if hedged:
+            count(f"hedge.won.{name}")
+
+    def generate_text(self, prompt: str) -> str:
+        """
+        Generate text with the first provider to answer
+        """
+        futures = {}
+        timeout = self.hedge_delay()
+        hedged = secondary_started = False
+        error = None
+
+        def start(name):
+            futures[self._submit(name, prompt)] = name
+
+        start(self.primary_name)
+
+        while futures:
+            done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            timeout = None
+            if not done:
+                count("hedge.sent")
+                hedged = secondary_started = True
+                start(self.secondary_name)
+                continue
+            for future in done:
+                name = futures.pop(future)
+                try:
+                    text = future.result()
+                except Exception as e:
+                    self._failed(name, e, secondary_started)
+                    error = e
+                    if not secondary_started:
+                        secondary_started = True
+                        start(self.secondary_name)
+                    continue
+                for loser in futures:
+                    loser.cancel()
+                self._won(name, hedged)
+                return text
+        raise error
+
+    async def agenerate_text(self, prompt: str) -> str:
+        """
+        Async variant of generate_text; the losing call is cancelled
+        """
+        tasks = {}
+        timeout = self.hedge_delay()
+        hedged = secondary_started = False
+        error = None
+
+        def start(name):
+            tasks[asyncio.ensure_future(self._agenerate(name, prompt))] = name
+
+        start(self.primary_name)
+
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(
+                    tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                timeout = None
+                if not done:
+                    count("hedge.sent")
+                    hedged = secondary_started = True
+                    start(self.secondary_name)
+                    continue
+                for task in done:
+                    name = tasks.pop(task)
+                    try:
+                        text = task.result()
+                    except Exception as e:
+                        self._failed(name, e, secondary_started)
+                        error = e
+                        if not secondary_started:
+                            secondary_started = True
+                            start(self.secondary_name)
+                        continue
+                    self._won(name, hedged)
+                    return text
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stream_text(self, prompt: str) -> Iterator[str]:
+        """
+        Stream the answer of the primary, failing over to the secondary
+        when the primary fails before its first chunk. Streams are not
+        hedged: their text is already shown as it arrives.
+        """
+        chunks = iter(self.handlers[self.primary_name].stream_text(prompt))
+        try:
+            first = next(chunks, None)
+        except Exception as e:
+            self._failed(self.primary_name, e, False)
+            yield from self.handlers[self.secondary_name].stream_text(prompt)
+            return
+        if first is not None:
+            yield first
+            yield from chunks
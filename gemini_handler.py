@@ -1,7 +1,20 @@
 import os
+from collections.abc import Iterator
+from types import SimpleNamespace
 from google import genai
 from dotenv import load_dotenv
-from constants import MODEL_ID_GEMINI
+from cassette import arecorded, recorded, recorded_stream
+from constants import (
+    GEMINI_REQUESTS_PER_MINUTE,
+    GEMINI_TOKENS_PER_MINUTE,
+    LLM_MAX_OUTPUT_TOKENS,
+    MODEL_ID_GEMINI,
+)
+from exemplar_index import estimate_tokens
+from rate_limit import FATAL, THROTTLED, TRANSIENT, parse_retry_after, shared_scheduler
+from tracing import count, record_usage, span
+
+RETRY_INFO_TYPE = "type.googleapis.com/google.rpc.RetryInfo"
 
 
 class GeminiHandler:
@@ -16,20 +29,194 @@ class GeminiHandler:
         if not self.api_key:
             # It might be passed via CLI and set in env later, but good to warn/check
             pass
+        self.scheduler = shared_scheduler(
+            "gemini",
+            float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", GEMINI_REQUESTS_PER_MINUTE)),
+            float(os.getenv("GEMINI_TOKENS_PER_MINUTE", GEMINI_TOKENS_PER_MINUTE)),
+            self.classify_error,
+        )
+
+    @staticmethod
+    def classify_error(error: Exception) -> tuple[str, float | None]:
+        """
+        Whether a failed Gemini call was throttled, may succeed if retried
+        or is fatal, with the retry delay suggested by the API
+        """
+        status = getattr(error, "code", None)
+        if status == 429:
+            return THROTTLED, GeminiHandler.retry_delay(error)
+        if isinstance(status, int) and status >= 500:
+            return TRANSIENT, GeminiHandler.retry_delay(error)
+        # httpx network errors all derive from TransportError
+        if isinstance(error, (ConnectionError, TimeoutError)) or any(
+            cls.__name__ == "TransportError" for cls in type(error).__mro__
+        ):
+            return TRANSIENT, None
+        return FATAL, None
+
+    @staticmethod
+    def retry_delay(error: Exception) -> float | None:
+        """
+        retryDelay of the RetryInfo detail of an API error, if any
+        """
+        details = getattr(error, "details", None)
+        if not isinstance(details, dict):
+            return None
+        for detail in details.get("error", {}).get("details", []):
+            if detail.get("@type") == RETRY_INFO_TYPE:
+                return parse_retry_after(detail.get("retryDelay"))
+        return None
+
+    @staticmethod
+    def estimate_tokens(prompt: str) -> int:
+        """
+        Tokens a request may cost: its prompt plus the longest answer
+        """
+        return estimate_tokens(prompt) + LLM_MAX_OUTPUT_TOKENS
+
+    @staticmethod
+    def used_tokens(response) -> int | None:
+        usage = getattr(response, "usage_metadata", None)
+        counts = [
+            getattr(usage, "prompt_token_count", 0) or 0,
+            getattr(usage, "candidates_token_count", 0) or 0,
+        ]
+        if usage is None or not all(isinstance(value, int) for value in counts):
+            return None
+        return sum(counts)
+
+    @staticmethod
+    def cassette_request(prompt: str) -> dict:
+        """
+        What identifies a request in a cassette: the model and the prompt
+        """
+        return {"model": MODEL_ID_GEMINI, "prompt": prompt}
+
+    @staticmethod
+    def encode_response(response) -> dict:
+        """
+        The parts of a response the handler uses, as JSON for a cassette
+        """
+        usage = getattr(response, "usage_metadata", None)
+        fields = ("prompt_token_count", "candidates_token_count")
+        return {
+            "text": response.text,
+            "usage_metadata": {name: getattr(usage, name, None) for name in fields},
+        }
+
+    @staticmethod
+    def decode_response(recorded_response: dict):
+        return SimpleNamespace(
+            text=recorded_response["text"],
+            usage_metadata=SimpleNamespace(**recorded_response["usage_metadata"]),
+        )
 
     def setup(self):
         if self.api_key and not self.client:
             self.client = genai.Client(api_key=self.api_key)
 
+    def require_client(self) -> None:
+        self.setup()
+        if not self.client:
+            raise ValueError("Gemini Client not initialized. API Key might be missing.")
+
     def generate_text(self, prompt: str) -> str:
         """
         Generate text using Gemini model
         """
-        self.setup()
-        if not self.client:
-            raise ValueError("Gemini Client not initialized. API Key might be missing.")
-        
-        response = self.client.models.generate_content(
-            model=MODEL_ID_GEMINI, contents=prompt
+        response = recorded(
+            "gemini",
+            self.cassette_request(prompt),
+            lambda: self._scheduled_content(prompt),
+            encode=self.encode_response,
+            decode=self.decode_response,
+        )
+        self.record_gemini_usage(response)
+        return response.text
+
+    def _scheduled_content(self, prompt: str):
+        self.require_client()
+        return self.scheduler.call(
+            lambda: self._generate_content(prompt),
+            tokens=self.estimate_tokens(prompt),
+            used_tokens=self.used_tokens,
         )
+
+    def _generate_content(self, prompt: str):
+        count("network.gemini")
+        with span("gemini:generate_content", "llm"):
+            return self.client.models.generate_content(
+                model=MODEL_ID_GEMINI, contents=prompt
+            )
+
+    async def agenerate_text(self, prompt: str) -> str:
+        """
+        Generate text using the async Gemini client
+        """
+        response = await arecorded(
+            "gemini",
+            self.cassette_request(prompt),
+            lambda: self._ascheduled_content(prompt),
+            encode=self.encode_response,
+            decode=self.decode_response,
+        )
+        self.record_gemini_usage(response)
         return response.text
+
+    async def _ascheduled_content(self, prompt: str):
+        self.require_client()
+        return await self.scheduler.acall(
+            lambda: self._agenerate_content(prompt),
+            tokens=self.estimate_tokens(prompt),
+            used_tokens=self.used_tokens,
+        )
+
+    async def _agenerate_content(self, prompt: str):
+        count("network.gemini")
+        with span("gemini:generate_content_async", "llm"):
+            return await self.client.aio.models.generate_content(
+                model=MODEL_ID_GEMINI, contents=prompt
+            )
+
+    def stream_text(self, prompt: str) -> Iterator[str]:
+        """
+        Generate text with Gemini streaming, yielding text chunks as they arrive
+        """
+        yield from recorded_stream(
+            "gemini_stream",
+            self.cassette_request(prompt),
+            lambda: self._scheduled_stream(prompt),
+        )
+
+    def _scheduled_stream(self, prompt: str) -> Iterator[str]:
+        self.require_client()
+        return self.scheduler.stream(
+            lambda: self._stream_chunks(prompt), tokens=self.estimate_tokens(prompt)
+        )
+
+    def _stream_chunks(self, prompt: str) -> Iterator[str]:
+        count("network.gemini")
+        last_chunk = None
+        with span("gemini:generate_content_stream", "llm"):
+            for chunk in self.client.models.generate_content_stream(
+                model=MODEL_ID_GEMINI, contents=prompt
+            ):
+                last_chunk = chunk
+                if chunk.text:
+                    yield chunk.text
+        # The usage of a streamed answer comes with its last chunk
+        if last_chunk is not None:
+            self.record_gemini_usage(last_chunk)
+
+    @staticmethod
+    def record_gemini_usage(response) -> None:
+        """
+        Record the token counts of the response usage_metadata
+        """
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            record_usage(
+                "gemini",
+                getattr(usage, "prompt_token_count", 0) or 0,
+                getattr(usage, "candidates_token_count", 0) or 0,
+            )
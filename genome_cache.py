@@ -0,0 +1,115 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import NamedTuple
+
+from constants import GENOME_CACHE_TTL_DAYS, GENOME_CACHE_NEGATIVE_TTL_DAYS
+
+SECONDS_PER_DAY = 86400
+
+
+class GenomeSizeEntry(NamedTuple):
+    """
+    Cached genome size. size is None when NCBI had no RefSeq complete genome.
+    """
+
+    size: int | None
+    fetched_at: float
+
+
+class GenomeSizeCache:
+    """
+    sqlite-backed cache of genome sizes keyed by TaxID and scientific name
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl_days: float = GENOME_CACHE_TTL_DAYS,
+        negative_ttl_days: float = GENOME_CACHE_NEGATIVE_TTL_DAYS,
+    ):
+        self.path = path
+        self.ttl = ttl_days * SECONDS_PER_DAY
+        self.negative_ttl = negative_ttl_days * SECONDS_PER_DAY
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    directory = os.path.dirname(self.path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    with closing(sqlite3.connect(self.path, timeout=30)) as conn:
+                        conn.execute("PRAGMA journal_mode=WAL")
+                        conn.execute("""
+                            CREATE TABLE IF NOT EXISTS genome_sizes (
+                                tax_id TEXT NOT NULL,
+                                scientific_name TEXT NOT NULL,
+                                size INTEGER,
+                                fetched_at REAL NOT NULL,
+                                PRIMARY KEY (tax_id, scientific_name)
+                            )
+                            """)
+                        conn.commit()
+                    self._initialized = True
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(
+        self, tax_id: str | int, scientific_name: str, allow_stale: bool = False
+    ) -> GenomeSizeEntry | None:
+        """
+        Return the cached entry, or None on a miss or an expired entry.
+        With allow_stale, expired entries are returned too (offline mode).
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT size, fetched_at FROM genome_sizes "
+                "WHERE tax_id = ? AND scientific_name = ?",
+                (str(tax_id), scientific_name),
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        entry = GenomeSizeEntry(size=row[0], fetched_at=row[1])
+        ttl = self.ttl if entry.size is not None else self.negative_ttl
+        if not allow_stale and time.time() - entry.fetched_at > ttl:
+            return None
+        return entry
+
+    def delete(self, tax_ids) -> int:
+        """
+        Forget the sizes of the given TaxIDs. Returns the number removed.
+        """
+        with closing(self._connect()) as conn:
+            removed = conn.executemany(
+                "DELETE FROM genome_sizes WHERE tax_id = ?",
+                ((str(tax_id),) for tax_id in tax_ids),
+            ).rowcount
+            conn.commit()
+        return removed
+
+    def clear(self) -> int:
+        """
+        Forget every cached size. Returns the number removed.
+        """
+        with closing(self._connect()) as conn:
+            removed = conn.execute("DELETE FROM genome_sizes").rowcount
+            conn.commit()
+        return removed
+
+    def set(self, tax_id: str | int, scientific_name: str, size: int | None) -> None:
+        """
+        Store a genome size, or None to remember that there is none
+        """
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO genome_sizes "
+                "(tax_id, scientific_name, size, fetched_at) VALUES (?, ?, ?, ?)",
+                (str(tax_id), scientific_name, size, time.time()),
+            )
+            conn.commit()
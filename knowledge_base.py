@@ -0,0 +1,271 @@
+import csv
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import closing
+
+from constants import (
+    ACRONYMS_PATH,
+    DATA_PATH,
+    KNOWLEDGE_BASE_PATH,
+    OLD_REPORTS_PATH,
+)
+
+KB_VERSION = 1
+
+# Curated tables compiled into the knowledge base
+DEFAULT_SOURCES = {
+    "reports": OLD_REPORTS_PATH,
+    "data": DATA_PATH,
+    "acronyms": ACRONYMS_PATH,
+}
+
+# Column holding the organism name in each curated table
+NAME_COLUMNS = {"data": "Organism", "acronyms": "Name"}
+
+REPORT_COLUMNS = ["content", "language", "tax_id", "scientific_name", "family", "genus"]
+
+
+def source_stats(sources: dict[str, str]) -> dict[str, list[int]]:
+    """
+    Size and mtime of every source file, used to notice edited sources
+    """
+    stats = {}
+    for name, path in sorted(sources.items()):
+        stat = os.stat(path)
+        stats[name] = [stat.st_size, stat.st_mtime_ns]
+    return stats
+
+
+class KnowledgeBase:
+    """
+    Read-only view of the compiled knowledge base.
+
+    The curated CSVs and old reports are stored in one indexed sqlite file,
+    so lookups by TaxID need neither pandas nor parsing at startup. Each
+    thread gets its own memory-mapped, read-only connection.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        meta = dict(self._conn.execute("SELECT key, value FROM meta").fetchall())
+        if int(meta.get("version", 0)) != KB_VERSION:
+            raise ValueError(f"Knowledge base {path} has an unsupported version")
+        self.content_hash = meta["content_hash"]
+        self.sources = json.loads(meta["sources"])
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            conn.execute("PRAGMA mmap_size=67108864")
+            self._local.conn = conn
+        return conn
+
+    def get_row(self, table: str, tax_id: str | int) -> dict | None:
+        """
+        First curated row of table ('data' or 'acronyms') for tax_id
+        """
+        row = self._conn.execute(
+            "SELECT columns FROM curated WHERE source = ? AND tax_id = ? "
+            "ORDER BY position LIMIT 1",
+            (table, str(tax_id)),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def annotated_tax_ids(self, table: str) -> list[str]:
+        """
+        TaxIDs of a curated table in file order
+        """
+        rows = self._conn.execute(
+            "SELECT tax_id FROM curated WHERE source = ? ORDER BY position", (table,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def curated_names(self) -> list[tuple[str, str]]:
+        """
+        (TaxID, organism name) of every curated row, in table and file order
+        """
+        names = []
+        for table, column in NAME_COLUMNS.items():
+            rows = self._conn.execute(
+                "SELECT tax_id, columns FROM curated WHERE source = ? "
+                "ORDER BY position",
+                (table,),
+            ).fetchall()
+            for tax_id, columns in rows:
+                name = json.loads(columns).get(column)
+                if tax_id and name:
+                    names.append((tax_id, name))
+        return names
+
+    def reports(self) -> list[dict]:
+        """
+        All old reports with their organism metadata
+        """
+        rows = self._conn.execute(
+            f"SELECT {', '.join(REPORT_COLUMNS)} FROM reports ORDER BY id"
+        ).fetchall()
+        return [dict(zip(REPORT_COLUMNS, row)) for row in rows]
+
+
+def _read_csv_rows(path: str) -> list[dict]:
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return [
+            {column: (value if value != "" else None) for column, value in row.items()}
+            for row in csv.DictReader(f)
+        ]
+
+
+def _read_reports(path: str) -> list[dict]:
+    # The old reports are a pickled DataFrame, so pandas is needed here only
+    import pandas as pd
+
+    df_text = pd.read_pickle(path)
+    reports = []
+    for record in df_text.to_dict(orient="records"):
+        report = {
+            "content": record.get("content"),
+            "language": record.get("language"),
+            "tax_id": record.get("ncbi_tax_id"),
+            "scientific_name": record.get("scientific_name"),
+            "family": record.get("family"),
+            "genus": record.get("genus"),
+        }
+        reports.append(
+            {
+                key: (None if pd.isna(value) else str(value))
+                for key, value in report.items()
+            }
+        )
+    return reports
+
+
+def create_knowledge_base(
+    path: str,
+    reports: list[dict],
+    tables: dict[str, list[dict]],
+    sources: dict | None = None,
+) -> KnowledgeBase:
+    """
+    Write a knowledge base from already loaded records.
+    Each table row must have a 'TaxID' column. The file is written to a
+    temporary file of its own next to path and moved into place, so
+    readers never see a partial file and concurrent builds do not clash.
+    """
+    payload = json.dumps(
+        {"version": KB_VERSION, "reports": reports, "tables": tables}, sort_keys=True
+    )
+    content_hash = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=f"{os.path.basename(path)}.", suffix=".tmp", dir=directory or None
+    )
+    os.close(fd)
+    try:
+        _write_knowledge_base(tmp_path, reports, tables, sources, content_hash)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return KnowledgeBase(path)
+
+
+def _write_knowledge_base(
+    path: str,
+    reports: list[dict],
+    tables: dict[str, list[dict]],
+    sources: dict | None,
+    content_hash: str,
+) -> None:
+    with closing(sqlite3.connect(path)) as conn:
+        conn.executescript("""
+            CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE curated (
+                source TEXT, tax_id TEXT, position INTEGER, columns TEXT
+            );
+            CREATE INDEX curated_taxid ON curated (source, tax_id, position);
+            CREATE TABLE reports (
+                id INTEGER PRIMARY KEY, content TEXT, language TEXT, tax_id TEXT,
+                scientific_name TEXT, family TEXT, genus TEXT
+            );
+            """)
+        for table, rows in tables.items():
+            conn.executemany(
+                "INSERT INTO curated VALUES (?, ?, ?, ?)",
+                [
+                    (table, str(row["TaxID"]), position, json.dumps(row))
+                    for position, row in enumerate(rows)
+                ],
+            )
+        conn.executemany(
+            f"INSERT INTO reports ({', '.join(REPORT_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                tuple(report.get(column) for column in REPORT_COLUMNS)
+                for report in reports
+            ],
+        )
+        conn.executemany(
+            "INSERT INTO meta VALUES (?, ?)",
+            [
+                ("version", str(KB_VERSION)),
+                ("content_hash", content_hash),
+                ("sources", json.dumps(sources or {})),
+                ("built_at", str(time.time())),
+            ],
+        )
+        conn.commit()
+
+
+def build_knowledge_base(
+    path: str = KNOWLEDGE_BASE_PATH, sources: dict[str, str] = DEFAULT_SOURCES
+) -> KnowledgeBase:
+    """
+    Compile the old reports and curated CSVs into the knowledge base
+    """
+    started = time.perf_counter()
+    kb = create_knowledge_base(
+        path,
+        reports=_read_reports(sources["reports"]),
+        tables={
+            table: _read_csv_rows(sources[table])
+            for table in sources
+            if table != "reports"
+        },
+        sources=source_stats(sources),
+    )
+    logging.info(
+        f"Built knowledge base {path} in {time.perf_counter() - started:.2f}s "
+        f"(content hash {kb.content_hash[:12]})"
+    )
+    return kb
+
+
+def load_knowledge_base(
+    path: str = KNOWLEDGE_BASE_PATH, sources: dict[str, str] = DEFAULT_SOURCES
+) -> KnowledgeBase:
+    """
+    Open the knowledge base, compiling it first when it is missing, from
+    another version, or older than its source files.
+    """
+    if os.path.exists(path):
+        try:
+            kb = KnowledgeBase(path)
+            sources_present = all(os.path.exists(p) for p in sources.values())
+            if not sources_present or kb.sources == source_stats(sources):
+                return kb
+            logging.info(f"Knowledge base {path} is outdated, rebuilding")
+        except (sqlite3.Error, ValueError, KeyError) as e:
+            logging.warning(f"Rebuilding unreadable knowledge base {path}: {e}")
+
+    return build_knowledge_base(path, sources)
@@ -0,0 +1,408 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import unicodedata
+from array import array
+from collections import Counter
+from contextlib import closing
+from typing import NamedTuple
+
+from relative_index import taxonomy_signature
+from taxonomy_db import select_in
+
+INDEX_VERSION = 1
+
+# Rank of a name among those sharing a key: curated names win over
+# scientific names, which win over synonyms and common names
+CURATED, SCIENTIFIC, SYNONYM, COMMON = range(4)
+
+# Names closer than this (Dice coefficient of trigrams) are accepted
+FUZZY_MIN_SCORE = 0.6
+# Candidates are gathered from the rarest trigrams of a query, reading at
+# most POSTINGS_BUDGET postings once MIN_QUERY_GRAMS trigrams are in
+MIN_QUERY_GRAMS = 3
+POSTINGS_BUDGET = 5000
+FUZZY_CANDIDATES = 50
+PREFIX_CANDIDATES = 200
+# A name starting with the query scores at least this, plus the share of
+# the name the query covers
+PREFIX_SCORE_FLOOR = 0.5
+
+NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize_name(name: str) -> str:
+    """
+    Lowercase, accents and punctuation removed, single spaces:
+    'Escherichia  coli.' and 'escherichia-coli' both give 'escherichia coli'
+    """
+    decomposed = unicodedata.normalize("NFKD", name.casefold())
+    ascii_name = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return NON_ALNUM.sub(" ", ascii_name).strip()
+
+
+def trigrams(key: str) -> set[str]:
+    padded = f"  {key} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def dice(a: set[str], b: set[str]) -> float:
+    return 2 * len(a & b) / (len(a) + len(b)) if a or b else 0.0
+
+
+class NameMatch(NamedTuple):
+    """
+    Organism name found for a query, with how it was matched
+    ('exact', 'prefix' or 'fuzzy') and a score between 0 and 1
+    """
+
+    name: str
+    tax_id: str
+    score: float
+    match: str
+
+
+def curated_signature(curated: list[tuple[str, str]]) -> str:
+    digest = hashlib.sha1()
+    for tax_id, name in curated:
+        digest.update(f"{tax_id}\t{name}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _taxonomy_names(dbfile: str):
+    """
+    (name, TaxID, priority) of every scientific name, synonym and common
+    name in the ete sqlite database
+    """
+    with closing(sqlite3.connect(f"file:{dbfile}?mode=ro", uri=True)) as conn:
+        tables = {
+            row[0]
+            for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
+        }
+        for tax_id, spname, common in conn.execute(
+            "SELECT taxid, spname, common FROM species"
+        ):
+            if spname:
+                yield spname, str(tax_id), SCIENTIFIC
+            if common:
+                yield common, str(tax_id), COMMON
+        if "synonym" in tables:
+            for tax_id, spname in conn.execute("SELECT taxid, spname FROM synonym"):
+                if spname:
+                    yield spname, str(tax_id), SYNONYM
+
+
+def build_name_index(
+    path: str, dbfile: str, curated: list[tuple[str, str]]
+) -> "NameIndex":
+    """
+    Write the name index of the taxonomy database and the curated
+    (TaxID, name) pairs to path, replacing any previous file
+    """
+    started = time.perf_counter()
+    key_ids = {}
+    names = {}
+    postings = {}
+
+    def add(name: str, tax_id: str, priority: int) -> None:
+        key = normalize_name(name)
+        if not key:
+            return
+        key_id = key_ids.get(key)
+        if key_id is None:
+            key_id = key_ids[key] = len(key_ids) + 1
+            for gram in trigrams(key):
+                postings.setdefault(gram, array("I")).append(key_id)
+        current = names.get((key_id, tax_id))
+        if current is None or priority < current[1]:
+            names[(key_id, tax_id)] = (name, priority)
+
+    for tax_id, name in curated:
+        add(name, str(tax_id), CURATED)
+    for name, tax_id, priority in _taxonomy_names(dbfile):
+        add(name, tax_id, priority)
+
+    signature = {
+        "version": INDEX_VERSION,
+        "taxonomy": taxonomy_signature(dbfile),
+        "curated": curated_signature(curated),
+    }
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # a temp file of its own, as several processes may build the index
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=f"{os.path.basename(path)}.", suffix=".tmp", dir=directory or None
+    )
+    os.close(fd)
+    try:
+        _write_name_index(tmp_path, signature, key_ids, names, postings)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    logging.info(
+        f"Built name index in {time.perf_counter() - started:.2f}s "
+        f"({len(names)} names, {len(key_ids)} keys)"
+    )
+    return NameIndex(path)
+
+
+def _write_name_index(
+    path: str, signature: dict, key_ids: dict, names: dict, postings: dict
+) -> None:
+    with closing(sqlite3.connect(path)) as conn:
+        conn.executescript("""
+            CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE keys (id INTEGER PRIMARY KEY, key TEXT NOT NULL);
+            CREATE TABLE names (key_id INTEGER NOT NULL, name TEXT NOT NULL,
+                                tax_id TEXT NOT NULL, priority INTEGER NOT NULL);
+            CREATE TABLE grams (gram TEXT PRIMARY KEY, df INTEGER NOT NULL,
+                                postings BLOB NOT NULL) WITHOUT ROWID;
+            """)
+        conn.execute(
+            "INSERT INTO meta VALUES ('signature', ?)", (json.dumps(signature),)
+        )
+        conn.executemany(
+            "INSERT INTO keys VALUES (?, ?)",
+            ((key_id, key) for key, key_id in key_ids.items()),
+        )
+        conn.executemany(
+            "INSERT INTO names VALUES (?, ?, ?, ?)",
+            (
+                (key_id, name, tax_id, priority)
+                for (key_id, tax_id), (name, priority) in names.items()
+            ),
+        )
+        conn.executemany(
+            "INSERT INTO grams VALUES (?, ?, ?)",
+            ((gram, len(ids), ids.tobytes()) for gram, ids in sorted(postings.items())),
+        )
+        conn.executescript("""
+            CREATE UNIQUE INDEX keys_key ON keys (key);
+            CREATE INDEX names_key_id ON names (key_id, priority);
+            """)
+        conn.commit()
+
+
+class NameIndex:
+    """
+    On-disk index of organism names for exact, prefix and fuzzy lookups.
+
+    Names are stored under a normalized key (see normalize_name). Exact
+    and prefix lookups use the sqlite index on the keys; fuzzy lookups
+    gather candidates from an inverted index of key trigrams, using only
+    the rarest trigrams of the query, and rank them by trigram similarity.
+    Each thread gets its own read-only connection.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        row = self._conn.execute(
+            "SELECT value FROM meta WHERE key = 'signature'"
+        ).fetchone()
+        self.signature = json.loads(row[0])
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            conn.execute("PRAGMA mmap_size=268435456")
+            self._local.conn = conn
+        return conn
+
+    def _best_names(self, key_ids: list[int]) -> dict[int, tuple[str, str, int]]:
+        """
+        Highest-priority (name, TaxID, priority) of each key
+        """
+        best = {}
+        for key_id, name, tax_id, priority in select_in(
+            self._conn,
+            "SELECT key_id, name, tax_id, priority FROM names WHERE key_id IN (%s)",
+            set(key_ids),
+        ):
+            current = best.get(key_id)
+            if current is None or (priority, tax_id) < (current[2], current[1]):
+                best[key_id] = (name, tax_id, priority)
+        return best
+
+    def exact(self, query: str) -> NameMatch | None:
+        row = self._conn.execute(
+            "SELECT n.name, n.tax_id FROM keys k JOIN names n ON n.key_id = k.id "
+            "WHERE k.key = ? ORDER BY n.priority, n.tax_id LIMIT 1",
+            (normalize_name(query),),
+        ).fetchone()
+        return NameMatch(row[0], row[1], 1.0, "exact") if row else None
+
+    def search(self, query: str, limit: int = 5) -> list[NameMatch]:
+        """
+        Best matches of query: exact, then prefix, then fuzzy hits, each
+        scored by how much of the name the query covers or resembles
+        """
+        key = normalize_name(query)
+        if not key:
+            return []
+
+        scored = {}  # key_id -> (score, match, candidate key)
+        for key_id, candidate in self._prefix_candidates(key):
+            if candidate == key:
+                scored[key_id] = (1.0, "exact", candidate)
+            else:
+                coverage = len(key) / len(candidate)
+                score = PREFIX_SCORE_FLOOR + (1 - PREFIX_SCORE_FLOOR) * coverage
+                scored[key_id] = (score, "prefix", candidate)
+
+        query_grams = trigrams(key)
+        for key_id, candidate in self._fuzzy_candidates(query_grams):
+            score = dice(query_grams, trigrams(candidate))
+            if score > scored.get(key_id, (0.0,))[0]:
+                scored[key_id] = (score, "fuzzy", candidate)
+
+        names = self._best_names(list(scored))
+        ranked = sorted(
+            scored.items(),
+            key=lambda item: (-item[1][0], names[item[0]][2], len(item[1][2])),
+        )
+        return [
+            NameMatch(names[key_id][0], names[key_id][1], round(score, 4), match)
+            for key_id, (score, match, _) in ranked[:limit]
+        ]
+
+    def _prefix_candidates(self, key: str) -> list[tuple[int, str]]:
+        if len(key) < 3:
+            return self._conn.execute(
+                "SELECT id, key FROM keys WHERE key = ?", (key,)
+            ).fetchall()
+        return self._conn.execute(
+            "SELECT id, key FROM keys WHERE key >= ? AND key < ? LIMIT ?",
+            (key, key + "\uffff", PREFIX_CANDIDATES),
+        ).fetchall()
+
+    def _fuzzy_candidates(self, query_grams: set[str]) -> list[tuple[int, str]]:
+        conn = self._conn
+        frequencies = select_in(
+            conn, "SELECT gram, df FROM grams WHERE gram IN (%s)", query_grams
+        )
+        # Rarest grams first, until the postings budget is spent
+        chosen, total = [], 0
+        for gram, df in sorted(frequencies, key=lambda row: row[1]):
+            if len(chosen) >= MIN_QUERY_GRAMS and total + df > POSTINGS_BUDGET:
+                break
+            chosen.append(gram)
+            total += df
+        if not chosen:
+            return []
+
+        shared = Counter()
+        for (blob,) in select_in(
+            conn, "SELECT postings FROM grams WHERE gram IN (%s)", set(chosen)
+        ):
+            shared.update(array("I", blob))
+        # A candidate must share at least a third of the grams looked at
+        needed = max(1, len(chosen) // 3)
+        key_ids = {
+            key_id
+            for key_id, hits in shared.most_common(FUZZY_CANDIDATES)
+            if hits >= needed
+        }
+        return select_in(conn, "SELECT id, key FROM keys WHERE id IN (%s)", key_ids)
+
+    def resolve(
+        self, query: str, min_score: float = FUZZY_MIN_SCORE
+    ) -> NameMatch | None:
+        """
+        Single best match of query, if it scores at least min_score
+        """
+        match = self.exact(query)
+        if match:
+            return match
+        matches = self.search(query, limit=1)
+        if matches and matches[0].score >= min_score:
+            return matches[0]
+        return None
+
+    def resolve_many(
+        self, queries: list[str], min_score: float = FUZZY_MIN_SCORE
+    ) -> dict[str, NameMatch | None]:
+        """
+        resolve for many names at once: exact hits are looked up in a few
+        batched queries and only the remaining names are searched fuzzily
+        """
+        keys = {query: normalize_name(query) for query in dict.fromkeys(queries)}
+        best = {}
+        for key, name, tax_id, priority in select_in(
+            self._conn,
+            "SELECT k.key, n.name, n.tax_id, n.priority FROM keys k "
+            "JOIN names n ON n.key_id = k.id WHERE k.key IN (%s)",
+            set(keys.values()),
+        ):
+            current = best.get(key)
+            if current is None or (priority, tax_id) < (current[2], current[1]):
+                best[key] = (name, tax_id, priority)
+
+        resolved = {}
+        for query, key in keys.items():
+            if key in best:
+                name, tax_id, _ = best[key]
+                resolved[query] = NameMatch(name, tax_id, 1.0, "exact")
+            else:
+                resolved[query] = self.resolve(query, min_score) if key else None
+        return resolved
+
+
+def restamp_name_index(path: str, dbfile: str, previous: str) -> bool:
+    """
+    Mark the saved index as built from the current taxonomy database,
+    after an update that left every name unchanged. Returns False when
+    there is no index built from the previous database (previous being
+    its taxonomy_signature) to keep.
+    """
+    if not os.path.exists(path):
+        return False
+    with closing(sqlite3.connect(path)) as conn:
+        signature = json.loads(
+            conn.execute("SELECT value FROM meta WHERE key = 'signature'").fetchone()[0]
+        )
+        if signature.get("taxonomy") != previous:
+            return False
+        signature["taxonomy"] = taxonomy_signature(dbfile)
+        conn.execute(
+            "UPDATE meta SET value = ? WHERE key = 'signature'",
+            (json.dumps(signature),),
+        )
+        conn.commit()
+    return True
+
+
+def load_or_build_name_index(
+    path: str, dbfile: str, curated: list[tuple[str, str]], rebuild: bool = False
+) -> NameIndex:
+    """
+    Open the index saved at path, rebuilding it when it is missing or was
+    built from another taxonomy database or other curated names
+    """
+    expected = {
+        "version": INDEX_VERSION,
+        "taxonomy": taxonomy_signature(dbfile),
+        "curated": curated_signature(curated),
+    }
+
+    if not rebuild and os.path.exists(path):
+        try:
+            index = NameIndex(path)
+            if index.signature == expected:
+                return index
+        except (sqlite3.Error, ValueError, TypeError) as e:
+            logging.warning(f"Ignoring unreadable name index {path}: {e}")
+
+    return build_name_index(path, dbfile, curated)
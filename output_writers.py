@@ -0,0 +1,346 @@
+import abc
+import csv
+import importlib.util
+import json
+import logging
+import os
+import threading
+import time
+
+from constants import LANGUAGES
+from utils import atomic_write_json
+
+# Columns of the trusted-knowledge dict in tabular outputs
+ORGANISM_FIELDS = (
+    "Name",
+    "Acronym",
+    "Size",
+    "Diseases",
+    "Transmissions",
+    "Hosts",
+    "Family",
+    "Genus",
+)
+TABLE_COLUMNS = ("sample_id", "tax_id", *ORGANISM_FIELDS, "report")
+
+FILE_TYPES = ("json", "txt", "jsonl", "csv", "parquet")
+
+PARQUET_MISSING = "Parquet output needs pyarrow. Install it with 'pip install pyarrow'."
+
+
+def missing_dependency(file_type: str) -> str | None:
+    """
+    Why file_type cannot be written here, if a package it needs is not
+    installed (checked without importing it)
+    """
+    if file_type == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        return PARQUET_MISSING
+    return None
+
+
+def output_file_path(output_path: str, file_type: str) -> str:
+    """
+    File written for an output path given without extension
+    """
+    return f"{output_path}.{file_type.lower().lstrip('.')}"
+
+
+def language_output_paths(output_path: str, languages: list[str]) -> dict[str, str]:
+    """
+    Output path of each report language: the path itself for a single
+    language, '<path>_<code>' (e.g. 'reports_PT') for several
+    """
+    if len(languages) == 1:
+        return {languages[0]: output_path}
+    codes = {name: code for code, name in LANGUAGES.items()}
+    return {
+        language: f"{output_path}_{codes.get(language, language)}"
+        for language in languages
+    }
+
+
+class ReportWriter(abc.ABC):
+    """
+    Streaming sink for generated reports.
+    Subclasses implement _write and may override flush and close.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.written = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def write(
+        self,
+        tax_id: str | int,
+        report: str,
+        organism_info: dict | None = None,
+        sample_id: str | None = None,
+    ) -> None:
+        with self._lock:
+            self._write(str(tax_id), report, organism_info or {}, sample_id)
+            self.written += 1
+
+    @abc.abstractmethod
+    def _write(
+        self, tax_id: str, report: str, organism_info: dict, sample_id: str | None
+    ) -> None:
+        pass
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class JsonlWriter(ReportWriter):
+    """
+    Append-only JSON lines, one record per report.
+    Records are flushed and fsynced every `fsync_every` reports and on
+    close, so a crash loses at most that many and never earlier ones.
+    """
+
+    def __init__(self, path: str, fsync_every: int = 32):
+        super().__init__(path)
+        self.fsync_every = max(1, fsync_every)
+        self._pending = 0
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _write(self, tax_id, report, organism_info, sample_id) -> None:
+        record = {"tax_id": tax_id, "report": report}
+        if sample_id is not None:
+            record["sample_id"] = sample_id
+        if organism_info:
+            record["organism_info"] = organism_info
+        record["written_at"] = time.time()
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._pending += 1
+        if self._pending >= self.fsync_every:
+            self._sync()
+
+    def _sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._sync()
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._file.close()
+
+
+class AtomicJsonWriter(ReportWriter):
+    """
+    The {taxid: text} JSON layout, replaced atomically (temp file and
+    rename) every `flush_every` reports and on close. The existing file is
+    read once instead of on every report.
+    """
+
+    def __init__(self, path: str, flush_every: int = 16):
+        super().__init__(path)
+        self.flush_every = max(1, flush_every)
+        self._pending = 0
+        self.data = _read_json_reports(path)
+
+    def _write(self, tax_id, report, organism_info, sample_id) -> None:
+        self.data[tax_id] = report
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self._dump()
+
+    def _dump(self) -> None:
+        atomic_write_json(self.path, self.data)
+        self._pending = 0
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._pending:
+                self._dump()
+
+
+class TxtWriter(ReportWriter):
+    """
+    Plain 'taxid: text' lines, appended
+    """
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _write(self, tax_id, report, organism_info, sample_id) -> None:
+        self._file.write(f"{tax_id}: {report}\n")
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._file.close()
+
+
+def _table_row(tax_id, report, organism_info, sample_id) -> dict:
+    row = {"sample_id": sample_id or "", "tax_id": tax_id, "report": report}
+    for column in ORGANISM_FIELDS:
+        value = organism_info.get(column)
+        row[column] = "" if value is None else str(value)
+    return row
+
+
+class CsvWriter(ReportWriter):
+    """
+    One row per report with the trusted-knowledge fields as columns,
+    appended and flushed every `flush_every` rows
+    """
+
+    def __init__(self, path: str, flush_every: int = 32):
+        super().__init__(path)
+        self.flush_every = max(1, flush_every)
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "a", encoding="utf-8", newline="")
+        self._writer = csv.DictWriter(self._file, fieldnames=TABLE_COLUMNS)
+        if new_file:
+            self._writer.writeheader()
+
+    def _write(self, tax_id, report, organism_info, sample_id) -> None:
+        self._writer.writerow(_table_row(tax_id, report, organism_info, sample_id))
+        if self.written % self.flush_every == self.flush_every - 1:
+            self._file.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._file.close()
+
+
+class ParquetWriter(ReportWriter):
+    """
+    Same columns as CsvWriter in a Parquet file, written one row group per
+    `row_group_size` reports. The file is assembled next to path and moved
+    into place on close; the rows of an existing file are copied in first,
+    so like the other formats it is appended to. Needs pyarrow.
+    """
+
+    def __init__(self, path: str, row_group_size: int = 1000):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError(PARQUET_MISSING)
+
+        super().__init__(path)
+        self.row_group_size = max(1, row_group_size)
+        self._pa = pa
+        self._schema = pa.schema([(column, pa.string()) for column in TABLE_COLUMNS])
+        self._tmp_path = f"{path}.tmp"
+        self._writer = pq.ParquetWriter(self._tmp_path, self._schema)
+        if os.path.exists(path):
+            self._writer.write_table(pq.read_table(path, schema=self._schema))
+        self._rows = []
+
+    def _write(self, tax_id, report, organism_info, sample_id) -> None:
+        self._rows.append(_table_row(tax_id, report, organism_info, sample_id))
+        if len(self._rows) >= self.row_group_size:
+            self._write_row_group()
+
+    def _write_row_group(self) -> None:
+        table = self._pa.Table.from_pylist(self._rows, schema=self._schema)
+        self._writer.write_table(table)
+        self._rows = []
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._rows:
+                self._write_row_group()
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+                os.replace(self._tmp_path, self.path)
+
+
+WRITERS = {
+    "json": AtomicJsonWriter,
+    "txt": TxtWriter,
+    "jsonl": JsonlWriter,
+    "csv": CsvWriter,
+    "parquet": ParquetWriter,
+}
+
+
+def open_writer(output_path: str, file_type: str = "json") -> ReportWriter:
+    """
+    Writer of file_type for an output path given without extension
+    """
+    file_type = file_type.lower().lstrip(".")
+    if file_type not in WRITERS:
+        raise ValueError(
+            f"Unsupported file type '{file_type}'. Use one of {', '.join(FILE_TYPES)}."
+        )
+    return WRITERS[file_type](output_file_path(output_path, file_type))
+
+
+def _read_json_reports(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            return json.load(f)
+        except json.JSONDecodeError:
+            logging.warning(f"Ignoring unreadable output file {path}")
+            return {}
+
+
+def read_jsonl_reports(path: str) -> list[dict]:
+    """
+    Records of a JSONL output. A truncated last line (from a crash while
+    writing) is skipped.
+    """
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                logging.warning(f"Skipping unreadable line {number} of {path}")
+    return records
+
+
+def compact_jsonl(jsonl_path: str, json_path: str) -> int:
+    """
+    Fold a JSONL output into the {taxid: text} JSON layout (merged into
+    json_path if it exists, later records winning). Returns the number of
+    reports in the JSON file.
+    """
+    data = _read_json_reports(json_path)
+    for record in read_jsonl_reports(jsonl_path):
+        data[str(record["tax_id"])] = record["report"]
+    atomic_write_json(json_path, data)
+    return len(data)
@@ -1,9 +1,46 @@
 import argparse
+import asyncio
 import os
+import time
 from assistant import MetagenomicsAssistant
-from aws_handler import AwsHandler
-from gemini_handler import GeminiHandler
-from utils import farwell_to_user, save_output, write_env_var
+from batch import DEFAULT_WORKERS, arun_batch, read_batch_file, run_batch
+from cassette import TIMINGS, cassette_session
+from classifier_reports import RANK_CODES, ingest_reports, write_sample_map
+from constants import (
+    CLASSIFIER_MIN_ABUNDANCE,
+    CLASSIFIER_MIN_READS,
+    CLASSIFIER_RANK,
+    EXEMPLAR_SEED,
+    EXEMPLAR_TOKEN_BUDGET,
+    GENOME_CACHE_PATH,
+    GENOME_CACHE_TTL_DAYS,
+    HEDGE_PERCENTILE,
+    LANGUAGES,
+    PRECOMPUTE_CHECKPOINT_PATH,
+    REPORT_STORE_PATH,
+    SERVICE_HOST,
+    SERVICE_PORT,
+)
+from genome_cache import GenomeSizeCache
+from knowledge_base import build_knowledge_base
+from tracing import profile_session
+from report_store import ReportStore
+from output_writers import (
+    FILE_TYPES,
+    compact_jsonl,
+    language_output_paths,
+    missing_dependency,
+    open_writer,
+    output_file_path,
+)
+from utils import farwell_to_user, parse_languages, write_env_var
+
+
+def _languages_argument(value: str) -> list[str]:
+    try:
+        return parse_languages(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
 
 
 def parse_arguments():
@@ -21,20 +58,68 @@ def parse_arguments():
         "--organism_name",
         help="Enter a valid organism name to generate the clinical report",
     )
+    parser.add_argument(
+        "-b",
+        "--batch",
+        help="File with one TaxID or organism name per line, or a TSV with sample_id/taxid/name columns",
+    )
+    parser.add_argument(
+        "-k",
+        "--classifier-reports",
+        nargs="+",
+        metavar="REPORT",
+        help="Kraken2, Bracken or Centrifuge reports (one per sample, optionally gzipped): one clinical record per organism found, shared by the samples",
+    )
+    parser.add_argument(
+        "--rank",
+        choices=list(RANK_CODES),
+        default=CLASSIFIER_RANK,
+        help=f"Classifier reports: rank hits are rolled up to. Default is {CLASSIFIER_RANK}.",
+    )
+    parser.add_argument(
+        "--min-reads",
+        type=int,
+        default=CLASSIFIER_MIN_READS,
+        help=f"Classifier reports: reads an organism needs in a sample to be reported. Default is {CLASSIFIER_MIN_READS}.",
+    )
+    parser.add_argument(
+        "--min-abundance",
+        type=float,
+        default=CLASSIFIER_MIN_ABUNDANCE,
+        help=f"Classifier reports: percent of a sample an organism needs to be reported. Default is {CLASSIFIER_MIN_ABUNDANCE}.",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"Number of reports generated in parallel in batch mode. Default is {DEFAULT_WORKERS}.",
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        help="Batch mode only: run an asyncio driver with this many reports in flight instead of the thread pool",
+    )
     parser.add_argument("-out", "--output", help="Enter a valid path to save text.")
     parser.add_argument(
         "-f",
         "--format",
-        choices=["json", "txt"],
+        choices=FILE_TYPES,
         default="json",
-        help="Output file format (json or txt). Default is json.",
+        help="Output file format: json ({taxid: text}), txt, jsonl (append-only, for large batches), csv or parquet (trusted knowledge columns plus report). Default is json.",
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Batch mode with --format jsonl: also fold the results into the {taxid: text} JSON file at the end",
     )
     parser.add_argument(
         "-l",
         "--language",
-        choices=["EN", "PT"],
+        type=_languages_argument,
         default="EN",
-        help="Language for the generated report (EN=English, PT=Brazilian Portuguese). Default is EN.",
+        help="Language of the generated report (EN=English, PT=Brazilian Portuguese), or several separated by commas (EN,PT) sharing the lookups. Default is EN.",
     )
     parser.add_argument(
         "-key", "--api-key", help="API Key for the chosen provider (saved to .env)"
@@ -46,12 +131,38 @@ def parse_arguments():
         default="aws",
         help="LLM provider to use (default: aws)",
     )
+    parser.add_argument(
+        "--fallback-provider",
+        choices=["aws", "gemini"],
+        help="Second LLM provider: a prompt is also sent to it when the --provider call is slower than usual (see --hedge-percentile), and sent to it alone when the --provider call fails",
+    )
+    parser.add_argument(
+        "--hedge-percentile",
+        type=float,
+        default=HEDGE_PERCENTILE,
+        help=f"With --fallback-provider: latency percentile of --provider after which the prompt is also sent to the fallback, the first answer winning. 0 only fails over on errors. Default is {HEDGE_PERCENTILE}.",
+    )
 
     parser.add_argument(
         "--update-db",
         action="store_true",
         help="Update the local NCBI taxonomy database",
     )
+    parser.add_argument(
+        "--taxdump",
+        help="With --update-db: update from this local taxdump.tar.gz instead of downloading it. Only the changes since the previous taxdump are applied.",
+    )
+    parser.add_argument(
+        "--full-rebuild",
+        action="store_true",
+        help="With --update-db --taxdump: rebuild the whole database instead of applying the changes",
+    )
+
+    parser.add_argument(
+        "--build-kb",
+        action="store_true",
+        help="Compile the old reports and curated CSVs into the local knowledge base",
+    )
 
     parser.add_argument(
         "--trusted-knowledge",
@@ -59,22 +170,506 @@ def parse_arguments():
         help="Print the trusted knowledge dictionary assembled from public databases",
     )
 
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Print the report as it is generated instead of waiting for the whole text",
+    )
+
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Do not query NCBI for genome sizes; use only the local cache",
+    )
+
+    parser.add_argument(
+        "--genome-cache-ttl",
+        type=float,
+        default=GENOME_CACHE_TTL_DAYS,
+        help=f"Days a cached genome size stays valid. Default is {GENOME_CACHE_TTL_DAYS}.",
+    )
+
+    parser.add_argument(
+        "--exemplar-tokens",
+        type=int,
+        default=EXEMPLAR_TOKEN_BUDGET,
+        help=f"Token budget of the old reports used as style exemplars in the prompt. Default is {EXEMPLAR_TOKEN_BUDGET}.",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=EXEMPLAR_SEED,
+        help=f"Seed breaking ties between equally relevant exemplars. Default is {EXEMPLAR_SEED}.",
+    )
+
+    parser.add_argument(
+        "--precompute",
+        action="store_true",
+        help="Pre-generate reports for every curated TaxID in every language (resumable; uses --workers)",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        default=PRECOMPUTE_CHECKPOINT_PATH,
+        help=f"Precompute progress log used to resume interrupted runs. Default is {PRECOMPUTE_CHECKPOINT_PATH}.",
+    )
+    parser.add_argument(
+        "--no-report-store",
+        action="store_true",
+        help="Always generate a new report, ignoring pre-generated ones",
+    )
+
+    parser.add_argument(
+        "--shard-dir",
+        help="Directory of a batch run split into shards, on a filesystem shared by the hosts running them",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        help="With --batch and --shard-dir: split the batch into this many shards by TaxID hash",
+    )
+    parser.add_argument(
+        "--shard",
+        type=int,
+        help="With --shard-dir: generate the reports of this shard (0-based), one worker per shard",
+    )
+    parser.add_argument(
+        "--merge-shards",
+        action="store_true",
+        help="With --shard-dir and --output: combine the finished shards into one output and list the missing ones",
+    )
+    parser.add_argument(
+        "--rerun-failed",
+        action="store_true",
+        help="With --merge-shards: generate the rows that failed in the finished shards again before merging",
+    )
+
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Run a long-lived report service keeping the assistant warm",
+    )
+    parser.add_argument(
+        "--host",
+        default=SERVICE_HOST,
+        help=f"Service mode: HTTP address to listen on (empty to disable). Default is {SERVICE_HOST}.",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=SERVICE_PORT,
+        help=f"Service mode: HTTP port to listen on. Default is {SERVICE_PORT}.",
+    )
+    parser.add_argument(
+        "--socket",
+        help="Service mode: also listen on this Unix socket path",
+    )
+    parser.add_argument(
+        "--server",
+        help="Send the request to a running service instead (http://host:port or unix:/path)",
+    )
+
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print time spent per stage, request counts, cache hits and LLM token usage",
+    )
+    parser.add_argument(
+        "--trace-out",
+        help="Write a per-stage trace: JSON lines for .jsonl files, otherwise Chrome trace format",
+    )
+    parser.add_argument(
+        "--cprofile-out",
+        help="Dump cProfile statistics of the whole run to this file",
+    )
+    parser.add_argument(
+        "--record",
+        help="Save every NCBI Entrez and LLM response of the run, with its latency, to this cassette file (JSON lines)",
+    )
+    parser.add_argument(
+        "--replay",
+        help="Answer NCBI Entrez and LLM calls from this cassette file instead of the network (no credentials needed)",
+    )
+    parser.add_argument(
+        "--replay-timing",
+        choices=TIMINGS,
+        default="instant",
+        help="With --replay: serve responses at once (instant, default) or after their recorded latency (recorded)",
+    )
+
     args = parser.parse_args()
 
-    # Check for update-db first
-    if args.update_db:
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    # fail before any report is generated, not when the first one is saved
+    missing = missing_dependency(args.format)
+    if missing:
+        parser.error(missing)
+
+    if args.record and args.replay:
+        parser.error("--record and --replay cannot be used together")
+
+    if args.fallback_provider == args.provider:
+        parser.error("--fallback-provider must differ from --provider")
+    if not 0 <= args.hedge_percentile < 100:
+        parser.error("--hedge-percentile must be between 0 and 100")
+
+    if (args.taxdump or args.full_rebuild) and not args.update_db:
+        parser.error("--taxdump and --full-rebuild need --update-db")
+    if args.full_rebuild and not args.taxdump:
+        parser.error("--full-rebuild needs --taxdump")
+
+    if args.rerun_failed and not args.merge_shards:
+        parser.error("--rerun-failed needs --merge-shards")
+    sharding = [args.shards is not None, args.shard is not None, args.merge_shards]
+    if args.shard_dir or any(sharding):
+        if not args.shard_dir or sum(sharding) != 1:
+            parser.error(
+                "--shard-dir needs exactly one of --shards, --shard or --merge-shards"
+            )
+        if args.shards is not None and not args.batch:
+            parser.error("--shards needs --batch")
+        if args.merge_shards and not args.output:
+            parser.error("--merge-shards needs --output")
+        return args
+
+    # Check for update-db / build-kb / precompute / serve first
+    if args.update_db or args.build_kb or args.precompute or args.serve:
         return args
 
     # Validate that exactly one argument is provided (if not updating db)
-    if not args.taxid and not args.organism_name:
-        parser.error("You must provide either --taxid or --organism_name")
+    inputs = [
+        arg
+        for arg in (args.taxid, args.organism_name, args.batch, args.classifier_reports)
+        if arg
+    ]
+    if not inputs:
+        parser.error(
+            "You must provide either --taxid, --organism_name, --batch or --classifier-reports"
+        )
+
+    if len(inputs) > 1:
+        parser.error(
+            "Please provide only one of --taxid, --organism_name, --batch or --classifier-reports, not several"
+        )
+
+    if args.min_reads < 0 or args.min_abundance < 0:
+        parser.error("--min-reads and --min-abundance cannot be negative")
 
-    if args.taxid and args.organism_name:
-        parser.error("Please provide only one of --taxid or --organism_name, not both")
+    if args.concurrency is not None and args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+
+    if args.stream and len(args.language) > 1:
+        parser.error("--stream needs a single --language")
+
+    if args.compact and (args.format != "jsonl" or not args.output):
+        parser.error("--compact needs --format jsonl and --output")
+
+    if args.server and (args.batch or args.classifier_reports):
+        parser.error("--server can only be used with --taxid or --organism_name")
 
     return args
 
 
+def build_llm_handler(
+    provider: str,
+    fallback_provider: str | None = None,
+    hedge_percentile: float = HEDGE_PERCENTILE,
+):
+    """
+    Instantiate the handler of the chosen provider, hedged with the
+    fallback provider when there is one.
+    Provider SDKs are imported here so only the selected ones are loaded.
+    """
+    if fallback_provider:
+        from failover import HedgedHandler
+
+        return HedgedHandler(
+            build_llm_handler(provider),
+            build_llm_handler(fallback_provider),
+            primary_name=provider,
+            secondary_name=fallback_provider,
+            hedge_percentile=hedge_percentile,
+        )
+
+    if provider == "gemini":
+        from gemini_handler import GeminiHandler
+
+        return GeminiHandler()
+
+    from aws_handler import AwsHandler
+
+    return AwsHandler()
+
+
+def build_assistant(
+    args, genome_cache_path: str = GENOME_CACHE_PATH
+) -> MetagenomicsAssistant:
+    """
+    Assistant with the handler of the chosen provider and the CLI options
+    """
+    return MetagenomicsAssistant(
+        llm_handler=build_llm_handler(
+            args.provider, args.fallback_provider, args.hedge_percentile
+        ),
+        genome_cache=GenomeSizeCache(genome_cache_path, ttl_days=args.genome_cache_ttl),
+        offline=args.offline,
+        exemplar_budget=args.exemplar_tokens,
+        exemplar_seed=args.seed,
+        report_store=None if args.no_report_store else ReportStore(REPORT_STORE_PATH),
+    )
+
+
+def update_taxonomy(args) -> None:
+    """
+    Update the taxonomy database, from NCBI or from a local taxdump, and
+    refresh the indexes and caches derived from it
+    """
+    # No LLM handler is needed to update the database
+    assistant = MetagenomicsAssistant(
+        llm_handler=None, report_store=ReportStore(REPORT_STORE_PATH)
+    )
+    if args.taxdump:
+        from taxdump import update_taxonomy_db
+
+        print(f"Updating the taxonomy database from {args.taxdump}...")
+        changes = update_taxonomy_db(
+            assistant.taxonomy_path, args.taxdump, full_rebuild=args.full_rebuild
+        )
+        if changes.full_rebuild:
+            print(f"Full rebuild ({changes.reason}) finished in {changes.elapsed:.1f}s")
+        else:
+            print(f"Incremental update finished in {changes.elapsed:.1f}s")
+        print(f"Changes: {changes.summary()}")
+    else:
+        print("Updating NCBI taxonomy database. This might take a few minutes...")
+        started = time.perf_counter()
+        assistant.ncbi.update_taxonomy_database()
+        print(f"Full rebuild finished in {time.perf_counter() - started:.1f}s")
+        changes = None
+
+    print("Refreshing the indexes and caches derived from the taxonomy...")
+    for item, outcome in assistant.refresh_after_taxonomy_update(changes).items():
+        print(f"  {item}: {outcome}")
+    print("Database updated successfully!")
+
+
+def run_service(args) -> None:
+    """
+    Serve reports from one warm assistant until interrupted
+    """
+    from server import ReportService, serve
+
+    assistant = build_assistant(args)
+    serve(
+        ReportService(assistant),
+        host=args.host or None,
+        port=args.port,
+        socket_path=args.socket,
+    )
+
+
+def save_reports(args, tax_id: str, reports: dict, organism_info: dict) -> None:
+    """
+    Save the report of each language to its output file
+    """
+    paths = language_output_paths(args.output, list(reports))
+    for language, report in reports.items():
+        with open_writer(paths[language], args.format) as writer:
+            writer.write(tax_id, report, organism_info=organism_info)
+
+
+def print_reports(reports: dict) -> None:
+    for language, report in reports.items():
+        title = f" ({language})" if len(reports) > 1 else ""
+        print(f"\nYour clinical record{title}:\n\n{report}\n")
+
+
+def request_from_service(args) -> None:
+    """
+    Thin client: ask a running service for the report
+    """
+    from server import request_service
+
+    try:
+        if args.taxid:
+            tax_id = args.taxid
+            print(f"Generating clinical record for TaxID: {tax_id}")
+        else:
+            print(f"Generating clinical record for organism: {args.organism_name}")
+            tax_id = request_service(
+                args.server, "/resolve", {"name": args.organism_name}
+            )["tax_id"]
+            if not tax_id:
+                print(
+                    f"Error: Could not find TaxID for organism '{args.organism_name}'\nPlease, enter a valid name or TaxID"
+                )
+                return
+            print(f"Found TaxID: {tax_id}")
+
+        payload = request_service(
+            args.server,
+            "/report",
+            {"taxid": tax_id, "language": ",".join(args.language)},
+        )
+        if args.trusted_knowledge:
+            print(
+                f"\nTrusted Knowledge for TaxID {tax_id}:\n{payload['organism_info']}\n"
+            )
+        reports = payload.get("reports") or {payload["language"]: payload["report"]}
+        reports = {LANGUAGES[code]: report for code, report in reports.items()}
+        if args.output:
+            save_reports(args, tax_id, reports, payload["organism_info"])
+        print_reports(reports)
+        farwell_to_user()
+    except Exception as e:
+        print(f"An error occurred: {e}")
+
+
+def run_rows(assistant, rows, text_languages: list[str], args) -> list:
+    """
+    Generate the reports of batch rows with the chosen driver and options
+    """
+    if args.concurrency:
+        print(
+            f"Generating {len(rows)} clinical records with {args.concurrency} in flight"
+        )
+        results = asyncio.run(
+            arun_batch(
+                assistant,
+                rows,
+                text_languages,
+                concurrency=args.concurrency,
+                output=args.output,
+                file_type=args.format,
+            )
+        )
+    else:
+        print(f"Generating {len(rows)} clinical records with {args.workers} workers")
+        results = run_batch(
+            assistant,
+            rows,
+            text_languages,
+            workers=args.workers,
+            output=args.output,
+            file_type=args.format,
+        )
+    if args.trusted_knowledge:
+        for result in results:
+            if result.ok:
+                print(
+                    f"\nTrusted Knowledge for TaxID {result.tax_id}:\n{result.organism_info}"
+                )
+    if args.compact:
+        for output in language_output_paths(args.output, text_languages).values():
+            json_path = output_file_path(output, "json")
+            total = compact_jsonl(output_file_path(output, "jsonl"), json_path)
+            print(f"Compacted {total} reports into {json_path}")
+    return results
+
+
+def run_sharded(args) -> None:
+    """
+    Split a batch into shards, generate the reports of one shard, or
+    merge the finished shards
+    """
+    from shards import (
+        merge_shards,
+        rerun_failed,
+        run_shard,
+        shared_cache_path,
+        split_manifest,
+    )
+
+    try:
+        if args.shards is not None:
+            rows = read_batch_file(args.batch)
+            counts = split_manifest(
+                rows,
+                args.shards,
+                args.shard_dir,
+                [LANGUAGES[code] for code in args.language],
+            )
+            print(
+                f"Split {len(rows)} rows into {len(counts)} shards "
+                f"({min(counts)} to {max(counts)} rows each) in {args.shard_dir}"
+            )
+            return
+
+        if args.shard is not None or args.rerun_failed:
+            # Workers share the genome size cache unless the filesystem
+            # cannot hold a shared sqlite database
+            genome_cache_path = shared_cache_path(
+                args.shard_dir, os.path.basename(GENOME_CACHE_PATH)
+            )
+            if genome_cache_path is None:
+                print("Network filesystem: each worker keeps its own genome cache")
+            assistant = build_assistant(args, genome_cache_path or GENOME_CACHE_PATH)
+            if args.shard is not None:
+                run_shard(
+                    assistant,
+                    args.shard_dir,
+                    args.shard,
+                    args.workers,
+                    args.concurrency,
+                )
+                return
+            rerun_failed(assistant, args.shard_dir, args.workers, args.concurrency)
+
+        run = merge_shards(args.shard_dir, args.output, args.format)
+    except (OSError, ValueError) as e:
+        print(f"An error occurred in the sharded run: {e}")
+        return
+
+    done = run.shards - len(run.missing)
+    print(f"Merged {done} of {run.shards} shards ({run.rows} rows) into {args.output}")
+    for index in run.missing:
+        print(
+            f"  - shard {index} is not done: run it with "
+            f"--shard-dir {args.shard_dir} --shard {index}"
+        )
+    if run.failed and not args.rerun_failed:
+        print(
+            f"  {len(run.failed)} rows failed: merge with --rerun-failed to "
+            "generate only them again"
+        )
+    elif run.failed:
+        print(f"  {len(run.failed)} rows failed again")
+
+
+def run_classifier_reports(assistant, text_languages: list[str], args) -> None:
+    """
+    Report once on each organism found in the classifier reports and map
+    every sample back to the shared reports
+    """
+    try:
+        ingestion = ingest_reports(
+            args.classifier_reports,
+            rank=args.rank,
+            min_reads=args.min_reads,
+            min_abundance=args.min_abundance,
+            taxonomy=assistant.taxonomy,
+        )
+    except (OSError, ValueError) as e:
+        print(f"An error occurred while reading the classifier reports: {e}")
+        return
+
+    print(
+        f"{ingestion.total_hits} organisms above the thresholds in "
+        f"{len(ingestion.samples)} samples, {len(ingestion.tax_ids)} unique"
+    )
+    results = run_rows(assistant, ingestion.batch_rows(), text_languages, args)
+
+    if args.output:
+        map_path = f"{args.output}_samples.tsv"
+        write_sample_map(map_path, ingestion, results)
+        print(f"Samples mapped to their reports in {map_path}")
+    else:
+        for sample_id, hits in ingestion.samples.items():
+            organisms = ", ".join(f"{hit.name} ({hit.tax_id})" for hit in hits)
+            print(f"{sample_id}: {organisms or 'no organism above the thresholds'}")
+
+
 def parse_handle():
     """
     Function to handle command line execution
@@ -82,25 +677,76 @@ def parse_handle():
     # Parse command line arguments
     args = parse_arguments()
 
+    with profile_session(
+        args.profile, args.trace_out, args.cprofile_out
+    ), cassette_session(args.record, args.replay, args.replay_timing):
+        run_command(args)
+
+
+def run_command(args) -> None:
+    """
+    Run the command selected by the parsed arguments
+    """
     if args.api_key:
         if args.provider == "gemini":
             write_env_var("GEMINI_API_KEY", args.api_key)
         else:
             write_env_var("AWS_BEARER_TOKEN_BEDROCK", args.api_key)
 
-    # Instantiate handler based on provider
-    if args.provider == "gemini":
-        handler = GeminiHandler()
-    else:
-        handler = AwsHandler()
-
-    # Initialize the assistant
-    assistant = MetagenomicsAssistant(llm_handler=handler)
+    if args.build_kb:
+        print("Compiling the knowledge base...")
+        kb = build_knowledge_base()
+        print(f"Knowledge base built successfully! Content hash: {kb.content_hash}")
+        return
 
     if args.update_db:
-        print("Updating NCBI taxonomy database. This might take a few minutes...")
-        assistant.ncbi.update_taxonomy_database()
-        print("Database updated successfully!")
+        update_taxonomy(args)
+        return
+
+    if args.serve:
+        run_service(args)
+        return
+
+    if args.server:
+        request_from_service(args)
+        return
+
+    if args.precompute:
+        from precompute import run_precompute
+
+        run_precompute(
+            build_assistant(args),
+            ReportStore(REPORT_STORE_PATH),
+            args.checkpoint,
+            languages=list(LANGUAGES.values()),
+            workers=args.workers,
+            provider=args.provider,
+        )
+        return
+
+    if args.shard_dir:
+        run_sharded(args)
+        return
+
+    # Initialize the assistant with the handler of the chosen provider
+    assistant = build_assistant(args)
+
+    text_languages = [LANGUAGES[code] for code in args.language]
+
+    if args.batch:
+        try:
+            rows = read_batch_file(args.batch)
+        except (OSError, ValueError) as e:
+            print(f"An error occurred while reading the batch file: {e}")
+            return
+
+        run_rows(assistant, rows, text_languages, args)
+        farwell_to_user()
+        return
+
+    if args.classifier_reports:
+        run_classifier_reports(assistant, text_languages, args)
+        farwell_to_user()
         return
 
     try:
@@ -121,26 +767,46 @@ def parse_handle():
 
             print(f"Found TaxID: {tax_id}")
 
-        if args.language == "PT":
-            text_language = "Brazilian Portuguese"
+        # Get organism info; a pre-generated report skips the lookups
+        stored = next(
+            filter(
+                None,
+                (
+                    assistant.get_stored_report(tax_id, language)
+                    for language in text_languages
+                ),
+            ),
+            None,
+        )
+        if stored:
+            organism_info = stored.organism_info
         else:
-            text_language = "English"
-
-        # Get organism info
-        organism_info = assistant.set_organism_fields(tax_id)
+            organism_info = assistant.set_organism_fields(tax_id)
 
         if args.trusted_knowledge:
             print(f"\nTrusted Knowledge for TaxID {tax_id}:\n{organism_info}\n")
 
-        # Generate the clinical record
-        final_text = assistant.generate_report(
-            tax_id, text_language, organism_info=organism_info
-        )
+        # Generate the clinical record, in every language at once
+        if args.stream:
+            print("\nYour clinical record:\n")
+            chunks = []
+            for chunk in assistant.stream_report(
+                tax_id, text_languages[0], organism_info=organism_info
+            ):
+                print(chunk, end="", flush=True)
+                chunks.append(chunk)
+            print("\n")
+            reports = {text_languages[0]: "".join(chunks)}
+        else:
+            reports = assistant.generate_reports(
+                tax_id, text_languages, organism_info=organism_info
+            )
 
         if args.output:
-            save_output(args.output, tax_id, final_text, args.format)
+            save_reports(args, tax_id, reports, organism_info)
 
-        print(f"\nYour clinical record:\n\n{final_text}\n")
+        if not args.stream:
+            print_reports(reports)
         farwell_to_user()
 
     except Exception as e:
@@ -0,0 +1,184 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from report_store import ReportStore
+
+
+def curated_tax_ids(kb) -> list[str]:
+    """
+    Every TaxID of the curated tables, in file order without repeats
+    """
+    tax_ids = [
+        tax_id
+        for table in ("data", "acronyms")
+        for tax_id in kb.annotated_tax_ids(table)
+        if tax_id.isdigit()
+    ]
+    return list(dict.fromkeys(tax_ids))
+
+
+class Checkpoint:
+    """
+    Append-only JSON lines log of finished (TaxID, language) pairs.
+    Pairs logged as done with the same knowledge base (kb_hash) are
+    skipped when the run is resumed; failed ones are tried again.
+    """
+
+    def __init__(self, path: str, kb_hash: str = ""):
+        self.path = path
+        self.kb_hash = kb_hash
+        self.done = set()
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    key = (record["tax_id"], record["language"])
+                    if record.get("kb_hash", "") != kb_hash:
+                        continue
+                    if record["status"] == "done":
+                        self.done.add(key)
+                    else:
+                        self.done.discard(key)
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def record(self, tax_id: str, language: str, error: str = "") -> None:
+        entry = {
+            "tax_id": tax_id,
+            "language": language,
+            "status": "failed" if error else "done",
+            "error": error,
+            "kb_hash": self.kb_hash,
+            "at": time.time(),
+        }
+        with self._lock:
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            if not error:
+                self.done.add((tax_id, language))
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+def precompute_organism(
+    assistant, store: ReportStore, tax_id: str, languages: list[str], provider: str
+) -> dict[str, str]:
+    """
+    Generate and store the reports of one organism in several languages,
+    looking its information up only once and calling the LLM for all the
+    languages at the same time. Returns {language: error} with
+    an empty error for stored reports.
+    """
+    try:
+        organism_info = assistant.set_organism_fields(tax_id)
+    except Exception as e:
+        logging.error(f"Precompute lookup for TaxID {tax_id} failed: {e}")
+        return {language: str(e) for language in languages}
+
+    reports = assistant.generate_reports(tax_id, languages, organism_info=organism_info)
+    outcome = {}
+    for language, report in reports.items():
+        try:
+            if report.startswith("Error:"):
+                raise ValueError(report)
+            store.put(
+                tax_id,
+                language,
+                report,
+                organism_info,
+                provider,
+                kb_hash=assistant.kb.content_hash,
+            )
+            outcome[language] = ""
+        except Exception as e:
+            logging.error(f"Precompute of TaxID {tax_id} in {language} failed: {e}")
+            outcome[language] = str(e)
+    return outcome
+
+
+def run_precompute(
+    assistant,
+    store: ReportStore,
+    checkpoint_path: str,
+    languages: list[str],
+    workers: int = 4,
+    provider: str = "",
+) -> dict[str, int]:
+    """
+    Pre-generate reports for every curated TaxID in every language.
+    Pairs already in the store or logged as done in the checkpoint are
+    skipped, so an interrupted run resumes where it stopped. Reports of
+    an older knowledge base are generated again.
+    """
+    kb_hash = assistant.kb.content_hash
+    checkpoint = Checkpoint(checkpoint_path, kb_hash)
+    finished = checkpoint.done | store.keys(kb_hash)
+
+    tax_ids = curated_tax_ids(assistant.kb)
+    jobs = []
+    for tax_id in tax_ids:
+        pending = [lang for lang in languages if (tax_id, lang) not in finished]
+        if pending:
+            jobs.append((tax_id, pending))
+
+    total_reports = len(tax_ids) * len(languages)
+    pending_reports = sum(len(pending) for _, pending in jobs)
+    summary = {
+        "skipped": total_reports - pending_reports,
+        "generated": 0,
+        "failed": 0,
+    }
+    print(
+        f"{pending_reports} reports to generate for {len(jobs)} organisms "
+        f"({summary['skipped']} already done)"
+    )
+
+    started = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        futures = {
+            executor.submit(
+                precompute_organism, assistant, store, tax_id, pending, provider
+            ): tax_id
+            for tax_id, pending in jobs
+        }
+        for position, future in enumerate(as_completed(futures), start=1):
+            tax_id = futures[future]
+            outcome = future.result()
+            for language, error in outcome.items():
+                checkpoint.record(tax_id, language, error)
+                summary["failed" if error else "generated"] += 1
+            status = ", ".join(
+                f"{language} {'FAILED' if error else 'ok'}"
+                for language, error in outcome.items()
+            )
+            print(f"[{position}/{len(jobs)}] TaxID {tax_id}: {status}")
+    except KeyboardInterrupt:
+        print("\nInterrupted. Run the command again to resume.")
+        raise
+    finally:
+        # Organisms not started yet are dropped; the ones in progress finish
+        # and land in the store, which is checked on resume as well
+        executor.shutdown(wait=True, cancel_futures=True)
+        checkpoint.close()
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"\nPrecompute finished: {summary['generated']} generated, "
+        f"{summary['failed']} failed, {summary['skipped']} skipped in {elapsed:.1f}s"
+    )
+    return summary
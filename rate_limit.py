@@ -0,0 +1,478 @@
+import asyncio
+import contextlib
+import logging
+import random
+import threading
+import time
+from collections.abc import Awaitable, Callable, Iterator
+from typing import TypeVar
+
+from tracing import count, span
+
+T = TypeVar("T")
+
+# Outcomes of a failed LLM call, as told by the provider's classify_error
+THROTTLED = "throttled"  # over quota: back off and retry
+TRANSIENT = "transient"  # server or connection trouble: retry
+FATAL = "fatal"  # bad request, credentials...: do not retry
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: allows `rate` acquisitions per second with
+    bursts of up to `capacity`.
+    """
+
+    def __init__(
+        self, rate: float, capacity: float | None = None, clock=time.monotonic
+    ):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """
+        Take tokens if available. Returns 0 on success, otherwise the number
+        of seconds to wait before they will be.
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def consume(self, tokens: float) -> None:
+        """
+        Take tokens (or give them back when negative) without waiting, to
+        settle an estimate once the real cost is known
+        """
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens - tokens)
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """
+        Block until tokens are available
+        """
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+
+_shared_buckets = {}
+_shared_buckets_lock = threading.Lock()
+
+
+def shared_bucket(name: str, rate: float, capacity: float | None = None) -> TokenBucket:
+    """
+    Return the process-wide bucket registered under name and rate,
+    creating it on first use, so every client of one service with the
+    same limit (NCBI's differs with and without an API key) shares it.
+    """
+    key = (name, rate, capacity)
+    with _shared_buckets_lock:
+        bucket = _shared_buckets.get(key)
+        if bucket is None:
+            bucket = _shared_buckets[key] = TokenBucket(rate, capacity)
+        return bucket
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit on the calls in flight: it grows by one for every `limit`
+    successful calls and is cut by `decrease` on a throttle (at most once
+    per `cooldown` seconds, so one burst of rejections counts once).
+    """
+
+    def __init__(
+        self,
+        initial: int = 4,
+        maximum: int = 32,
+        minimum: int = 1,
+        decrease: float = 0.5,
+        cooldown: float = 1.0,
+        clock=time.monotonic,
+    ):
+        self.maximum = maximum
+        self.minimum = minimum
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self._clock = clock
+        self._limit = float(max(minimum, min(initial, maximum)))
+        self._in_flight = 0
+        self._last_decrease = None
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def try_enter(self) -> bool:
+        with self._condition:
+            if self._in_flight < self.limit:
+                self._in_flight += 1
+                return True
+            return False
+
+    def enter(self) -> None:
+        """
+        Block until a call may start
+        """
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+
+    def leave(self) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self) -> None:
+        with self._condition:
+            self._limit = min(self.maximum, self._limit + 1 / self._limit)
+            self._condition.notify_all()
+
+    def on_throttle(self) -> None:
+        with self._condition:
+            now = self._clock()
+            if (
+                self._last_decrease is not None
+                and now - self._last_decrease < self.cooldown
+            ):
+                return
+            self._last_decrease = now
+            self._limit = max(self.minimum, self._limit * self.decrease)
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised instead of calling a provider that keeps failing
+    """
+
+
+class CircuitBreaker:
+    """
+    Stop calling a provider after `failure_threshold` consecutive failed
+    calls. After `reset_timeout` seconds one trial call is let through: its
+    success closes the circuit, its failure opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock=time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._clock() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def before_call(self) -> bool:
+        """
+        Raise CircuitOpenError unless a call may go through. Returns
+        whether the call is the trial of a half-open circuit.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            remaining = self.reset_timeout - (self._clock() - self._opened_at)
+            if remaining > 0 or self._trial_running:
+                count(f"llm.{self.name}.circuit_open")
+                raise CircuitOpenError(
+                    f"{self.name} is failing, not calling it for {max(remaining, 0):.0f}s"
+                )
+            self._trial_running = True
+            return True
+
+    def release_trial(self) -> None:
+        """
+        Let another call be the trial, the running one having ended
+        without an answer either way
+        """
+        with self._lock:
+            self._trial_running = False
+
+    @contextlib.contextmanager
+    def calling(self) -> Iterator[None]:
+        """
+        Guard one call with before_call. A trial cancelled or interrupted
+        (asyncio.CancelledError, KeyboardInterrupt) neither closes nor
+        opens the circuit: it is released so the next call is the trial.
+        """
+        trial = self.before_call()
+        try:
+            yield
+        except Exception:
+            raise
+        except BaseException:
+            if trial:
+                self.release_trial()
+            raise
+
+    def on_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def on_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._trial_running:
+                    logging.warning(f"Circuit of {self.name} opened")
+                self._opened_at = self._clock()
+            self._trial_running = False
+
+
+def parse_retry_after(value) -> float | None:
+    """
+    Seconds of a retry-after hint ('30', 30 or '1.5s'), if it has any
+    """
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(str(value).strip().removesuffix("s")))
+    except ValueError:
+        return None
+
+
+def backoff_delay(
+    attempt: int,
+    base: float,
+    maximum: float,
+    retry_after: float | None = None,
+    rng: random.Random = random,
+) -> float:
+    """
+    Exponential backoff with full jitter, never shorter than the
+    provider's retry-after hint
+    """
+    delay = rng.uniform(0, min(maximum, base * 2**attempt))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, maximum))
+    return delay
+
+
+class LLMScheduler:
+    """
+    Provider-aware gate in front of an LLM client.
+
+    Every call waits for the requests/min and tokens/min buckets and for a
+    slot of the AIMD concurrency limit, then runs. Throttles shrink the
+    limit; throttled and transient failures are retried with jittered
+    exponential backoff honouring retry-after hints. Calls that still fail
+    feed a circuit breaker that fails fast while the provider is down.
+    `classify_error(exc)` returns (THROTTLED / TRANSIENT / FATAL,
+    retry-after seconds or None).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        classify_error: Callable[[Exception], tuple[str, float | None]],
+        concurrency: AdaptiveConcurrency | None = None,
+        breaker: CircuitBreaker | None = None,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        sleep=time.sleep,
+    ):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute / 60, requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute)
+        self.classify_error = classify_error
+        self.concurrency = concurrency or AdaptiveConcurrency()
+        self.breaker = breaker or CircuitBreaker(name)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._sleep = sleep
+
+    def _wait_for_quota(self, tokens: float) -> None:
+        # a request larger than the bucket would never fit
+        tokens = min(tokens, self.tokens.capacity)
+        with span(f"{self.name}:rate_limit_wait", "llm"):
+            self.requests.acquire()
+            self.tokens.acquire(tokens)
+
+    async def _await_quota(self, tokens: float) -> None:
+        tokens = min(tokens, self.tokens.capacity)
+        with span(f"{self.name}:rate_limit_wait", "llm"):
+            for bucket, amount in ((self.requests, 1), (self.tokens, tokens)):
+                while (wait := bucket.try_acquire(amount)) > 0:
+                    await asyncio.sleep(wait)
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        """
+        Seconds to wait before retrying after error, or raise it when it
+        cannot be retried
+        """
+        kind, retry_after = self.classify_error(error)
+        if kind == THROTTLED:
+            count(f"llm.{self.name}.throttled")
+            self.concurrency.on_throttle()
+        if kind == FATAL:
+            # the provider answered: the request itself is wrong
+            self.breaker.on_success()
+            raise error
+        if attempt >= self.max_retries:
+            self.breaker.on_failure()
+            raise error
+        count(f"llm.{self.name}.retry")
+        delay = backoff_delay(attempt, self.base_delay, self.max_delay, retry_after)
+        logging.warning(
+            f"{self.name} call failed ({kind}: {error}), retrying in {delay:.1f}s"
+        )
+        return delay
+
+    def _succeeded(self, tokens: float, used_tokens: float | None) -> None:
+        self.concurrency.on_success()
+        self.breaker.on_success()
+        if used_tokens is not None:
+            self.tokens.consume(used_tokens - min(tokens, self.tokens.capacity))
+
+    def call(
+        self,
+        fn: Callable[[], T],
+        tokens: float = 0,
+        used_tokens: Callable[[T], float | None] | None = None,
+    ) -> T:
+        """
+        Run fn under the limits, retrying it when it may succeed later.
+        tokens is the estimated cost; used_tokens(result) the real one.
+        """
+        with self.breaker.calling():
+            for attempt in range(self.max_retries + 1):
+                self._wait_for_quota(tokens)
+                self.concurrency.enter()
+                try:
+                    result = fn()
+                except Exception as e:
+                    delay = self._retry_delay(e, attempt)
+                else:
+                    self._succeeded(
+                        tokens, used_tokens(result) if used_tokens else None
+                    )
+                    return result
+                finally:
+                    self.concurrency.leave()
+                self._sleep(delay)
+
+    async def acall(
+        self,
+        fn: Callable[[], Awaitable[T]],
+        tokens: float = 0,
+        used_tokens: Callable[[T], float | None] | None = None,
+    ) -> T:
+        """
+        Async variant of call, never blocking the event loop
+        """
+        with self.breaker.calling():
+            for attempt in range(self.max_retries + 1):
+                await self._await_quota(tokens)
+                while not self.concurrency.try_enter():
+                    await asyncio.sleep(0.05)
+                try:
+                    result = await fn()
+                except Exception as e:
+                    delay = self._retry_delay(e, attempt)
+                else:
+                    self._succeeded(
+                        tokens, used_tokens(result) if used_tokens else None
+                    )
+                    return result
+                finally:
+                    self.concurrency.leave()
+                await asyncio.sleep(delay)
+
+    def stream(self, fn: Callable[[], Iterator[T]], tokens: float = 0) -> Iterator[T]:
+        """
+        Stream the chunks of fn() under the limits. Failures before the
+        first chunk are retried; later ones are raised, since the caller
+        already has part of the answer.
+        """
+        with self.breaker.calling():
+            for attempt in range(self.max_retries + 1):
+                self._wait_for_quota(tokens)
+                self.concurrency.enter()
+                try:
+                    chunks = iter(fn())
+                    first = next(chunks, None)
+                except Exception as e:
+                    self.concurrency.leave()
+                    self._sleep(self._retry_delay(e, attempt))
+                    continue
+                except BaseException:
+                    self.concurrency.leave()
+                    raise
+                # the provider is answering once the first chunk arrives
+                self._succeeded(tokens, None)
+                try:
+                    if first is not None:
+                        yield first
+                        yield from chunks
+                except Exception:
+                    self.breaker.on_failure()
+                    raise
+                finally:
+                    self.concurrency.leave()
+                return
+
+
+_shared_schedulers = {}
+
+
+def shared_scheduler(
+    name: str,
+    requests_per_minute: float,
+    tokens_per_minute: float,
+    classify_error: Callable[[Exception], tuple[str, float | None]],
+) -> LLMScheduler:
+    """
+    Return the process-wide scheduler of a provider, so every handler of
+    one account shares its quota, concurrency limit and circuit
+    """
+    key = (name, requests_per_minute, tokens_per_minute)
+    with _shared_buckets_lock:
+        scheduler = _shared_schedulers.get(key)
+        if scheduler is None:
+            scheduler = _shared_schedulers[key] = LLMScheduler(
+                name, requests_per_minute, tokens_per_minute, classify_error
+            )
+        return scheduler
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
+
+from taxonomy_db import select_in
+
+INDEX_VERSION = 1
+
+
+def taxonomy_signature(dbfile: str) -> str:
+    """
+    Cheap fingerprint of the taxonomy sqlite file (size and mtime)
+    """
+    stat = os.stat(dbfile)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def annotated_signature(annotated: dict[str, list[str]]) -> str:
+    """
+    Fingerprint of the annotated TaxIDs of every curated table
+    """
+    digest = hashlib.sha1()
+    for table in sorted(annotated):
+        digest.update(table.encode("utf-8"))
+        digest.update(",".join(annotated[table]).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class RelativeIndex:
+    """
+    Map every taxonomy node to its nearest annotated TaxID.
+
+    For each curated table, a node maps to the annotated TaxID that is the
+    node itself, an old ID merged into it, or its closest descendant (ties
+    are broken by row order in the table). Nodes without any annotated
+    relative are simply absent, so every lookup is a single dict access.
+    """
+
+    def __init__(self, tables: dict[str, dict[str, str]], signature: dict):
+        self.tables = tables
+        self.signature = signature
+
+    def lookup(self, table: str, tax_id: str | int) -> str | None:
+        return self.tables.get(table, {}).get(str(tax_id))
+
+    @classmethod
+    def build(cls, dbfile: str, annotated: dict[str, list[str]]) -> "RelativeIndex":
+        """
+        Build the index from the ete sqlite database.
+        Only the lineages of annotated TaxIDs are read: every ancestor of an
+        annotated node inherits it, keeping the closest one.
+        """
+        all_ids = {int(tax_id) for ids in annotated.values() for tax_id in ids}
+
+        with closing(sqlite3.connect(dbfile)) as conn:
+            old_to_new = dict(
+                select_in(
+                    conn,
+                    "SELECT taxid_old, taxid_new FROM merged WHERE taxid_old IN (%s)",
+                    all_ids,
+                )
+            )
+            nodes = {old_to_new.get(tax_id, tax_id) for tax_id in all_ids}
+            tracks = {
+                taxid: [int(node) for node in track.split(",")]
+                for taxid, track in select_in(
+                    conn, "SELECT taxid, track FROM species WHERE taxid IN (%s)", nodes
+                )
+            }
+
+        tables = {}
+        for table, ids in annotated.items():
+            best = {}
+            for position, tax_id in enumerate(ids):
+                node = old_to_new.get(int(tax_id), int(tax_id))
+                # track is ordered from the node itself up to the root
+                for distance, ancestor in enumerate(tracks.get(node, [])):
+                    rank_key = (distance, position)
+                    current = best.get(ancestor)
+                    if current is None or rank_key < current[0]:
+                        best[ancestor] = (rank_key, tax_id)
+            tables[table] = {str(node): tax_id for node, (_, tax_id) in best.items()}
+
+        signature = {
+            "version": INDEX_VERSION,
+            "taxonomy": taxonomy_signature(dbfile),
+            "annotated": annotated_signature(annotated),
+        }
+        return cls(tables, signature)
+
+    def save(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # a temp file of its own, as several processes may build the index
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=f"{os.path.basename(path)}.", suffix=".tmp", dir=directory or None
+        )
+        try:
+            with open(fd, "w", encoding="utf-8") as f:
+                json.dump({"signature": self.signature, "tables": self.tables}, f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> "RelativeIndex":
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        return cls(payload["tables"], payload["signature"])
+
+
+def restamp_relative_index(path: str, dbfile: str, previous: str) -> bool:
+    """
+    Mark the saved index as built from the current taxonomy database,
+    after an update that left every lineage and merged ID unchanged.
+    Returns False when there is no index built from the previous database
+    (previous being its taxonomy_signature) to keep.
+    """
+    if not os.path.exists(path):
+        return False
+    index = RelativeIndex.load(path)
+    if index.signature.get("taxonomy") != previous:
+        return False
+    index.signature["taxonomy"] = taxonomy_signature(dbfile)
+    index.save(path)
+    return True
+
+
+def load_or_build_relative_index(
+    path: str, dbfile: str, annotated: dict[str, list[str]], rebuild: bool = False
+) -> RelativeIndex:
+    """
+    Load the index saved at path, rebuilding it when it is missing or was
+    built from another taxonomy database or other curated TaxIDs.
+    """
+    expected = {
+        "version": INDEX_VERSION,
+        "taxonomy": taxonomy_signature(dbfile),
+        "annotated": annotated_signature(annotated),
+    }
+
+    if not rebuild and os.path.exists(path):
+        try:
+            index = RelativeIndex.load(path)
+            if index.signature == expected:
+                return index
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Ignoring unreadable relative index {path}: {e}")
+
+    started = time.perf_counter()
+    index = RelativeIndex.build(dbfile, annotated)
+    try:
+        index.save(path)
+    except OSError as e:
+        logging.warning(f"Could not save relative index to {path}: {e}")
+    logging.info(
+        f"Built relative index in {time.perf_counter() - started:.2f}s "
+        f"({sum(len(t) for t in index.tables.values())} nodes)"
+    )
+    return index
@@ -0,0 +1,147 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import NamedTuple
+
+
+class StoredReport(NamedTuple):
+    """
+    Pre-generated report with the organism information it was written
+    from, and the content hash of the knowledge base it was written with
+    """
+
+    report: str
+    organism_info: dict
+    provider: str
+    generated_at: float
+    kb_hash: str = ""
+
+
+class ReportStore:
+    """
+    sqlite-backed store of generated reports keyed by TaxID and language.
+    Filled by the precompute command and checked before calling the LLM.
+    Each report keeps the knowledge base hash it was generated with, so
+    reports from an older knowledge base can be told apart.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    directory = os.path.dirname(self.path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    with closing(sqlite3.connect(self.path, timeout=30)) as conn:
+                        conn.execute("PRAGMA journal_mode=WAL")
+                        conn.execute("""
+                            CREATE TABLE IF NOT EXISTS reports (
+                                tax_id TEXT NOT NULL,
+                                language TEXT NOT NULL,
+                                report TEXT NOT NULL,
+                                organism_info TEXT NOT NULL,
+                                provider TEXT NOT NULL,
+                                generated_at REAL NOT NULL,
+                                kb_hash TEXT NOT NULL DEFAULT '',
+                                PRIMARY KEY (tax_id, language)
+                            )
+                            """)
+                        columns = {
+                            row[1] for row in conn.execute("PRAGMA table_info(reports)")
+                        }
+                        if "kb_hash" not in columns:
+                            # stores from before the column: their reports
+                            # match no knowledge base until regenerated
+                            conn.execute(
+                                "ALTER TABLE reports "
+                                "ADD COLUMN kb_hash TEXT NOT NULL DEFAULT ''"
+                            )
+                        conn.commit()
+                    self._initialized = True
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, tax_id: str | int, language: str) -> StoredReport | None:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT report, organism_info, provider, generated_at, kb_hash "
+                "FROM reports WHERE tax_id = ? AND language = ?",
+                (str(tax_id), language),
+            ).fetchone()
+        if row is None:
+            return None
+        return StoredReport(row[0], json.loads(row[1]), row[2], row[3], row[4])
+
+    def put(
+        self,
+        tax_id: str | int,
+        language: str,
+        report: str,
+        organism_info: dict | None = None,
+        provider: str = "",
+        kb_hash: str = "",
+    ) -> None:
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO reports (tax_id, language, report, "
+                "organism_info, provider, generated_at, kb_hash) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    str(tax_id),
+                    language,
+                    report,
+                    json.dumps(organism_info or {}, ensure_ascii=False),
+                    provider,
+                    time.time(),
+                    kb_hash,
+                ),
+            )
+            conn.commit()
+
+    def delete(self, tax_ids) -> int:
+        """
+        Remove the reports of the given TaxIDs in every language.
+        Returns the number removed.
+        """
+        with closing(self._connect()) as conn:
+            removed = conn.executemany(
+                "DELETE FROM reports WHERE tax_id = ?",
+                ((str(tax_id),) for tax_id in tax_ids),
+            ).rowcount
+            conn.commit()
+        return removed
+
+    def clear(self) -> int:
+        """
+        Remove every stored report. Returns the number removed.
+        """
+        with closing(self._connect()) as conn:
+            removed = conn.execute("DELETE FROM reports").rowcount
+            conn.commit()
+        return removed
+
+    def keys(self, kb_hash: str | None = None) -> set[tuple[str, str]]:
+        """
+        (TaxID, language) pairs present in the store, only those generated
+        with the knowledge base of kb_hash when it is given
+        """
+        with closing(self._connect()) as conn:
+            if kb_hash is None:
+                return set(conn.execute("SELECT tax_id, language FROM reports"))
+            return set(
+                conn.execute(
+                    "SELECT tax_id, language FROM reports WHERE kb_hash = ?",
+                    (kb_hash,),
+                )
+            )
+
+    def __len__(self) -> int:
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM reports").fetchone()[0]
@@ -0,0 +1,357 @@
+import http.client
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from constants import LANGUAGES, SERVICE_HOST, SERVICE_PORT
+from utils import parse_languages
+
+LATENCY_WINDOW = 1000
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one computation.
+    Callers arriving while a call is in flight wait for its result.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args) -> tuple[object, bool]:
+        """
+        Run fn(*args) unless a call for key is in flight.
+        Returns (result, shared) where shared tells if the result was
+        computed by another caller.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return future.result(), False
+
+
+class ServiceStats:
+    """
+    Request counters and latency percentiles of the service
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.requests = {}
+        self.errors = 0
+        self.coalesced = 0
+        self.in_flight = 0
+        self.latencies = {}
+
+    def begin(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+
+    def end(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def add_coalesced(self) -> None:
+        with self._lock:
+            self.coalesced += 1
+
+    def record(self, endpoint: str, seconds: float, error: bool = False) -> None:
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            self.errors += int(error)
+            window = self.latencies.setdefault(endpoint, deque(maxlen=LATENCY_WINDOW))
+            window.append(seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            latency = {}
+            for endpoint, window in self.latencies.items():
+                ordered = sorted(window)
+                latency[endpoint] = {
+                    "p50": ordered[int(0.50 * (len(ordered) - 1))],
+                    "p95": ordered[int(0.95 * (len(ordered) - 1))],
+                    "max": ordered[-1],
+                }
+            return {
+                "uptime": time.time() - self.started_at,
+                "requests": dict(self.requests),
+                "errors": self.errors,
+                "coalesced": self.coalesced,
+                "in_flight": self.in_flight,
+                "latency": latency,
+            }
+
+
+class ReportService:
+    """
+    Keep one warm assistant and answer report, trusted-knowledge and
+    name-resolution requests with it.
+    """
+
+    def __init__(self, assistant):
+        self.assistant = assistant
+        self.single_flight = SingleFlight()
+        self.stats = ServiceStats()
+
+    def _coalesced(self, key, fn, *args):
+        result, shared = self.single_flight.do(key, fn, *args)
+        if shared:
+            self.stats.add_coalesced()
+        return result
+
+    def trusted_knowledge(self, tax_id: str) -> dict:
+        organism_info = self._coalesced(
+            ("info", tax_id), self.assistant.set_organism_fields, tax_id
+        )
+        return {"tax_id": tax_id, "organism_info": organism_info}
+
+    def _build_report(self, tax_id: str, languages: tuple[str, ...]) -> dict:
+        stored = [
+            self.assistant.get_stored_report(tax_id, LANGUAGES[code])
+            for code in languages
+        ]
+        if all(stored):
+            organism_info = stored[0].organism_info
+            reports = {code: report.report for code, report in zip(languages, stored)}
+        else:
+            organism_info = self.trusted_knowledge(tax_id)["organism_info"]
+            generated = self.assistant.generate_reports(
+                tax_id,
+                [LANGUAGES[code] for code in languages],
+                organism_info=organism_info,
+            )
+            reports = {code: generated[LANGUAGES[code]] for code in languages}
+
+        if len(languages) == 1:
+            return {
+                "tax_id": tax_id,
+                "language": languages[0],
+                "organism_info": organism_info,
+                "report": reports[languages[0]],
+            }
+        return {
+            "tax_id": tax_id,
+            "languages": list(languages),
+            "organism_info": organism_info,
+            "reports": reports,
+        }
+
+    def report(self, tax_id: str, language: str = "EN") -> dict:
+        """
+        Report in one language, or in several ('EN,PT') keyed by language,
+        sharing the lookups
+        """
+        languages = tuple(parse_languages(language))
+        return self._coalesced(
+            ("report", tax_id, languages), self._build_report, tax_id, languages
+        )
+
+    def resolve(self, name: str) -> dict:
+        return {"name": name, "tax_id": self.assistant.get_organism_tax_id(name)}
+
+    def health(self) -> dict:
+        return {"status": "ok"}
+
+
+class ReportRequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON GET endpoints of the report service
+    """
+
+    server_version = "BioJarvis"
+
+    def _routes(self, service: ReportService) -> dict:
+        return {
+            "/health": lambda params: service.health(),
+            "/stats": lambda params: service.stats.snapshot(),
+            "/report": lambda params: service.report(
+                _required(params, "taxid"), params.get("language", "EN").upper()
+            ),
+            "/trusted-knowledge": lambda params: service.trusted_knowledge(
+                _required(params, "taxid")
+            ),
+            "/resolve": lambda params: service.resolve(_required(params, "name")),
+        }
+
+    def do_GET(self):
+        service = self.server.service
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        route = self._routes(service).get(url.path)
+        if route is None:
+            self._send_json(404, {"error": f"Unknown endpoint {url.path}"})
+            return
+
+        started = time.perf_counter()
+        service.stats.begin()
+        status, payload = 200, None
+        try:
+            payload = route(params)
+        except ValueError as e:
+            status, payload = 400, {"error": str(e)}
+        except Exception as e:
+            logging.error(f"Service error on {self.path}: {e}")
+            status, payload = 500, {"error": str(e)}
+        finally:
+            service.stats.end()
+
+        if url.path not in ("/health", "/stats"):
+            service.stats.record(
+                url.path, time.perf_counter() - started, error=status != 200
+            )
+        self._send_json(status, payload)
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self) -> str:
+        # Unix socket peers have no (host, port) address
+        if isinstance(self.client_address, tuple) and self.client_address:
+            return str(self.client_address[0])
+        return "unix"
+
+    def log_message(self, format, *args):
+        logging.info(f"{self.address_string()} - {format % args}")
+
+
+def _required(params: dict, name: str) -> str:
+    value = params.get(name, "").strip()
+    if not value:
+        raise ValueError(f"Missing '{name}' parameter")
+    return value
+
+
+class ReportHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service: ReportService):
+        super().__init__(address, ReportRequestHandler)
+        self.service = service
+
+
+class ReportUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, service: ReportService):
+        if os.path.exists(path):
+            os.remove(path)
+        super().__init__(path, ReportRequestHandler)
+        self.service = service
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+def start_servers(
+    service: ReportService,
+    host: str | None = SERVICE_HOST,
+    port: int = SERVICE_PORT,
+    socket_path: str | None = None,
+) -> list[socketserver.BaseServer]:
+    """
+    Start the HTTP and/or Unix socket servers on background threads
+    """
+    servers = []
+    if host:
+        servers.append(ReportHTTPServer((host, port), service))
+    if socket_path:
+        servers.append(ReportUnixServer(socket_path, service))
+
+    for server in servers:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    return servers
+
+
+def serve(
+    service: ReportService,
+    host: str | None = SERVICE_HOST,
+    port: int = SERVICE_PORT,
+    socket_path: str | None = None,
+) -> None:
+    """
+    Run the service until interrupted
+    """
+    servers = start_servers(service, host, port, socket_path)
+    for server in servers:
+        if isinstance(server, ReportUnixServer):
+            print(f"Listening on unix:{server.server_address}")
+        else:
+            print(
+                f"Listening on http://{server.server_address[0]}:{server.server_address[1]}"
+            )
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        print("\nStopping the service...")
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+def request_service(
+    address: str, endpoint: str, params: dict | None = None, timeout: float = 300
+) -> dict:
+    """
+    Thin client: call endpoint of a running service.
+    address is 'http://host:port' or 'unix:/path/to/socket'.
+    """
+    if address.startswith("unix:"):
+        connection = _UnixHTTPConnection(address[len("unix:") :], timeout)
+    else:
+        url = urlparse(address if "://" in address else f"http://{address}")
+        connection = http.client.HTTPConnection(url.hostname, url.port, timeout=timeout)
+
+    query = f"?{urlencode(params)}" if params else ""
+    try:
+        connection.request("GET", f"{endpoint}{query}")
+        response = connection.getresponse()
+        payload = json.loads(response.read().decode("utf-8"))
+    finally:
+        connection.close()
+
+    if response.status != 200:
+        raise RuntimeError(payload.get("error", f"HTTP {response.status}"))
+    return payload
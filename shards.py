@@ -0,0 +1,416 @@
+import asyncio
+import csv
+import hashlib
+import json
+import logging
+import os
+import socket
+import time
+from dataclasses import dataclass, field
+
+from batch import (
+    DEFAULT_WORKERS,
+    BatchResult,
+    BatchRow,
+    arun_batch,
+    read_batch_file,
+    run_batch,
+)
+from output_writers import (
+    language_output_paths,
+    open_writer,
+    output_file_path,
+    read_jsonl_reports,
+)
+from utils import atomic_write_json
+
+MANIFEST_FILE = "manifest.json"
+DONE_FILE = "done.json"
+RESULTS_FILE = "results.jsonl"
+# Failed rows run again by the merge command, each rerun kept like one
+# more shard in rerun-0001, rerun-0002...
+RERUN_PREFIX = "rerun-"
+CACHE_DIR = "cache"
+
+# Filesystems shared between hosts, where the locks sqlite's WAL mode
+# relies on do not work
+NETWORK_FILESYSTEMS = {
+    "nfs",
+    "nfs4",
+    "cifs",
+    "smb3",
+    "smbfs",
+    "9p",
+    "lustre",
+    "gpfs",
+    "ceph",
+    "glusterfs",
+    "fuse.sshfs",
+    "fuse.glusterfs",
+    "fuse.s3fs",
+    "fuse.gcsfuse",
+}
+
+
+def shard_of(row: BatchRow, shards: int) -> int:
+    """
+    Shard of a row from the hash of its TaxID (its organism name when it
+    has none), the same on every host and run
+    """
+    key = row.tax_id or row.organism_name.strip().lower()
+    digest = hashlib.sha256(key.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % shards
+
+
+def shard_path(shard_dir: str, index: int) -> str:
+    return os.path.join(shard_dir, f"shard-{index:04d}")
+
+
+def _rerun_paths(shard_dir: str) -> list[str]:
+    """
+    Directories of the finished reruns, oldest first
+    """
+    return [
+        os.path.join(shard_dir, name)
+        for name in sorted(os.listdir(shard_dir))
+        if name.startswith(RERUN_PREFIX)
+        and os.path.exists(os.path.join(shard_dir, name, DONE_FILE))
+    ]
+
+
+def _input_path(shard_dir: str, index: int) -> str:
+    return os.path.join(shard_path(shard_dir, index), "input.tsv")
+
+
+def _report_paths(path: str, languages: list[str]) -> dict[str, str]:
+    return {
+        language: output_file_path(report_path, "jsonl")
+        for language, report_path in language_output_paths(
+            os.path.join(path, "reports"), languages
+        ).items()
+    }
+
+
+def _write_rows(path: str, rows: list[BatchRow]) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter="\t", lineterminator="\n")
+        writer.writerow(("sample_id", "taxid", "name"))
+        for row in rows:
+            writer.writerow((row.sample_id, row.tax_id, row.organism_name))
+
+
+def split_manifest(
+    rows: list[BatchRow], shards: int, shard_dir: str, languages: list[str]
+) -> list[int]:
+    """
+    Split batch rows into shards, each with its own input file, and
+    record the split in the manifest. Returns the rows per shard.
+    """
+    if shards < 1:
+        raise ValueError("The number of shards must be at least 1")
+    if os.path.exists(os.path.join(shard_dir, MANIFEST_FILE)):
+        raise ValueError(f"{shard_dir} already holds a sharded run")
+
+    assigned = [[] for _ in range(shards)]
+    for row in rows:
+        assigned[shard_of(row, shards)].append(row)
+    for index, shard_rows in enumerate(assigned):
+        _write_rows(_input_path(shard_dir, index), shard_rows)
+
+    atomic_write_json(
+        os.path.join(shard_dir, MANIFEST_FILE),
+        {
+            "shards": shards,
+            "rows": len(rows),
+            "languages": languages,
+            "created_at": time.time(),
+        },
+    )
+    return [len(shard_rows) for shard_rows in assigned]
+
+
+def read_manifest(shard_dir: str) -> dict:
+    path = os.path.join(shard_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        raise ValueError(f"{shard_dir} holds no sharded run (no {MANIFEST_FILE})")
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def is_network_filesystem(path: str) -> bool:
+    """
+    Whether path lies on a filesystem mounted from the network, going by
+    the longest matching mount point of /proc/mounts (Linux only)
+    """
+    try:
+        with open("/proc/mounts", "r", encoding="utf-8") as f:
+            mounts = [line.split()[1:3] for line in f if line.strip()]
+    except OSError:
+        return False
+    path = os.path.realpath(path)
+    best, fstype = "", ""
+    for mount_point, mount_type in mounts:
+        mount_point = mount_point.replace("\\040", " ")
+        inside = path == mount_point or path.startswith(mount_point.rstrip("/") + "/")
+        if inside and len(mount_point) > len(best):
+            best, fstype = mount_point, mount_type
+    return fstype in NETWORK_FILESYSTEMS
+
+
+def shared_cache_path(shard_dir: str, name: str) -> str | None:
+    """
+    Path of a cache shared by the workers of a run, in the shard
+    directory, or None when its filesystem cannot hold a shared sqlite
+    database (workers then keep their own local cache)
+    """
+    if is_network_filesystem(shard_dir):
+        return None
+    return os.path.join(shard_dir, CACHE_DIR, name)
+
+
+def _write_results(path: str, results: list[BatchResult]) -> None:
+    with open(os.path.join(path, RESULTS_FILE), "w", encoding="utf-8") as f:
+        for result in results:
+            record = {
+                "sample_id": result.row.sample_id,
+                "tax_id": result.tax_id or result.row.tax_id,
+                "organism_name": result.row.organism_name,
+                "status": "ok" if result.ok else "failed",
+                "error": result.error,
+                "failed_languages": result.failed_languages,
+            }
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _run_rows(
+    assistant,
+    rows: list[BatchRow],
+    path: str,
+    languages: list[str],
+    workers: int,
+    concurrency: int | None,
+) -> list[BatchResult]:
+    """
+    Run rows into a fresh shard-local output, then mark it done
+    """
+    for report_path in _report_paths(path, languages).values():
+        if os.path.exists(report_path):
+            os.remove(report_path)
+    output = os.path.join(path, "reports")
+    if concurrency:
+        results = asyncio.run(
+            arun_batch(
+                assistant,
+                rows,
+                languages,
+                concurrency=concurrency,
+                output=output,
+                file_type="jsonl",
+            )
+        )
+    else:
+        results = run_batch(
+            assistant, rows, languages, workers, output=output, file_type="jsonl"
+        )
+
+    _write_results(path, results)
+    atomic_write_json(
+        os.path.join(path, DONE_FILE),
+        {
+            "rows": len(results),
+            "failed": sum(not result.ok for result in results),
+            "languages": languages,
+            "host": socket.gethostname(),
+            "finished_at": time.time(),
+        },
+    )
+    return results
+
+
+def run_shard(
+    assistant,
+    shard_dir: str,
+    index: int,
+    workers: int = DEFAULT_WORKERS,
+    concurrency: int | None = None,
+) -> list[BatchResult]:
+    """
+    Generate the reports of one shard into its own directory and leave a
+    done marker. A shard without the marker (a crashed worker) is run
+    again from the start; a done one is not.
+    """
+    manifest = read_manifest(shard_dir)
+    if not 0 <= index < manifest["shards"]:
+        raise ValueError(f"Shard {index} is not in 0..{manifest['shards'] - 1}")
+    path = shard_path(shard_dir, index)
+    if os.path.exists(os.path.join(path, DONE_FILE)):
+        print(f"Shard {index} is already done")
+        return []
+
+    rows = read_batch_file(_input_path(shard_dir, index))
+    print(f"Shard {index} of {manifest['shards']}: {len(rows)} rows")
+    return _run_rows(assistant, rows, path, manifest["languages"], workers, concurrency)
+
+
+def _read_results(path: str) -> list[dict]:
+    with open(os.path.join(path, RESULTS_FILE), "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+@dataclass
+class ShardRun:
+    """
+    State of a sharded run: shards without a done marker, and the rows
+    that failed in the done shards and were not fixed by a rerun, with
+    the languages still missing for each (by sample)
+    """
+
+    shards: int
+    languages: list[str]
+    missing: list[int] = field(default_factory=list)
+    failed: list[BatchRow] = field(default_factory=list)
+    failed_languages: dict[str, list[str]] = field(default_factory=dict)
+    rows: int = 0
+
+    @property
+    def complete(self) -> bool:
+        return not self.missing and not self.failed
+
+
+def collect_shards(shard_dir: str) -> ShardRun:
+    """
+    Read the done markers and row outcomes of every shard
+    """
+    manifest = read_manifest(shard_dir)
+    run = ShardRun(shards=manifest["shards"], languages=manifest["languages"])
+    failed = {}
+    for index in range(run.shards):
+        path = shard_path(shard_dir, index)
+        if not os.path.exists(os.path.join(path, DONE_FILE)):
+            run.missing.append(index)
+            continue
+        for record in _read_results(path):
+            run.rows += 1
+            if record["status"] != "ok":
+                failed[record["sample_id"]] = BatchRow(
+                    sample_id=record["sample_id"],
+                    tax_id=record["tax_id"],
+                    organism_name=record["organism_name"],
+                )
+                run.failed_languages[record["sample_id"]] = _failed_languages(
+                    record, run.languages
+                )
+
+    # a rerun only generates the languages that failed: the others stay done
+    for path in _rerun_paths(shard_dir):
+        languages = _path_languages(path, run.languages)
+        for record in _read_results(path):
+            sample_id = record["sample_id"]
+            if sample_id not in failed:
+                continue
+            still_failed = set(_failed_languages(record, languages))
+            run.failed_languages[sample_id] = [
+                language
+                for language in run.failed_languages[sample_id]
+                if language not in languages or language in still_failed
+            ]
+            if not run.failed_languages[sample_id]:
+                del failed[sample_id], run.failed_languages[sample_id]
+    run.failed = list(failed.values())
+    return run
+
+
+def _failed_languages(record: dict, languages: list[str]) -> list[str]:
+    if record["status"] == "ok":
+        return []
+    # results written before failures were kept per language
+    return record.get("failed_languages") or list(languages)
+
+
+def _path_languages(path: str, languages: list[str]) -> list[str]:
+    """
+    Languages generated in a shard or rerun directory
+    """
+    with open(os.path.join(path, DONE_FILE), "r", encoding="utf-8") as f:
+        return json.load(f).get("languages", languages)
+
+
+def rerun_failed(
+    assistant,
+    shard_dir: str,
+    workers: int = DEFAULT_WORKERS,
+    concurrency: int | None = None,
+) -> list[BatchResult]:
+    """
+    Generate again only the rows that failed in the done shards, and of
+    those only the languages that failed
+    """
+    run = collect_shards(shard_dir)
+    if not run.failed:
+        return []
+    print(f"Rerunning {len(run.failed)} failed rows")
+    groups = {}
+    for row in run.failed:
+        languages = tuple(run.failed_languages[row.sample_id])
+        groups.setdefault(languages, []).append(row)
+
+    results = []
+    for languages, rows in groups.items():
+        # a new directory, keeping the reports fixed by earlier reruns
+        number = sum(name.startswith(RERUN_PREFIX) for name in os.listdir(shard_dir))
+        path = os.path.join(shard_dir, f"{RERUN_PREFIX}{number + 1:04d}")
+        os.makedirs(path, exist_ok=True)
+        results += _run_rows(
+            assistant, rows, path, list(languages), workers, concurrency
+        )
+    return results
+
+
+def merge_shards(shard_dir: str, output: str, file_type: str = "json") -> ShardRun:
+    """
+    Combine the reports of the done shards (and of reruns, which win)
+    into one output per language. Missing shards are reported, not
+    waited for: merging again once they are done completes the output.
+    """
+    run = collect_shards(shard_dir)
+    if run.missing:
+        logging.warning(
+            f"{len(run.missing)} of {run.shards} shards are not done: "
+            f"{', '.join(map(str, run.missing))}"
+        )
+
+    paths = [
+        shard_path(shard_dir, index)
+        for index in range(run.shards)
+        if index not in run.missing
+    ]
+    paths += _rerun_paths(shard_dir)
+    report_paths = [
+        _report_paths(path, _path_languages(path, run.languages)) for path in paths
+    ]
+
+    outputs = language_output_paths(output, run.languages)
+    for language, language_output in outputs.items():
+        # one report per sample, the latest rerun winning
+        records = {}
+        for path_reports in report_paths:
+            report_path = path_reports.get(language)
+            if report_path and os.path.exists(report_path):
+                for record in read_jsonl_reports(report_path):
+                    records[record.get("sample_id", record["tax_id"])] = record
+
+        merged_path = output_file_path(language_output, file_type)
+        if os.path.exists(merged_path):
+            os.remove(merged_path)
+        with open_writer(language_output, file_type) as writer:
+            for record in records.values():
+                writer.write(
+                    record["tax_id"],
+                    record["report"],
+                    organism_info=record.get("organism_info"),
+                    sample_id=record.get("sample_id"),
+                )
+    return run
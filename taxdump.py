@@ -0,0 +1,431 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import tarfile
+import time
+from contextlib import closing
+from dataclasses import dataclass, field
+
+from relative_index import taxonomy_signature
+
+# Schema version of ete4's taxonomy database (its 'stats' table)
+ETE_DB_VERSION = 2
+
+# names.dmp classes stored as synonyms, as ete4 does
+SYNONYM_CLASSES = {
+    "synonym",
+    "equivalent name",
+    "genbank equivalent name",
+    "anamorph",
+    "genbank synonym",
+    "genbank anamorph",
+    "teleomorph",
+}
+
+SCHEMA = """
+    CREATE TABLE stats (version INT PRIMARY KEY);
+    CREATE TABLE species (taxid INT PRIMARY KEY, parent INT,
+        spname VARCHAR(50) COLLATE NOCASE, common VARCHAR(50) COLLATE NOCASE,
+        rank VARCHAR(50), track TEXT);
+    CREATE TABLE synonym (taxid INT, spname VARCHAR(50) COLLATE NOCASE,
+        PRIMARY KEY (spname, taxid));
+    CREATE TABLE merged (taxid_old INT, taxid_new INT);
+    CREATE TABLE taxdump_info (key TEXT PRIMARY KEY, value TEXT);
+"""
+INDEXES = """
+    CREATE INDEX spname1 ON species (spname COLLATE NOCASE);
+    CREATE INDEX spname2 ON synonym (spname COLLATE NOCASE);
+"""
+
+
+@dataclass
+class Taxonomy:
+    """
+    Content of a taxdump or of the database built from one.
+    nodes maps each TaxID to (parent, scientific name, common name, rank),
+    the root having no parent.
+    """
+
+    nodes: dict[int, tuple[int | None, str, str, str]]
+    synonyms: set[tuple[int, str]]
+    merged: dict[int, int]
+    md5: str = ""
+
+
+@dataclass
+class TaxonomyChanges:
+    """
+    What an update changed, used to refresh what depends on the taxonomy
+    """
+
+    full_rebuild: bool = False
+    reason: str = ""
+    elapsed: float = 0.0
+    # taxonomy_signature of the database before the update
+    previous_signature: str = ""
+    added: set[int] = field(default_factory=set)
+    removed: set[int] = field(default_factory=set)
+    renamed: set[int] = field(default_factory=set)
+    reranked: set[int] = field(default_factory=set)
+    # Nodes whose lineage changed: added and moved nodes and their descendants
+    relineaged: set[int] = field(default_factory=set)
+    # Descendants of renamed nodes, whose lineage now carries a new name
+    below_renamed: set[int] = field(default_factory=set)
+    synonyms_added: int = 0
+    synonyms_removed: int = 0
+    # Obsolete TaxIDs merged, unmerged or merged elsewhere
+    merged: set[int] = field(default_factory=set)
+
+    @property
+    def unchanged(self) -> bool:
+        return not (self.structure_changed or self.names_changed or self.reranked)
+
+    @property
+    def structure_changed(self) -> bool:
+        return bool(self.removed or self.relineaged or self.merged)
+
+    @property
+    def names_changed(self) -> bool:
+        return bool(
+            self.added
+            or self.removed
+            or self.renamed
+            or self.synonyms_added
+            or self.synonyms_removed
+        )
+
+    @property
+    def affected_tax_ids(self) -> set[int]:
+        """
+        TaxIDs whose name, rank or lineage is not what it was
+        """
+        return (
+            self.removed | self.renamed | self.reranked | self.relineaged | self.merged
+        )
+
+    def summary(self) -> str:
+        return (
+            f"{len(self.added)} added, {len(self.removed)} removed, "
+            f"{len(self.renamed)} renamed, {len(self.reranked)} re-ranked, "
+            f"{len(self.relineaged)} with a new lineage, "
+            f"{self.synonyms_added + self.synonyms_removed} synonym changes, "
+            f"{len(self.merged)} merged ID changes"
+        )
+
+
+def file_md5(path: str) -> str:
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _dmp_fields(tar: tarfile.TarFile, member: str):
+    for line in tar.extractfile(member):
+        yield [value.strip() for value in line.decode("utf-8").split("|")]
+
+
+def read_taxdump(path: str) -> Taxonomy:
+    """
+    Parse nodes.dmp, names.dmp and merged.dmp of a taxdump.tar.gz,
+    keeping the same names as ete4's own import
+    """
+    names, common, synonyms, seen_synonyms = {}, {}, set(), set()
+    with tarfile.open(path, "r") as tar:
+        for fields in _dmp_fields(tar, "names.dmp"):
+            tax_id, name, name_class = int(fields[0]), fields[1], fields[3].lower()
+            name = name.strip('"')
+            if name_class == "scientific name":
+                names[tax_id] = name
+            elif name_class == "genbank common name":
+                common[tax_id] = name
+            elif name_class in SYNONYM_CLASSES:
+                # ete4 skips synonyms only differing in case
+                if (tax_id, name.lower()) not in seen_synonyms:
+                    seen_synonyms.add((tax_id, name.lower()))
+                    synonyms.add((tax_id, name))
+
+        nodes = {}
+        for fields in _dmp_fields(tar, "nodes.dmp"):
+            tax_id, parent = int(fields[0]), int(fields[1])
+            nodes[tax_id] = (
+                None if parent == tax_id else parent,
+                names[tax_id],
+                common.get(tax_id, ""),
+                fields[2],
+            )
+
+        merged = {
+            int(fields[0]): int(fields[1]) for fields in _dmp_fields(tar, "merged.dmp")
+        }
+    return Taxonomy(nodes, synonyms, merged, file_md5(path))
+
+
+def read_database(dbfile: str) -> Taxonomy | None:
+    """
+    Content of an existing taxonomy database (None if it is missing or
+    has another schema version). md5 is that of the taxdump it was last
+    updated from, empty if unknown.
+    """
+    if not os.path.exists(dbfile):
+        return None
+    with closing(sqlite3.connect(f"file:{dbfile}?mode=ro", uri=True)) as conn:
+        tables = {
+            row[0]
+            for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
+        }
+        if not {"stats", "species", "synonym", "merged"} <= tables:
+            return None
+        if conn.execute("SELECT MAX(version) FROM stats").fetchone()[0] != (
+            ETE_DB_VERSION
+        ):
+            return None
+
+        nodes = {
+            tax_id: (
+                None if parent in ("", None, tax_id) else int(parent),
+                spname or "",
+                common or "",
+                rank or "",
+            )
+            for tax_id, parent, spname, common, rank in conn.execute(
+                "SELECT taxid, parent, spname, common, rank FROM species"
+            )
+        }
+        synonyms = set(conn.execute("SELECT taxid, spname FROM synonym"))
+        merged = dict(conn.execute("SELECT taxid_old, taxid_new FROM merged"))
+        md5 = ""
+        if "taxdump_info" in tables:
+            row = conn.execute(
+                "SELECT value FROM taxdump_info WHERE key = 'md5'"
+            ).fetchone()
+            md5 = row[0] if row else ""
+    return Taxonomy(nodes, synonyms, merged, md5)
+
+
+def _children(nodes: dict) -> dict[int, list[int]]:
+    children = {}
+    for tax_id, (parent, *_) in nodes.items():
+        if parent is not None:
+            children.setdefault(parent, []).append(tax_id)
+    return children
+
+
+def _with_descendants(children: dict, roots: set[int]) -> set[int]:
+    found = set()
+    stack = list(roots)
+    while stack:
+        tax_id = stack.pop()
+        if tax_id not in found:
+            found.add(tax_id)
+            stack.extend(children.get(tax_id, ()))
+    return found
+
+
+def _track(nodes: dict, tax_id: int) -> str:
+    """
+    Lineage of a node from itself up to the root, as stored by ete4
+    """
+    track = []
+    node = tax_id
+    while node is not None:
+        if node not in nodes or len(track) > len(nodes):
+            raise ValueError(f"Broken lineage for TaxID {tax_id} in the taxdump")
+        track.append(str(node))
+        node = nodes[node][0]
+    return ",".join(track)
+
+
+def _iter_tracks(nodes: dict, children: dict, roots: list[int]):
+    """
+    (TaxID, track) of the given nodes and all their descendants
+    """
+    stack = [(root, _track(nodes, root)) for root in roots]
+    while stack:
+        tax_id, track = stack.pop()
+        yield tax_id, track
+        for child in children.get(tax_id, ()):
+            stack.append((child, f"{child},{track}"))
+
+
+def _species_row(nodes: dict, tax_id: int, track: str) -> tuple:
+    parent, spname, common, rank = nodes[tax_id]
+    return (tax_id, "" if parent is None else parent, spname, common, rank, track)
+
+
+def diff_taxonomies(old: Taxonomy, new: Taxonomy) -> TaxonomyChanges:
+    changes = TaxonomyChanges()
+    changes.added = new.nodes.keys() - old.nodes.keys()
+    changes.removed = old.nodes.keys() - new.nodes.keys()
+    moved = set()
+    for tax_id in new.nodes.keys() & old.nodes.keys():
+        old_parent, old_name, old_common, old_rank = old.nodes[tax_id]
+        parent, name, common, rank = new.nodes[tax_id]
+        if parent != old_parent:
+            moved.add(tax_id)
+        if (name, common) != (old_name, old_common):
+            changes.renamed.add(tax_id)
+        if rank != old_rank:
+            changes.reranked.add(tax_id)
+
+    if moved or changes.added or changes.renamed:
+        children = _children(new.nodes)
+        changes.relineaged = _with_descendants(children, moved | changes.added)
+        changes.below_renamed = (
+            _with_descendants(children, changes.renamed) - changes.renamed
+        )
+
+    changes.synonyms_added = len(new.synonyms - old.synonyms)
+    changes.synonyms_removed = len(old.synonyms - new.synonyms)
+    changes.merged = {
+        old_id
+        for old_id in old.merged.keys() | new.merged.keys()
+        if old.merged.get(old_id) != new.merged.get(old_id)
+    }
+    return changes
+
+
+def _write_info(conn: sqlite3.Connection, taxonomy: Taxonomy, source: str) -> None:
+    conn.executemany(
+        "INSERT OR REPLACE INTO taxdump_info VALUES (?, ?)",
+        [("md5", taxonomy.md5), ("source", source), ("updated_at", str(time.time()))],
+    )
+
+
+def build_database(dbfile: str, taxonomy: Taxonomy, source: str = "") -> None:
+    """
+    Write a complete taxonomy database next to dbfile and move it into place
+    """
+    directory = os.path.dirname(dbfile)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{dbfile}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    nodes = taxonomy.nodes
+    roots = [tax_id for tax_id, (parent, *_) in nodes.items() if parent is None]
+    with closing(sqlite3.connect(tmp_path)) as conn:
+        conn.executescript(SCHEMA)
+        conn.execute("INSERT INTO stats VALUES (?)", (ETE_DB_VERSION,))
+        conn.executemany(
+            "INSERT INTO species VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                _species_row(nodes, tax_id, track)
+                for tax_id, track in _iter_tracks(nodes, _children(nodes), roots)
+            ),
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO synonym VALUES (?, ?)", sorted(taxonomy.synonyms)
+        )
+        conn.executemany("INSERT INTO merged VALUES (?, ?)", taxonomy.merged.items())
+        _write_info(conn, taxonomy, source)
+        conn.executescript(INDEXES)
+        conn.commit()
+    os.replace(tmp_path, dbfile)
+
+
+def apply_changes(
+    dbfile: str, old: Taxonomy, new: Taxonomy, changes: TaxonomyChanges, source: str
+) -> None:
+    """
+    Bring the database from old to new in one transaction, writing only
+    the rows that changed
+    """
+    nodes = new.nodes
+    relineaged = changes.relineaged
+    # Topmost relineaged nodes; their descendants follow in _iter_tracks
+    roots = [tax_id for tax_id in relineaged if nodes[tax_id][0] not in relineaged]
+    updated = (changes.renamed | changes.reranked) - relineaged
+
+    with closing(sqlite3.connect(dbfile, timeout=60)) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS taxdump_info (key TEXT PRIMARY KEY, value TEXT)"
+        )
+        conn.executemany(
+            "DELETE FROM species WHERE taxid = ?",
+            ((tax_id,) for tax_id in changes.removed),
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO species VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                _species_row(nodes, tax_id, track)
+                for tax_id, track in _iter_tracks(nodes, _children(nodes), roots)
+            ),
+        )
+        conn.executemany(
+            "UPDATE species SET spname = ?, common = ?, rank = ? WHERE taxid = ?",
+            (
+                (nodes[tax_id][1], nodes[tax_id][2], nodes[tax_id][3], tax_id)
+                for tax_id in updated
+            ),
+        )
+        conn.executemany(
+            "DELETE FROM synonym WHERE taxid = ? AND spname = ?",
+            old.synonyms - new.synonyms,
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO synonym VALUES (?, ?)", new.synonyms - old.synonyms
+        )
+        conn.executemany(
+            "DELETE FROM merged WHERE taxid_old = ?",
+            ((old_id,) for old_id in changes.merged),
+        )
+        conn.executemany(
+            "INSERT INTO merged VALUES (?, ?)",
+            (
+                (old_id, new.merged[old_id])
+                for old_id in changes.merged
+                if old_id in new.merged
+            ),
+        )
+        _write_info(conn, new, source)
+        conn.commit()
+
+
+def update_taxonomy_db(
+    dbfile: str, taxdump_path: str, full_rebuild: bool = False
+) -> TaxonomyChanges:
+    """
+    Update the taxonomy database from a local taxdump.tar.gz.
+
+    When the database was last updated from a known taxdump, only the
+    nodes, names and merged IDs that differ are written. Otherwise (or with
+    full_rebuild) the database is rebuilt from scratch. The returned changes
+    say what differs from the previous database, when there was one.
+    """
+    started = time.perf_counter()
+    logging.info(f"Reading {taxdump_path}...")
+    new = read_taxdump(taxdump_path)
+    old = read_database(dbfile)
+
+    if old is None:
+        reason = "no usable database"
+    elif full_rebuild:
+        reason = "requested"
+    elif not old.md5:
+        reason = "the previous taxdump is unknown"
+    else:
+        reason = ""
+
+    if old is not None and old.md5 == new.md5 and not full_rebuild:
+        changes = TaxonomyChanges()
+    elif old is not None:
+        changes = diff_taxonomies(old, new)
+    else:
+        changes = TaxonomyChanges(added=set(new.nodes), relineaged=set(new.nodes))
+
+    if old is not None:
+        changes.previous_signature = taxonomy_signature(dbfile)
+    source = os.path.abspath(taxdump_path)
+    if reason:
+        logging.info(f"Rebuilding the whole taxonomy database ({reason})...")
+        build_database(dbfile, new, source)
+        changes.full_rebuild, changes.reason = True, reason
+    elif old.md5 != new.md5:
+        apply_changes(dbfile, old, new, changes, source)
+    changes.elapsed = time.perf_counter() - started
+    return changes
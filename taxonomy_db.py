@@ -0,0 +1,177 @@
+import os
+import sqlite3
+import threading
+import warnings
+from collections.abc import Iterable
+from functools import cached_property
+
+# Where ete4 keeps the taxonomy database unless told otherwise
+DEFAULT_TAXONOMY_DB = os.path.join(
+    os.environ.get("XDG_DATA_HOME", os.path.expanduser("~/.local/share")),
+    "ete",
+    "taxa.sqlite",
+)
+
+# sqlite's default limit on host parameters is 999
+IN_CHUNK_SIZE = 900
+
+
+def select_in(conn: sqlite3.Connection, query: str, ids: Iterable) -> list[tuple]:
+    """
+    Run an 'IN (...)' query in chunks below sqlite's variable limit
+    """
+    ids = list(ids)
+    rows = []
+    for start in range(0, len(ids), IN_CHUNK_SIZE):
+        chunk = ids[start : start + IN_CHUNK_SIZE]
+        placeholders = ",".join("?" * len(chunk))
+        rows.extend(conn.execute(query % placeholders, chunk).fetchall())
+    return rows
+
+
+def _int_ids(tax_ids: Iterable) -> set[int]:
+    return {int(tax_id) for tax_id in tax_ids if tax_id not in (None, "")}
+
+
+class TaxonomyDB:
+    """
+    Thread-safe, read-only access to ete's NCBI taxonomy sqlite database.
+
+    Each thread gets its own connection (opened read-only, memory-mapped,
+    with a statement cache), so batch workers and service threads never
+    share or wait on one. Lookups take many TaxIDs or names and run a few
+    'IN (...)' queries instead of one query per item. Results follow the
+    conventions of ete4's NCBITaxa (lineages from the root down, merged
+    TaxIDs translated to their current ones).
+
+    With immutable=True sqlite also skips file locking; only use it when
+    the file cannot be updated while the process runs.
+    """
+
+    def __init__(
+        self, dbfile: str, immutable: bool = False, mmap_size: int = 268435456
+    ):
+        if not os.path.exists(dbfile):
+            raise ValueError(f"Cannot open taxonomy database: {dbfile}")
+        self.dbfile = dbfile
+        self.immutable = immutable
+        self.mmap_size = mmap_size
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            flags = "mode=ro&immutable=1" if self.immutable else "mode=ro"
+            conn = sqlite3.connect(
+                f"file:{self.dbfile}?{flags}",
+                uri=True,
+                check_same_thread=False,
+                cached_statements=256,
+            )
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self) -> None:
+        """
+        Close the connections of every thread
+        """
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+    @cached_property
+    def _has_synonyms(self) -> bool:
+        return bool(
+            self._conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'synonym'"
+            ).fetchone()
+        )
+
+    def translate_merged(self, tax_ids: Iterable) -> dict[int, int]:
+        """
+        Current TaxID of every obsolete TaxID that was merged into another
+        """
+        return dict(
+            select_in(
+                self._conn,
+                "SELECT taxid_old, taxid_new FROM merged WHERE taxid_old IN (%s)",
+                _int_ids(tax_ids),
+            )
+        )
+
+    def _species_column(self, column: str, tax_ids: Iterable) -> dict[int, object]:
+        """
+        column of the species table for each TaxID, following merged IDs
+        """
+        ids = _int_ids(tax_ids)
+        query = f"SELECT taxid, {column} FROM species WHERE taxid IN (%s)"
+        found = dict(select_in(self._conn, query, ids))
+        missing = ids - found.keys()
+        if missing:
+            merged = self.translate_merged(missing)
+            current = dict(select_in(self._conn, query, set(merged.values())))
+            for old, new in merged.items():
+                if new in current:
+                    found[old] = current[new]
+        return found
+
+    def get_lineages(self, tax_ids: Iterable) -> dict[int, list[int]]:
+        """
+        Lineage of each TaxID, from the root down to the node
+        """
+        return {
+            tax_id: [int(node) for node in reversed(track.split(","))]
+            for tax_id, track in self._species_column("track", tax_ids).items()
+        }
+
+    def get_lineage(self, tax_id: str | int) -> list[int]:
+        lineage = self.get_lineages([tax_id]).get(int(tax_id))
+        if lineage is None:
+            raise ValueError(f"Could not find taxid: {tax_id}")
+        if lineage[-1] != int(tax_id):
+            warnings.warn(f"taxid {tax_id} was translated into {lineage[-1]}")
+        return lineage
+
+    def get_ranks(self, tax_ids: Iterable) -> dict[int, str]:
+        return self._species_column("rank", tax_ids)
+
+    def get_names(self, tax_ids: Iterable) -> dict[int, str]:
+        """
+        Scientific name of each TaxID
+        """
+        return self._species_column("spname", tax_ids)
+
+    def get_parents(self, tax_ids: Iterable) -> dict[int, int]:
+        return self._species_column("parent", tax_ids)
+
+    def get_taxids(self, names: Iterable[str]) -> dict[str, list[int]]:
+        """
+        TaxIDs of each name, matched exactly (ignoring case) against the
+        scientific names first and the synonyms for the rest
+        """
+        originals = {}
+        for name in dict.fromkeys(names):
+            if name:
+                originals.setdefault(name.lower(), []).append(name)
+
+        found = {}
+        for table in ("species", "synonym") if self._has_synonyms else ("species",):
+            pending = [key for key in originals if originals[key][0] not in found]
+            if not pending:
+                break
+            for spname, tax_id in select_in(
+                self._conn,
+                f"SELECT spname, taxid FROM {table} WHERE spname COLLATE NOCASE IN (%s)",
+                pending,
+            ):
+                for name in originals.get(spname.lower(), ()):
+                    found.setdefault(name, []).append(tax_id)
+        return found
@@ -1,7 +1,12 @@
-import pandas as pd
+import asyncio
+import sqlite3
+import threading
+
 import pytest
 
 from assistant import MetagenomicsAssistant
+from knowledge_base import create_knowledge_base
+from report_store import ReportStore
 
 
 class _DummyLLMHandler:
@@ -12,21 +17,15 @@ class _DummyLLMHandler:
 
 
 @pytest.fixture(autouse=True)
-def _stub_csv(monkeypatch):
-    """Stub pandas.read_csv so tests avoid reading real files."""
-
-    def fake_read_csv(path, *_, **__):
-        if "old_reports" in path:
-            return pd.DataFrame({"content": ["style-a", "style-b"]})
-        if "data_for_biojarvis" in path:
-            return pd.DataFrame(
-                {"TaxID": [], "Diseases": [], "Transmissions": [], "Hosts": []}
-            )
-        if "acronyms" in path:
-            return pd.DataFrame({"TaxID": [], "Acronym": []})
-        raise AssertionError(f"Unexpected file read: {path}")
-
-    monkeypatch.setattr("assistant.pd.read_csv", fake_read_csv)
+def _stub_knowledge_base(monkeypatch, tmp_path):
+    """Use a tiny knowledge base so tests avoid reading real files."""
+    kb = create_knowledge_base(
+        str(tmp_path / "kb.sqlite"),
+        reports=[{"content": "style-a"}, {"content": "style-b"}],
+        tables={"data": [], "acronyms": []},
+    )
+    monkeypatch.setattr("assistant.load_knowledge_base", lambda *_, **__: kb)
+    return kb
 
 
 @pytest.fixture(autouse=True)
@@ -34,7 +33,7 @@ def _stub_taxonomy(monkeypatch):
     """Avoid downloading taxonomy data during tests."""
 
     class DummyNCBI:
-        def __init__(self):
+        def __init__(self, dbfile=None):
             pass
 
     monkeypatch.setattr("assistant.NCBITaxa", DummyNCBI)
@@ -43,7 +42,7 @@ def _stub_taxonomy(monkeypatch):
 def test_generate_report_uses_prompt_helpers(monkeypatch):
     dummy_handler = _DummyLLMHandler()
     assistant = MetagenomicsAssistant(llm_handler=dummy_handler)
-    assistant.set_text_to_prompt = lambda: ["style-a", "style-b"]
+    assistant.set_text_to_prompt = lambda *_, **__: ["style-a", "style-b"]
 
     captured = {}
 
@@ -77,10 +76,10 @@ def test_generate_report_uses_prompt_helpers(monkeypatch):
         MetagenomicsAssistant, "get_organism_hosts", lambda self, tax_id: "Humans"
     )
 
-    def fake_rank(self, tax_id, rank):
-        return {"family": "Familiaceae", "genus": "Genus test"}.get(rank)
+    def fake_ranks(self, tax_id, ranks=("family", "genus")):
+        return {"family": "Familiaceae", "genus": "Genus test"}
 
-    monkeypatch.setattr(MetagenomicsAssistant, "get_organism_rank", fake_rank)
+    monkeypatch.setattr(MetagenomicsAssistant, "get_organism_ranks", fake_ranks)
 
     # We also need to spy on the handler's generate_text to verify it received the prompt
     original_generate_text = dummy_handler.generate_text
@@ -131,10 +130,10 @@ def test_set_organism_fields_filters_null_entries(monkeypatch):
         MetagenomicsAssistant, "get_organism_hosts", lambda self, tax_id: "Humans"
     )
 
-    def fake_rank(self, tax_id, rank):
-        return {"family": "Familiaceae", "genus": "Genus test"}.get(rank)
+    def fake_ranks(self, tax_id, ranks=("family", "genus")):
+        return {"family": "Familiaceae", "genus": "Genus test"}
 
-    monkeypatch.setattr(MetagenomicsAssistant, "get_organism_rank", fake_rank)
+    monkeypatch.setattr(MetagenomicsAssistant, "get_organism_ranks", fake_ranks)
 
     result = assistant.set_organism_fields("12345")
 
@@ -146,3 +145,310 @@ def test_set_organism_fields_filters_null_entries(monkeypatch):
         "Family": "Familiaceae",
         "Genus": "Genus test",
     }
+
+
+def test_curated_lookup_resolves_row_once_per_taxid(monkeypatch, tmp_path):
+    assistant = MetagenomicsAssistant(llm_handler=_DummyLLMHandler())
+    assistant.kb = create_knowledge_base(
+        str(tmp_path / "lookup_kb.sqlite"),
+        reports=[],
+        tables={
+            "data": [
+                {
+                    "TaxID": "111",
+                    "Diseases": "Example disease",
+                    "Transmissions": "Respiratory",
+                    "Hosts": None,
+                }
+            ],
+            "acronyms": [],
+        },
+    )
+
+    calls = []
+    original = MetagenomicsAssistant._find_matching_row
+
+    def counting_find(self, tax_id, table):
+        calls.append(tax_id)
+        return original(self, tax_id, table)
+
+    monkeypatch.setattr(MetagenomicsAssistant, "_find_matching_row", counting_find)
+
+    assert assistant.get_organism_disease("111") == "Example disease"
+    assert assistant.get_organism_transmission("111") == "Respiratory"
+    assert assistant.get_organism_hosts(111) is None
+    assert assistant.get_organism_data("111")["Diseases"] == "Example disease"
+    assert calls == ["111"]
+
+
+def test_curated_lookup_caches_misses(monkeypatch):
+    assistant = MetagenomicsAssistant(llm_handler=_DummyLLMHandler())
+
+    calls = []
+
+    def fake_find(self, tax_id, table):
+        calls.append(tax_id)
+        return None
+
+    monkeypatch.setattr(MetagenomicsAssistant, "_find_matching_row", fake_find)
+
+    assert assistant.get_organism_disease("999") is None
+    assert assistant.get_organism_hosts("999") is None
+    assert assistant.get_organism_acronym("999") is None
+    assert calls == ["999", "999"]
+
+
+def test_get_genome_size_uses_cache_before_network(monkeypatch, tmp_path):
+    from genome_cache import GenomeSizeCache
+
+    cache = GenomeSizeCache(str(tmp_path / "sizes.sqlite"))
+    assistant = MetagenomicsAssistant(
+        llm_handler=_DummyLLMHandler(), genome_cache=cache
+    )
+    monkeypatch.setattr(
+        MetagenomicsAssistant, "get_organism_name", lambda self, tax_id: "Organism X"
+    )
+
+    fetches = []
+
+    def fake_fetch(scientific_name):
+        fetches.append(scientific_name)
+        return None
+
+    monkeypatch.setattr(assistant, "fetch_genome_size", fake_fetch)
+
+    assert assistant.get_genome_size("12345") == ""
+    assert assistant.get_genome_size("12345") == ""
+    assert fetches == ["Organism X"]
+
+
+def test_get_genome_size_offline_never_fetches(monkeypatch, tmp_path):
+    from genome_cache import GenomeSizeCache
+
+    cache = GenomeSizeCache(str(tmp_path / "sizes.sqlite"))
+    cache.set("111", "Organism X", 2048)
+    assistant = MetagenomicsAssistant(
+        llm_handler=_DummyLLMHandler(), genome_cache=cache, offline=True
+    )
+    monkeypatch.setattr(
+        MetagenomicsAssistant, "get_organism_name", lambda self, tax_id: "Organism X"
+    )
+
+    def fail_fetch(scientific_name):
+        raise AssertionError("network used in offline mode")
+
+    monkeypatch.setattr(assistant, "fetch_genome_size", fail_fetch)
+
+    assert assistant.get_genome_size("111") == 2048
+    assert assistant.get_genome_size("222") == ""
+
+
+def test_stream_report_yields_handler_chunks():
+    class StreamingHandler(_DummyLLMHandler):
+        def stream_text(self, prompt):
+            yield "Part one, "
+            yield "part two."
+
+    assistant = MetagenomicsAssistant(llm_handler=StreamingHandler())
+    assistant.set_text_to_prompt = lambda *_, **__: ["style-a", "style-b"]
+
+    chunks = list(assistant.stream_report("1", organism_info={"Name": "Organism X"}))
+
+    assert chunks == ["Part one, ", "part two."]
+
+
+def test_stored_report_is_returned_without_calling_the_llm(tmp_path):
+    class FailingHandler:
+        def generate_text(self, prompt):
+            raise AssertionError("the LLM should not be called")
+
+    store = ReportStore(str(tmp_path / "reports.sqlite"))
+    assistant = MetagenomicsAssistant(llm_handler=FailingHandler(), report_store=store)
+    kb_hash = assistant.kb.content_hash
+    store.put(562, "English", "Stored report", {"Name": "E. coli"}, "gemini", kb_hash)
+
+    assert assistant.generate_report("562", "English") == "Stored report"
+    assert list(assistant.stream_report(562, "English")) == ["Stored report"]
+    assert assistant.get_stored_report(562, "Brazilian Portuguese") is None
+
+    # generated with an older knowledge base: stale
+    store.put(562, "English", "Old report", {"Name": "E. coli"}, "gemini", "old")
+    assert assistant.get_stored_report(562, "English") is None
+
+
+def test_generate_reports_shares_lookups_across_languages(monkeypatch, tmp_path):
+    class ConcurrentHandler:
+        # both LLM calls must be in flight at once to get past the barrier
+        barrier = threading.Barrier(2, timeout=5)
+
+        def generate_text(self, prompt):
+            self.barrier.wait()
+            if "in Spanish" in prompt:
+                raise RuntimeError("quota exceeded")
+            return "Generated"
+
+        async def agenerate_text(self, prompt):
+            await asyncio.sleep(0)
+            return "Generated async"
+
+    store = ReportStore(str(tmp_path / "reports.sqlite"))
+    assistant = MetagenomicsAssistant(
+        llm_handler=ConcurrentHandler(), report_store=store
+    )
+    store.put(
+        1,
+        "Brazilian Portuguese",
+        "Stored report",
+        {"Name": "X"},
+        "gemini",
+        assistant.kb.content_hash,
+    )
+    lookups, selections = [], []
+    monkeypatch.setattr(
+        assistant,
+        "set_organism_fields",
+        lambda tax_id, timings=None: lookups.append(tax_id) or {"Name": "X"},
+    )
+    assistant.set_text_to_prompt = lambda info, tax_id=None, language=None: (
+        selections.append(language) or ["style-a"]
+    )
+
+    reports = assistant.generate_reports(
+        1, ["English", "Spanish", "Brazilian Portuguese"]
+    )
+
+    assert reports == {
+        "English": "Generated",
+        "Spanish": "Error: quota exceeded",
+        "Brazilian Portuguese": "Stored report",
+    }
+    # one lookup and one language-neutral exemplar selection
+    assert (lookups, selections) == ([1], [None])
+
+    reports = asyncio.run(assistant.agenerate_reports(1, ["English", "Spanish"]))
+    assert reports == {"English": "Generated async", "Spanish": "Generated async"}
+
+
+def test_organism_names_fall_back_to_the_name_index(monkeypatch, tmp_path, capsys):
+    dbfile = str(tmp_path / "taxa.sqlite")
+    conn = sqlite3.connect(dbfile)
+    conn.executescript("""
+        CREATE TABLE species (taxid INT PRIMARY KEY, parent INT, spname TEXT,
+                              common TEXT, rank TEXT, track TEXT);
+        INSERT INTO species VALUES (562, 1, 'Escherichia coli', '', 'species', '');
+        INSERT INTO species VALUES (1280, 1, 'Staphylococcus aureus', '',
+                                    'species', '');
+        """)
+    conn.commit()
+    conn.close()
+
+    class TranslatingNCBI:
+        def __init__(self, dbfile=None):
+            self.dbfile = dbfile
+
+        def get_name_translator(self, names):
+            return {name: [562] for name in names if name == "Escherichia coli"}
+
+    monkeypatch.setattr("assistant.NCBITaxa", TranslatingNCBI)
+    assistant = MetagenomicsAssistant(
+        llm_handler=_DummyLLMHandler(),
+        taxonomy_db=dbfile,
+        name_index_path=str(tmp_path / "names.sqlite"),
+    )
+
+    assert assistant.get_organism_tax_id("Escherichia coli") == 562
+    assert assistant.get_organism_tax_id("staphylococus aureus") == 1280
+    assert "Using 'Staphylococcus aureus' (TaxID 1280" in capsys.readouterr().out
+    assert assistant.get_organism_tax_id("Nothing like it") == ""
+    assert assistant.resolve_organism_names(
+        ["Escherichia coli", "escherichia coli", "Unknown"]
+    ) == {"Escherichia coli": 562, "escherichia coli": 562}
+
+
+def test_stream_report_yields_error_without_organism_info():
+    assistant = MetagenomicsAssistant(llm_handler=_DummyLLMHandler())
+
+    chunks = list(assistant.stream_report("1", organism_info={"Size": "10"}))
+
+    assert len(chunks) == 1
+    assert chunks[0].startswith("Error:")
+
+
+def test_get_organism_ranks_reads_lineage_once(monkeypatch, tmp_path):
+    dbfile = str(tmp_path / "taxa.sqlite")
+    conn = sqlite3.connect(dbfile)
+    conn.executescript("""
+        CREATE TABLE species (taxid INT PRIMARY KEY, parent INT, spname TEXT,
+                              common TEXT, rank TEXT, track TEXT);
+        CREATE TABLE merged (taxid_old INT, taxid_new INT);
+        INSERT INTO species VALUES (1, 1, 'root', '', 'no rank', '1');
+        INSERT INTO species VALUES (10, 1, 'Familiaceae', '', 'family', '10,1');
+        INSERT INTO species VALUES (100, 10, 'Genus', '', 'genus', '100,10,1');
+        INSERT INTO species VALUES (1000, 100, 'Genus a', '', 'species',
+                                    '1000,100,10,1');
+        """)
+    conn.commit()
+    conn.close()
+
+    assistant = MetagenomicsAssistant(
+        llm_handler=_DummyLLMHandler(), taxonomy_db=dbfile
+    )
+    calls = []
+    get_lineage = assistant.taxonomy.get_lineage
+    monkeypatch.setattr(
+        assistant.taxonomy,
+        "get_lineage",
+        lambda tax_id: calls.append(tax_id) or get_lineage(tax_id),
+    )
+
+    assert assistant.get_organism_ranks(1000) == {
+        "family": "Familiaceae",
+        "genus": "Genus",
+    }
+    assert assistant.get_organism_rank(1000, "genus") == "Genus"
+    assert assistant.get_organism_name("1000") == "Genus a"
+    assert calls == [1000, 1000]
+
+
+def test_set_organism_fields_overlaps_genome_size_and_reports_timings(monkeypatch):
+    import threading
+    import time
+
+    assistant = MetagenomicsAssistant(llm_handler=_DummyLLMHandler())
+    local_started = threading.Event()
+
+    def slow_genome_size(self, tax_id):
+        # only returns once the local lookups have started in parallel
+        assert local_started.wait(timeout=5)
+        time.sleep(0.05)
+        return 2048
+
+    def fake_name(self, tax_id):
+        local_started.set()
+        return "Organism X"
+
+    monkeypatch.setattr(MetagenomicsAssistant, "get_genome_size", slow_genome_size)
+    monkeypatch.setattr(MetagenomicsAssistant, "get_organism_name", fake_name)
+    monkeypatch.setattr(
+        MetagenomicsAssistant,
+        "get_organism_ranks",
+        lambda self, tax_id, ranks=("family", "genus"): {"family": None, "genus": None},
+    )
+    monkeypatch.setattr(
+        MetagenomicsAssistant, "_find_matching_row", lambda self, tax_id, table: None
+    )
+
+    timings = {}
+    result = assistant.set_organism_fields("12345", timings=timings)
+
+    assert result == {"Name": "Organism X", "Size": "2048"}
+    assert set(timings) == {
+        "Name",
+        "Acronym",
+        "Size",
+        "Diseases",
+        "Transmissions",
+        "Hosts",
+        "Family/Genus",
+    }
+    assert timings["Size"] >= 0.05
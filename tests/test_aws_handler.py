@@ -26,6 +26,12 @@ class _DummyClient:
         self.invocation_kwargs = kwargs
         return {"body": _DummyStream(self.response_payload)}
 
+    def invoke_model_with_response_stream(self, **kwargs):
+        self.invocation_kwargs = kwargs
+        return {
+            "body": [{"chunk": {"bytes": event}} for event in self.response_payload]
+        }
+
 
 @pytest.fixture(autouse=True)
 def _aws_env(monkeypatch):
@@ -78,3 +84,90 @@ def test_return_bedrock_response_raises_on_unknown_format(monkeypatch):
 
     with pytest.raises(ValueError):
         handler.return_bedrock_response(b"{}")
+
+
+def test_agenerate_text_returns_model_output(monkeypatch):
+    import asyncio
+
+    response_body = json.dumps(
+        {"output": {"message": {"content": [{"text": "Async summary"}]}}}
+    ).encode("utf-8")
+    dummy_client = _DummyClient(response_body)
+    monkeypatch.setattr("aws_handler.boto3.client", lambda *_, **__: dummy_client)
+    handler = AwsHandler()
+
+    result = asyncio.run(handler.agenerate_text("Example prompt"))
+
+    assert result == "Async summary"
+    payload = json.loads(dummy_client.invocation_kwargs["body"].decode("utf-8"))
+    assert payload["messages"][0]["content"][0]["text"] == "Example prompt"
+
+
+def test_stream_text_yields_content_deltas(monkeypatch):
+    events = [
+        json.dumps({"messageStart": {"role": "assistant"}}).encode("utf-8"),
+        json.dumps({"contentBlockDelta": {"delta": {"text": "Clinical "}}}).encode(
+            "utf-8"
+        ),
+        json.dumps({"contentBlockDelta": {"delta": {"text": "summary"}}}).encode(
+            "utf-8"
+        ),
+        json.dumps({"messageStop": {"stopReason": "end_turn"}}).encode("utf-8"),
+    ]
+    dummy_client = _DummyClient(events)
+    monkeypatch.setattr("aws_handler.boto3.client", lambda *_, **__: dummy_client)
+    handler = AwsHandler()
+
+    chunks = list(handler.stream_text("Example prompt"))
+
+    assert chunks == ["Clinical ", "summary"]
+    assert dummy_client.invocation_kwargs["modelId"] == MODEL_ID_1
+
+
+def _client_error(code, status, headers=None):
+    from botocore.exceptions import ClientError
+
+    return ClientError(
+        {
+            "Error": {"Code": code, "Message": code},
+            "ResponseMetadata": {
+                "HTTPStatusCode": status,
+                "HTTPHeaders": headers or {},
+            },
+        },
+        "InvokeModel",
+    )
+
+
+def test_classify_error_tells_throttles_from_fatal_errors():
+    assert AwsHandler.classify_error(
+        _client_error("ThrottlingException", 429, {"retry-after": "2"})
+    ) == ("throttled", 2.0)
+    assert AwsHandler.classify_error(
+        _client_error("ServiceUnavailableException", 503)
+    ) == ("transient", None)
+    assert AwsHandler.classify_error(_client_error("ValidationException", 400)) == (
+        "fatal",
+        None,
+    )
+
+
+def test_throttled_call_is_retried(monkeypatch):
+    class ThrottledOnceClient(_DummyClient):
+        def invoke_model(self, **kwargs):
+            if self.invocation_kwargs is None:
+                self.invocation_kwargs = kwargs
+                raise _client_error("ThrottlingException", 429, {"retry-after": "2"})
+            return super().invoke_model(**kwargs)
+
+    response_body = json.dumps(
+        {"output": {"message": {"content": [{"text": "After the retry"}]}}}
+    ).encode("utf-8")
+    dummy_client = ThrottledOnceClient(response_body)
+    monkeypatch.setattr("aws_handler.boto3.client", lambda *_, **__: dummy_client)
+    handler = AwsHandler()
+    sleeps = []
+    monkeypatch.setattr(handler.scheduler, "_sleep", sleeps.append)
+
+    assert handler.generate_text("Example prompt") == "After the retry"
+    assert len(sleeps) == 1 and sleeps[0] >= 2.0
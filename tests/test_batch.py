@@ -0,0 +1,201 @@
+import asyncio
+import json
+
+from batch import BatchRow, arun_batch, read_batch_file, run_batch
+
+
+class _FakeAssistant:
+    """Stands in for MetagenomicsAssistant with canned answers."""
+
+    def __init__(self, failing_tax_ids=(), failing_reports=()):
+        self.failing_tax_ids = set(failing_tax_ids)
+        self.failing_reports = set(failing_reports)
+        self.prefetched = []
+        self.bulk_resolved = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def prefetch_genome_sizes(self, tax_ids):
+        self.prefetched.extend(tax_ids)
+
+    def get_stored_report(self, tax_id, language):
+        return None
+
+    def resolve_organism_names(self, organism_names):
+        self.bulk_resolved.append(list(organism_names))
+        known = {"Escherichia coli": 562}
+        return {name: known[name] for name in organism_names if name in known}
+
+    def get_organism_tax_id(self, organism_name):
+        return {"Escherichia coli": 562}.get(organism_name, "")
+
+    def set_organism_fields(self, tax_id, timings=None):
+        if str(tax_id) in self.failing_tax_ids:
+            raise RuntimeError("lookup exploded")
+        if timings is not None:
+            timings["Name"] = 0.01
+        return {"Name": f"Organism {tax_id}"}
+
+    def generate_report(self, tax_id, language="english", organism_info=None):
+        if (str(tax_id), language) in self.failing_reports:
+            return "Error: quota exceeded"
+        return f"Report for {organism_info['Name']} in {language}"
+
+    async def agenerate_report(self, tax_id, language="english", organism_info=None):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return self.generate_report(tax_id, language, organism_info)
+
+    def generate_reports(self, tax_id, languages, organism_info=None):
+        return {
+            language: self.generate_report(tax_id, language, organism_info)
+            for language in languages
+        }
+
+    async def agenerate_reports(self, tax_id, languages, organism_info=None):
+        reports = await asyncio.gather(
+            *(
+                self.agenerate_report(tax_id, language, organism_info)
+                for language in languages
+            )
+        )
+        return dict(zip(languages, reports))
+
+
+def test_read_batch_file_plain_list(tmp_path):
+    batch_file = tmp_path / "batch.txt"
+    batch_file.write_text("# comment\n2697049\n\nEscherichia coli\n")
+
+    rows = read_batch_file(str(batch_file))
+
+    assert rows == [
+        BatchRow(sample_id="2697049", tax_id="2697049"),
+        BatchRow(sample_id="Escherichia coli", organism_name="Escherichia coli"),
+    ]
+
+
+def test_read_batch_file_tsv_with_header(tmp_path):
+    batch_file = tmp_path / "batch.tsv"
+    batch_file.write_text(
+        "sample_id\ttaxid\tname\nS1\t2697049\t\nS2\t\tEscherichia coli\n"
+    )
+
+    rows = read_batch_file(str(batch_file))
+
+    assert rows == [
+        BatchRow(sample_id="S1", tax_id="2697049"),
+        BatchRow(sample_id="S2", organism_name="Escherichia coli"),
+    ]
+
+
+def test_run_batch_isolates_row_errors(tmp_path, capsys):
+    rows = [
+        BatchRow(sample_id="S1", tax_id="1"),
+        BatchRow(sample_id="S2", tax_id="2"),
+        BatchRow(sample_id="S3", organism_name="Escherichia coli"),
+        BatchRow(sample_id="S4", organism_name="Unknown thing"),
+    ]
+    output = tmp_path / "reports"
+
+    assistant = _FakeAssistant(failing_tax_ids={"2"})
+    results = run_batch(
+        assistant,
+        rows,
+        "English",
+        workers=3,
+        output=str(output),
+    )
+
+    by_sample = {result.row.sample_id: result for result in results}
+    assert by_sample["S1"].ok
+    assert by_sample["S3"].tax_id == "562"
+    assert by_sample["S2"].error == "lookup exploded"
+    assert "Could not find TaxID" in by_sample["S4"].error
+
+    saved = json.loads((tmp_path / "reports.json").read_text())
+    assert saved == {
+        "1": "Report for Organism 1 in English",
+        "562": "Report for Organism 562 in English",
+    }
+    output_text = capsys.readouterr().out
+    assert "2 succeeded, 2 failed, 4 total" in output_text
+    assert "Mean lookup time per field: Name 0.01s" in output_text
+    # names are resolved in one bulk call before the genome sizes prefetch
+    assert assistant.bulk_resolved == [["Escherichia coli", "Unknown thing"]]
+    assert assistant.prefetched == ["1", "2", "562"]
+
+
+def test_arun_batch_bounds_concurrency(tmp_path):
+    rows = [BatchRow(sample_id=f"S{i}", tax_id=str(i)) for i in range(1, 9)]
+    assistant = _FakeAssistant(failing_tax_ids={"3"})
+
+    results = asyncio.run(
+        arun_batch(assistant, rows, "English", concurrency=2, output=None)
+    )
+
+    assert len(results) == 8
+    assert [result.row.sample_id for result in results if not result.ok] == ["S3"]
+    assert assistant.max_in_flight == 2
+
+
+def test_arun_batch_streams_jsonl_records(tmp_path):
+    rows = [BatchRow(sample_id=f"S{i}", tax_id=str(i)) for i in range(1, 4)]
+    assistant = _FakeAssistant(failing_tax_ids={"2"})
+
+    asyncio.run(
+        arun_batch(
+            assistant,
+            rows,
+            "English",
+            concurrency=2,
+            output=str(tmp_path / "reports"),
+            file_type="jsonl",
+        )
+    )
+
+    lines = (tmp_path / "reports.jsonl").read_text().splitlines()
+    records = sorted((json.loads(line) for line in lines), key=lambda r: r["tax_id"])
+    assert [record["sample_id"] for record in records] == ["S1", "S3"]
+    assert records[0]["organism_info"] == {"Name": "Organism 1"}
+
+
+def test_run_batch_writes_one_output_per_language(tmp_path):
+    rows = [BatchRow(sample_id="S1", tax_id="1")]
+
+    results = run_batch(
+        _FakeAssistant(),
+        rows,
+        ["English", "Brazilian Portuguese"],
+        output=str(tmp_path / "reports"),
+    )
+
+    assert results[0].reports == {
+        "English": "Report for Organism 1 in English",
+        "Brazilian Portuguese": "Report for Organism 1 in Brazilian Portuguese",
+    }
+    assert json.loads((tmp_path / "reports_PT.json").read_text()) == {
+        "1": "Report for Organism 1 in Brazilian Portuguese"
+    }
+    assert (tmp_path / "reports_EN.json").exists()
+
+
+def test_failed_language_keeps_the_other_reports(tmp_path):
+    rows = [BatchRow(sample_id="S1", tax_id="1")]
+    assistant = _FakeAssistant(failing_reports={("1", "Brazilian Portuguese")})
+
+    results = run_batch(
+        assistant,
+        rows,
+        ["English", "Brazilian Portuguese"],
+        output=str(tmp_path / "reports"),
+    )
+
+    assert not results[0].ok
+    assert results[0].failed_languages == ["Brazilian Portuguese"]
+    assert results[0].error == "Brazilian Portuguese: Error: quota exceeded"
+    assert json.loads((tmp_path / "reports_EN.json").read_text()) == {
+        "1": "Report for Organism 1 in English"
+    }
+    assert not (tmp_path / "reports_PT.json").exists()
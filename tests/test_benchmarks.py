@@ -0,0 +1,31 @@
+import json
+
+from benchmarks.run import compare, main
+
+
+def test_quick_benchmark_run_writes_json(tmp_path):
+    output = tmp_path / "results.json"
+
+    main(
+        [
+            "--quick",
+            "--repeat",
+            "3",
+            "--batch-size",
+            "4",
+            "--llm-latency",
+            "0",
+            "--entrez-latency",
+            "0",
+            "-o",
+            str(output),
+        ]
+    )
+
+    document = json.loads(output.read_text())
+    results = document["results"]
+    assert document["meta"]["settings"]["repeat"] == 3
+    assert set(results) == {"cold_start", "lookups", "enrichment", "batch"}
+    assert "data_with_fallback_merged" in results["lookups"]
+    assert all(run["failed"] == 0 for run in results["batch"].values())
+    assert any("(+0.0%)" in line for line in compare(document, document))
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from cassette import Cassette, CassetteMiss, cassette_session, request_key
+from entrez_client import EntrezClient
+from gemini_handler import GeminiHandler
+from rate_limit import TokenBucket
+
+
+class _Session:
+    """Answers esearch and esummary calls for one organism."""
+
+    def __init__(self):
+        self.calls = []
+
+    def post(self, url, data, timeout):
+        utility = url.rsplit("/", 1)[-1].replace(".fcgi", "")
+        self.calls.append(utility)
+        if utility == "esearch":
+            payload = {"esearchresult": {"idlist": ["7"]}}
+        else:
+            payload = {"result": {"uids": ["7"], "7": {"slen": 29903}}}
+        return SimpleNamespace(
+            status_code=200, raise_for_status=lambda: None, json=lambda: payload
+        )
+
+
+class _OfflineSession:
+    def post(self, url, data, timeout):
+        raise AssertionError("replay must not reach the network")
+
+
+def _client(session, api_key):
+    return EntrezClient(
+        api_key=api_key, session=session, rate_limiter=TokenBucket(rate=1000)
+    )
+
+
+def test_request_key_ignores_credentials_and_whitespace():
+    key = request_key("entrez", {"term": "Virus a", "retmax": 5, "api_key": "one"})
+
+    assert key == request_key("entrez", {"term": " Virus\n a", "retmax": "5"})
+    assert key != request_key("entrez", {"term": "Virus b", "retmax": 5})
+    assert key != request_key("bedrock", {"term": "Virus a", "retmax": 5})
+
+
+def test_entrez_calls_are_recorded_then_replayed_offline(tmp_path):
+    path = str(tmp_path / "cassettes" / "run.jsonl")
+    session = _Session()
+
+    with cassette_session(record=path):
+        assert _client(session, "key").get_genome_size("Virus a") == 29903
+    assert session.calls == ["esearch", "esummary"]
+
+    with open(path, encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f]
+    assert [entry["request"]["utility"] for entry in entries] == session.calls
+    assert all(entry["latency"] >= 0 for entry in entries)
+
+    # replayed without the API key, the network or its rate limit
+    with cassette_session(replay=path) as cassette:
+        client = _client(_OfflineSession(), None)
+        assert client.get_genome_size("Virus a") == 29903
+        with pytest.raises(CassetteMiss):
+            client.esearch("nucleotide", "Virus b")
+    assert cassette.entries
+
+
+def test_replay_can_keep_the_recorded_timing(tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    recording = Cassette(path, mode="record")
+    recording.call("llm", {"prompt": "a"}, lambda: "text")
+    recording.close()
+    with open(path, encoding="utf-8") as f:
+        entry = json.loads(f.read())
+    entry["latency"] = 0.1
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+
+    started = time.perf_counter()
+    assert Cassette(path).call("llm", {"prompt": "a"}, None) == "text"
+    assert time.perf_counter() - started < 0.1
+
+    started = time.perf_counter()
+    replay = Cassette(path, timing="recorded")
+    assert replay.call("llm", {"prompt": "a"}, None) == "text"
+    assert time.perf_counter() - started >= 0.1
+
+
+def test_streams_and_async_calls_are_recorded(tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    recording = Cassette(path, mode="record")
+
+    async def answer():
+        return "async text"
+
+    assert list(recording.stream("llm_stream", {"p": 1}, lambda: iter("ab"))) == [
+        "a",
+        "b",
+    ]
+    assert asyncio.run(recording.acall("llm", {"p": 2}, answer)) == "async text"
+    recording.close()
+
+    replay = Cassette(path, timing="recorded")
+    assert list(replay.stream("llm_stream", {"p": 1}, None)) == ["a", "b"]
+    assert asyncio.run(replay.acall("llm", {"p": 2}, None)) == "async text"
+
+
+def test_gemini_replay_needs_no_api_key(tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    usage = SimpleNamespace(prompt_token_count=12, candidates_token_count=30)
+    response = SimpleNamespace(text="Report", usage_metadata=usage)
+    recording = Cassette(path, mode="record")
+    recording.call(
+        "gemini",
+        GeminiHandler.cassette_request("prompt"),
+        lambda: response,
+        encode=GeminiHandler.encode_response,
+    )
+    recording.close()
+
+    handler = GeminiHandler()
+    handler.api_key = None
+    with cassette_session(replay=path):
+        assert handler.generate_text("prompt") == "Report"
+    with pytest.raises(ValueError):
+        handler.generate_text("prompt")
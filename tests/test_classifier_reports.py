@@ -0,0 +1,137 @@
+import gzip
+
+import pytest
+
+from batch import BatchResult, BatchRow
+from classifier_reports import (
+    Hit,
+    detect_format,
+    ingest_reports,
+    read_classifier_report,
+    write_sample_map,
+)
+
+KRAKEN_REPORT = """\
+  5.00\t50\t50\tU\t0\tunclassified
+ 95.00\t950\t0\tR\t1\troot
+ 60.00\t600\t10\tG\t561\t      Escherichia
+ 59.00\t590\t400\tS\t562\t        Escherichia coli
+ 19.00\t190\t190\tS1\t83333\t          Escherichia coli K-12
+  0.50\t5\t5\tS\t208962\t        Escherichia albertii
+ 35.00\t350\t350\tS\t28901\t      Salmonella enterica
+"""
+
+BRACKEN_TABLE = """\
+name\ttaxonomy_id\ttaxonomy_lvl\tkraken_assigned_reads\tadded_reads\tnew_est_reads\tfraction_total_reads
+Escherichia coli\t562\tS\t400\t200\t600\t0.60000
+Salmonella enterica\t28901\tS\t350\t50\t400\t0.40000
+"""
+
+CENTRIFUGE_TABLE = """\
+name\ttaxID\ttaxRank\tgenomeSize\tnumReads\tnumUniqueReads\tabundance
+Escherichia coli\t562\tspecies\t5000000\t300\t250\t0.3
+Escherichia coli K-12\t83333\tleaf\t4600000\t200\t150\t0.2
+Escherichia\t561\tgenus\t0\t40\t0\t0.0
+Salmonella enterica\t28901\tspecies\t4800000\t5\t5\t0.01
+"""
+
+
+class _FakeTaxonomy:
+    lineages = {83333: [1, 561, 562, 83333], 561: [1, 561]}
+    ranks = {1: "no rank", 561: "genus", 562: "species", 83333: "strain"}
+
+    def get_lineages(self, tax_ids):
+        return {tax_id: self.lineages[tax_id] for tax_id in tax_ids}
+
+    def get_ranks(self, tax_ids):
+        return {tax_id: self.ranks[tax_id] for tax_id in tax_ids}
+
+    def get_names(self, tax_ids):
+        return {562: "Escherichia coli"}
+
+
+def _write(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_detect_format(tmp_path):
+    assert detect_format(_write(tmp_path / "a.kreport", KRAKEN_REPORT)) == "kraken"
+    assert detect_format(_write(tmp_path / "b.tsv", BRACKEN_TABLE)) == "bracken"
+    assert detect_format(_write(tmp_path / "c.tsv", CENTRIFUGE_TABLE)) == "centrifuge"
+    with pytest.raises(ValueError):
+        detect_format(_write(tmp_path / "d.txt", "562\n"))
+
+
+def test_kraken_report_uses_clade_reads_at_the_rank(tmp_path):
+    path = _write(tmp_path / "s1.kreport", KRAKEN_REPORT)
+
+    hits = list(read_classifier_report(path, min_reads=10))
+
+    assert hits == [
+        Hit(562, "Escherichia coli", 590, 59.0),
+        Hit(28901, "Salmonella enterica", 350, 35.0),
+    ]
+    assert [hit.tax_id for hit in read_classifier_report(path, rank="genus")] == [561]
+    assert [hit.tax_id for hit in read_classifier_report(path, min_abundance=40)] == [
+        562
+    ]
+
+
+def test_gzipped_bracken_table(tmp_path):
+    path = tmp_path / "s2.bracken.gz"
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write(BRACKEN_TABLE)
+
+    hits = list(read_classifier_report(str(path)))
+
+    assert hits[0] == Hit(562, "Escherichia coli", 600, 60.0)
+    assert len(hits) == 2
+
+
+def test_centrifuge_strains_are_rolled_up(tmp_path):
+    path = _write(tmp_path / "s3.report", CENTRIFUGE_TABLE)
+
+    hits = list(read_classifier_report(path, min_reads=10, taxonomy=_FakeTaxonomy()))
+
+    # the strain joins its species; the genus-level reads have no species
+    assert hits == [Hit(562, "Escherichia coli", 500, 50.0)]
+
+    # without the taxonomy the strain is skipped
+    assert list(read_classifier_report(path, min_reads=10)) == [
+        Hit(562, "Escherichia coli", 300, 30.0)
+    ]
+
+
+def test_ingestion_deduplicates_organisms_across_samples(tmp_path):
+    paths = [
+        _write(tmp_path / "s1.kreport", KRAKEN_REPORT),
+        _write(tmp_path / "s2.bracken", BRACKEN_TABLE),
+    ]
+
+    ingestion = ingest_reports(paths, min_reads=10)
+
+    assert list(ingestion.samples) == ["s1", "s2"]
+    assert ingestion.total_hits == 4
+    assert ingestion.tax_ids == [562, 28901]
+    assert ingestion.batch_rows() == [
+        BatchRow(sample_id="562", tax_id="562", organism_name="Escherichia coli"),
+        BatchRow(
+            sample_id="28901", tax_id="28901", organism_name="Salmonella enterica"
+        ),
+    ]
+
+    results = [
+        BatchResult(row=BatchRow("562"), tax_id="562", reports={"English": "Report"}),
+        BatchResult(row=BatchRow("28901"), tax_id="28901", error="Error: timeout"),
+    ]
+    map_path = tmp_path / "out" / "run_samples.tsv"
+    write_sample_map(str(map_path), ingestion, results)
+
+    lines = map_path.read_text(encoding="utf-8").splitlines()
+    assert lines[0] == "sample_id\ttax_id\tname\treads\tabundance\treport"
+    assert lines[1] == "s1\t562\tEscherichia coli\t590\t59.0000\tok"
+    assert lines[-1] == "s2\t28901\tSalmonella enterica\t400\t40.0000\tError: timeout"
+
+    with pytest.raises(ValueError):
+        ingest_reports([paths[0], str(tmp_path / "s1.bracken")])
@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from entrez_client import ESUMMARY_DIRECT_LIMIT, EntrezClient, retry_after_seconds
+from rate_limit import TokenBucket
+
+
+class _FakeResponse:
+    def __init__(self, payload, status_code=200, headers=None):
+        self._payload = payload
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def json(self):
+        return self._payload
+
+
+class _FakeSession:
+    """Answers E-utilities calls from canned search results and lengths."""
+
+    def __init__(self, searches, lengths, throttle_first=False):
+        self.searches = searches
+        self.lengths = lengths
+        self.throttle_first = throttle_first
+        self.calls = []
+
+    def post(self, url, data, timeout):
+        utility = url.rsplit("/", 1)[-1].replace(".fcgi", "")
+        self.calls.append((utility, data))
+        if self.throttle_first:
+            self.throttle_first = False
+            return _FakeResponse({}, status_code=429, headers={"Retry-After": "0"})
+        if utility == "esearch":
+            name = data["term"].split(" [Organism]")[0]
+            return _FakeResponse({"esearchresult": {"idlist": self.searches[name]}})
+        if utility == "epost":
+            self.posted = data["id"].split(",")
+            return _FakeResponse({"webenv": "ENV", "querykey": "1"})
+        if utility == "esummary":
+            if "id" in data:
+                ids = data["id"].split(",")
+            else:
+                start = data["retstart"]
+                ids = self.posted[start : start + data["retmax"]]
+            result = {"uids": ids}
+            result.update({uid: {"slen": self.lengths.get(uid, 0)} for uid in ids})
+            return _FakeResponse({"result": result})
+        raise AssertionError(f"Unexpected utility {utility}")
+
+
+def _client(session):
+    return EntrezClient(
+        api_key="key", session=session, rate_limiter=TokenBucket(rate=1000)
+    )
+
+
+def test_get_genome_sizes_summarizes_all_organisms_together():
+    session = _FakeSession(
+        searches={"Virus a": ["1", "2"], "Virus b": ["3"], "Virus c": []},
+        lengths={"2": 29903, "3": 7500},
+    )
+
+    sizes = _client(session).get_genome_sizes(
+        {"10": "Virus a", "20": "Virus b", "30": "Virus c"}
+    )
+
+    assert sizes == {"10": 29903, "20": 7500, "30": None}
+    utilities = [utility for utility, _ in session.calls]
+    assert utilities == ["esearch", "esearch", "esearch", "esummary"]
+    assert all(data["api_key"] == "key" for _, data in session.calls)
+
+
+def test_esummary_uses_history_server_for_large_lists():
+    ids = [str(uid) for uid in range(ESUMMARY_DIRECT_LIMIT + 1)]
+    session = _FakeSession(searches={}, lengths={"0": 10})
+
+    summaries = _client(session).esummary("nucleotide", ids)
+
+    assert len(summaries) == len(ids)
+    assert [utility for utility, _ in session.calls] == ["epost", "esummary"]
+
+
+def test_request_retries_when_throttled():
+    session = _FakeSession(
+        searches={"Virus a": ["1"]}, lengths={"1": 100}, throttle_first=True
+    )
+
+    assert _client(session).get_genome_size("Virus a") == 100
+
+
+def test_retry_after_accepts_seconds_and_http_dates():
+    soon = datetime.now(timezone.utc) + timedelta(seconds=30)
+
+    assert retry_after_seconds("2", 1) == 2.0
+    assert 25 < retry_after_seconds(format_datetime(soon, usegmt=True), 1) <= 30
+    assert retry_after_seconds("Wed, 21 Oct 2015 07:28:00 GMT", 1) == 0.0
+    assert retry_after_seconds("soon", 1) == 1
+    assert retry_after_seconds(None, 3) == 3
+
+
+def test_get_genome_size_raises_when_search_fails():
+    session = _FakeSession(searches={}, lengths={})
+
+    with pytest.raises(RuntimeError):
+        _client(session).get_genome_size("Unknown")
@@ -0,0 +1,97 @@
+from exemplar_index import ExemplarIndex, estimate_tokens, truncate_to_tokens
+
+REPORTS = [
+    {
+        "content": "Dengue virus is an arbovirus transmitted by Aedes mosquitoes.",
+        "language": "EN",
+        "tax_id": "12637",
+        "scientific_name": "Dengue virus",
+        "family": "Flaviviridae",
+        "genus": "Orthoflavivirus",
+    },
+    {
+        "content": "O virus Zika e transmitido por mosquitos Aedes.",
+        "language": "PT_BR",
+        "tax_id": "64320",
+        "scientific_name": "Zika virus",
+        "family": "Flaviviridae",
+        "genus": "Orthoflavivirus",
+    },
+    {
+        "content": "Hepacivirus hominis causes chronic hepatitis. " * 3,
+        "language": "EN",
+        "tax_id": "11103",
+        "scientific_name": "Hepacivirus hominis",
+        "family": "Flaviviridae",
+        "genus": "Hepacivirus",
+    },
+    {
+        "content": "Escherichia coli is a Gram-negative bacterium of the gut.",
+        "language": "EN",
+        "tax_id": "562",
+        "scientific_name": "Escherichia coli",
+        "family": "Enterobacteriaceae",
+        "genus": "Escherichia",
+    },
+]
+
+
+def test_select_prefers_same_genus_and_family():
+    index = ExemplarIndex(REPORTS)
+    info = {
+        "Name": "Yellow fever virus",
+        "Family": "Flaviviridae",
+        "Genus": "Orthoflavivirus",
+    }
+
+    chosen = index.select(info, tax_id="11089", language="English", budget_tokens=1000)
+
+    assert chosen == [REPORTS[0]["content"], REPORTS[1]["content"]]
+
+
+def test_select_prefers_the_organism_itself_and_text_similarity():
+    index = ExemplarIndex(REPORTS)
+
+    assert index.select({"Name": "Escherichia coli"}, tax_id=562, max_exemplars=1) == [
+        REPORTS[3]["content"]
+    ]
+    assert index.select({"Diseases": "chronic hepatitis"}, max_exemplars=1) == [
+        REPORTS[2]["content"]
+    ]
+
+
+def test_select_respects_token_budget():
+    index = ExemplarIndex(REPORTS)
+    info = {"Name": "Hepacivirus hominis", "Genus": "Hepacivirus"}
+
+    budget = estimate_tokens(REPORTS[0]["content"]) + 2
+    chosen = index.select(info, budget_tokens=budget)
+
+    assert sum(estimate_tokens(text) for text in chosen) <= budget
+    # The best match is too long alone, so the next best ones are used
+    assert REPORTS[2]["content"] not in chosen
+    assert chosen
+
+
+def test_select_truncates_when_nothing_fits():
+    index = ExemplarIndex(REPORTS[2:3])
+
+    chosen = index.select({}, budget_tokens=15)
+
+    assert chosen == ["Hepacivirus hominis causes chronic hepatitis."]
+
+
+def test_select_is_deterministic_for_a_seed():
+    index = ExemplarIndex(REPORTS)
+
+    first = [index.select({}, max_exemplars=2, seed=7) for _ in range(3)]
+
+    assert first[0] == first[1] == first[2]
+    assert len(first[0]) == 2
+
+
+def test_truncate_to_tokens_keeps_whole_sentences():
+    text = "First sentence here. Second sentence is longer than the first."
+
+    assert truncate_to_tokens(text, 100) == text
+    assert truncate_to_tokens(text, 6) == "First sentence here."
@@ -0,0 +1,144 @@
+import asyncio
+import threading
+
+import pytest
+
+from failover import HedgedHandler, LatencyWindow
+from tracing import Tracer, set_tracer
+
+
+class _Handler:
+    def __init__(self, text, error=None, release=None):
+        self.text = text
+        self.error = error
+        self.release = release
+        self.prompts = []
+        self.cancelled = False
+
+    def generate_text(self, prompt):
+        self.prompts.append(prompt)
+        if self.release is not None:
+            self.release.wait(5)
+        if self.error:
+            raise self.error
+        return self.text
+
+    async def agenerate_text(self, prompt):
+        self.prompts.append(prompt)
+        if self.release is not None:
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                self.cancelled = True
+                raise
+        if self.error:
+            raise self.error
+        return self.text
+
+    def stream_text(self, prompt):
+        self.prompts.append(prompt)
+        if self.error:
+            raise self.error
+        yield from self.text.split()
+
+
+@pytest.fixture
+def tracer():
+    tracer = Tracer()
+    set_tracer(tracer)
+    yield tracer
+    set_tracer(None)
+
+
+def _hedged(primary, secondary, warm=True):
+    handler = HedgedHandler(primary, secondary, "aws", "gemini", min_samples=3)
+    if warm:
+        for seconds in (0.01, 0.01, 0.02):
+            handler.latencies["aws"].add(seconds)
+    return handler
+
+
+def test_latency_window_percentiles():
+    window = LatencyWindow(size=4)
+    assert window.percentile(95) is None
+
+    for seconds in (5.0, 1.0, 2.0, 3.0, 4.0):
+        window.add(seconds)
+
+    # the oldest latency left the window
+    assert len(window) == 4
+    assert window.percentile(50) == 2.0
+    assert window.percentile(95) == 4.0
+
+
+def test_failed_primary_fails_over(tracer):
+    primary = _Handler("", error=RuntimeError("throttled"))
+    secondary = _Handler("Gemini report")
+
+    assert _hedged(primary, secondary).generate_text("prompt") == "Gemini report"
+    assert tracer.counters["hedge.failover"] == 1
+    assert "hedge.sent" not in tracer.counters
+
+
+def test_slow_primary_is_hedged(tracer):
+    release = threading.Event()
+    primary = _Handler("Bedrock report", release=release)
+    secondary = _Handler("Gemini report")
+    handler = _hedged(primary, secondary)
+
+    try:
+        assert handler.generate_text("prompt") == "Gemini report"
+    finally:
+        release.set()
+    assert tracer.counters["hedge.sent"] == 1
+    assert tracer.counters["hedge.won.gemini"] == 1
+    assert handler.percentiles()["gemini"][50] is not None
+
+
+def test_no_hedging_before_latencies_are_known():
+    release = threading.Event()
+    release.set()
+    primary = _Handler("Bedrock report", release=release)
+    secondary = _Handler("Gemini report")
+    handler = _hedged(primary, secondary, warm=False)
+
+    assert handler.hedge_delay() is None
+    assert handler.generate_text("prompt") == "Bedrock report"
+    assert secondary.prompts == []
+    assert len(handler.latencies["aws"]) == 1
+
+
+def test_both_providers_failing_raises():
+    handler = _hedged(
+        _Handler("", error=RuntimeError("down")),
+        _Handler("", error=ValueError("bad key")),
+    )
+
+    with pytest.raises(ValueError):
+        handler.generate_text("prompt")
+
+
+def test_async_hedge_cancels_the_slow_call(tracer):
+    primary = _Handler("Bedrock report", release=True)
+    secondary = _Handler("Gemini report")
+    handler = _hedged(primary, secondary)
+
+    async def run():
+        text = await handler.agenerate_text("prompt")
+        await asyncio.sleep(0)
+        return text
+
+    assert asyncio.run(run()) == "Gemini report"
+    assert primary.cancelled
+    assert tracer.counters["hedge.won.gemini"] == 1
+    # the cancelled call still counts, as a lower bound of its latency
+    assert len(handler.latencies["aws"]) == 4
+    assert handler.latencies["aws"].percentile(100) >= 0.02
+
+
+def test_stream_fails_over_before_the_first_chunk():
+    handler = _hedged(
+        _Handler("", error=RuntimeError("down")), _Handler("Gemini report")
+    )
+
+    assert list(handler.stream_text("prompt")) == ["Gemini", "report"]
@@ -39,7 +39,7 @@ def test_generate_text_calls_model(gemini_handler, mock_genai_client):
     mock_client_instance = mock_genai_client.return_value
     mock_response = MagicMock()
     mock_response.text = "Generated text content"
-    
+
     mock_client_instance.models.generate_content.return_value = mock_response
 
     # Execute
@@ -50,3 +50,68 @@ def test_generate_text_calls_model(gemini_handler, mock_genai_client):
     mock_client_instance.models.generate_content.assert_called_with(
         model=MODEL_ID_GEMINI, contents="Test prompt"
     )
+
+
+def test_agenerate_text_uses_async_client(gemini_handler, mock_genai_client):
+    """Test that agenerate_text awaits client.aio.models.generate_content."""
+    import asyncio
+    from unittest.mock import AsyncMock
+
+    mock_client_instance = mock_genai_client.return_value
+    mock_response = MagicMock()
+    mock_response.text = "Async generated text"
+    mock_client_instance.aio.models.generate_content = AsyncMock(
+        return_value=mock_response
+    )
+
+    result = asyncio.run(gemini_handler.agenerate_text("Test prompt"))
+
+    assert result == "Async generated text"
+    mock_client_instance.aio.models.generate_content.assert_awaited_with(
+        model=MODEL_ID_GEMINI, contents="Test prompt"
+    )
+
+
+def test_stream_text_yields_chunks(gemini_handler, mock_genai_client):
+    """Test that stream_text yields the text of each streamed chunk."""
+    mock_client_instance = mock_genai_client.return_value
+    chunks = [
+        MagicMock(text="Generated "),
+        MagicMock(text=None),
+        MagicMock(text="text"),
+    ]
+    mock_client_instance.models.generate_content_stream.return_value = iter(chunks)
+
+    result = list(gemini_handler.stream_text("Test prompt"))
+
+    assert result == ["Generated ", "text"]
+    mock_client_instance.models.generate_content_stream.assert_called_with(
+        model=MODEL_ID_GEMINI, contents="Test prompt"
+    )
+
+
+def test_classify_error_reads_the_retry_delay():
+    """Test that a 429 is a throttle retried after the API's retryDelay."""
+    from google.genai import errors
+
+    throttled = errors.ClientError(
+        429,
+        {
+            "error": {
+                "code": 429,
+                "status": "RESOURCE_EXHAUSTED",
+                "details": [
+                    {
+                        "@type": "type.googleapis.com/google.rpc.RetryInfo",
+                        "retryDelay": "12s",
+                    }
+                ],
+            }
+        },
+    )
+    unavailable = errors.ServerError(503, {"error": {"code": 503}})
+    invalid = errors.ClientError(400, {"error": {"code": 400}})
+
+    assert GeminiHandler.classify_error(throttled) == ("throttled", 12.0)
+    assert GeminiHandler.classify_error(unavailable) == ("transient", None)
+    assert GeminiHandler.classify_error(invalid) == ("fatal", None)
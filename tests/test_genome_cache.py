@@ -0,0 +1,28 @@
+import time
+
+from genome_cache import GenomeSizeCache
+
+
+def test_cache_round_trip_and_negative_entries(tmp_path):
+    cache = GenomeSizeCache(str(tmp_path / "sizes.sqlite"))
+
+    assert cache.get(2697049, "SARS-CoV-2") is None
+
+    cache.set(2697049, "SARS-CoV-2", 29903)
+    cache.set("12345", "Organism X", None)
+
+    assert cache.get("2697049", "SARS-CoV-2").size == 29903
+    assert cache.get(12345, "Organism X").size is None
+    # the scientific name is part of the key
+    assert cache.get(2697049, "Renamed virus") is None
+
+
+def test_expired_entries_are_only_served_when_stale_allowed(tmp_path, monkeypatch):
+    cache = GenomeSizeCache(str(tmp_path / "sizes.sqlite"), ttl_days=1)
+    cache.set(1, "Organism", 1000)
+
+    later = time.time() + 2 * 86400
+    monkeypatch.setattr("genome_cache.time.time", lambda: later)
+
+    assert cache.get(1, "Organism") is None
+    assert cache.get(1, "Organism", allow_stale=True).size == 1000
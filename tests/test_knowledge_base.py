@@ -0,0 +1,98 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from knowledge_base import (
+    build_knowledge_base,
+    create_knowledge_base,
+    load_knowledge_base,
+)
+
+
+def _write_sources(directory):
+    reports = directory / "old_reports.pkl"
+    pd.DataFrame(
+        {
+            "content": ["Report one", "Report two", "Report three"],
+            "language": ["pt", "pt", "en"],
+            "ncbi_tax_id": [1, 2, 3],
+            "scientific_name": ["Virus a", "Virus b", "Virus c"],
+            "family": ["Fam", None, "Fam"],
+            "genus": ["Gen", "Gen", None],
+        }
+    ).to_pickle(reports)
+    data = directory / "data.csv"
+    data.write_text(
+        "ID,TaxID,Hosts,Transmissions,Diseases\n"
+        "1,111,Humans,,Flu\n"
+        "2,222,Bats,Bite,Rabies\n"
+    )
+    acronyms = directory / "acronyms.csv"
+    acronyms.write_text("TaxID,Name,Acronym\n111,Virus a,VA\n111,Virus a,VA2\n")
+    return {"reports": str(reports), "data": str(data), "acronyms": str(acronyms)}
+
+
+def test_build_compiles_sources_into_indexed_lookups(tmp_path):
+    sources = _write_sources(tmp_path)
+
+    kb = build_knowledge_base(str(tmp_path / "kb.sqlite"), sources)
+
+    assert kb.get_row("data", 111) == {
+        "ID": "1",
+        "TaxID": "111",
+        "Hosts": "Humans",
+        "Transmissions": None,
+        "Diseases": "Flu",
+    }
+    # duplicated TaxIDs resolve to the first row of the file
+    assert kb.get_row("acronyms", "111")["Acronym"] == "VA"
+    assert kb.get_row("data", 999) is None
+    assert kb.annotated_tax_ids("data") == ["111", "222"]
+    assert kb.curated_names() == [("111", "Virus a"), ("111", "Virus a")]
+    assert [report["family"] for report in kb.reports()] == ["Fam", None, "Fam"]
+
+
+def test_content_hash_tracks_content_only(tmp_path):
+    first = create_knowledge_base(
+        str(tmp_path / "a.sqlite"), [{"content": "x"}], {"data": []}
+    )
+    same = create_knowledge_base(
+        str(tmp_path / "b.sqlite"), [{"content": "x"}], {"data": []}
+    )
+    other = create_knowledge_base(
+        str(tmp_path / "c.sqlite"), [{"content": "y"}], {"data": []}
+    )
+
+    assert first.content_hash == same.content_hash
+    assert first.content_hash != other.content_hash
+
+
+def test_load_rebuilds_when_a_source_changes(tmp_path):
+    sources = _write_sources(tmp_path)
+    path = str(tmp_path / "kb.sqlite")
+    first = load_knowledge_base(path, sources)
+
+    assert load_knowledge_base(path, sources).content_hash == first.content_hash
+
+    with open(sources["data"], "a") as f:
+        f.write("3,333,Pigs,Fecal-oral,Diarrhea\n")
+    os.utime(sources["data"], ns=(0, 0))
+
+    rebuilt = load_knowledge_base(path, sources)
+    assert rebuilt.content_hash != first.content_hash
+    assert rebuilt.get_row("data", 333)["Diseases"] == "Diarrhea"
+
+
+def test_concurrent_builds_do_not_clash(tmp_path):
+    path = str(tmp_path / "kb.sqlite")
+    reports = [{"content": f"Report {n}"} for n in range(200)]
+
+    def build(_):
+        return create_knowledge_base(path, reports, {"data": []}).content_hash
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        hashes = set(pool.map(build, range(8)))
+
+    assert len(hashes) == 1
+    assert os.listdir(tmp_path) == ["kb.sqlite"]
@@ -0,0 +1,109 @@
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from name_index import (
+    NameIndex,
+    build_name_index,
+    load_or_build_name_index,
+    normalize_name,
+)
+
+
+def _make_taxonomy_db(path):
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE species (taxid INT PRIMARY KEY, parent INT, spname TEXT,
+                              common TEXT, rank TEXT, track TEXT);
+        CREATE TABLE synonym (taxid INT, spname TEXT);
+        INSERT INTO species VALUES (1, 1, 'root', '', 'no rank', '1');
+        INSERT INTO species VALUES (561, 1, 'Escherichia', '', 'genus', '561,1');
+        INSERT INTO species VALUES (562, 561, 'Escherichia coli', '', 'species',
+                                    '562,561,1');
+        INSERT INTO species VALUES (564, 561, 'Escherichia fergusonii', '',
+                                    'species', '564,561,1');
+        INSERT INTO species VALUES (1280, 1, 'Staphylococcus aureus', '',
+                                    'species', '1280,1');
+        INSERT INTO species VALUES (2697049, 1,
+            'Severe acute respiratory syndrome coronavirus 2', '', 'no rank',
+            '2697049,1');
+        INSERT INTO synonym VALUES (2697049, 'SARS-CoV-2');
+        INSERT INTO synonym VALUES (562, 'Bacterium coli');
+        """)
+    conn.commit()
+    conn.close()
+
+
+def test_normalize_name_ignores_case_accents_and_punctuation():
+    assert normalize_name("  Escherichia  coli. ") == "escherichia coli"
+    assert normalize_name("SARS-CoV-2") == "sars cov 2"
+    assert normalize_name("Vírus da Dengue") == "virus da dengue"
+
+
+def test_exact_prefix_and_fuzzy_matches(tmp_path):
+    dbfile = str(tmp_path / "taxa.sqlite")
+    _make_taxonomy_db(dbfile)
+    index = build_name_index(
+        str(tmp_path / "names.sqlite"), dbfile, [("2697049", "SARS coronavirus 2")]
+    )
+
+    assert index.resolve("escherichia COLI").tax_id == "562"
+    assert index.resolve("sars-cov-2") == (
+        index.resolve("SARS-CoV-2")._replace(name="SARS-CoV-2")
+    )
+    assert index.resolve("SARS coronavirus 2").name == "SARS coronavirus 2"
+
+    prefix = index.search("Escherichia ferg", limit=1)[0]
+    assert (prefix.tax_id, prefix.match) == ("564", "prefix")
+
+    fuzzy = index.resolve("Staphylococus aureus")
+    assert (fuzzy.tax_id, fuzzy.match) == ("1280", "fuzzy")
+    assert 0.6 < fuzzy.score < 1
+    assert index.resolve("Completely unrelated") is None
+
+
+def test_resolve_many_deduplicates_and_falls_back_to_fuzzy(tmp_path):
+    dbfile = str(tmp_path / "taxa.sqlite")
+    _make_taxonomy_db(dbfile)
+    index = build_name_index(str(tmp_path / "names.sqlite"), dbfile, [])
+
+    resolved = index.resolve_many(
+        ["Escherichia coli", "Bacterium coli", "Eschericia coli", "Escherichia coli"]
+    )
+
+    assert {name: match.tax_id for name, match in resolved.items()} == {
+        "Escherichia coli": "562",
+        "Bacterium coli": "562",
+        "Eschericia coli": "562",
+    }
+    assert resolved["Eschericia coli"].match == "fuzzy"
+
+
+def test_load_or_build_reuses_index_until_curated_names_change(tmp_path):
+    dbfile = str(tmp_path / "taxa.sqlite")
+    path = str(tmp_path / "names.sqlite")
+    _make_taxonomy_db(dbfile)
+
+    first = load_or_build_name_index(path, dbfile, [("562", "E. coli")])
+    loaded = load_or_build_name_index(path, dbfile, [("562", "E. coli")])
+    rebuilt = load_or_build_name_index(path, dbfile, [("1280", "S. aureus")])
+
+    assert loaded.signature == first.signature
+    assert rebuilt.signature != first.signature
+    assert NameIndex(path).resolve("S. aureus").tax_id == "1280"
+    assert NameIndex(path).resolve("E. coli") is None
+
+
+def test_concurrent_builds_do_not_clash(tmp_path):
+    dbfile = str(tmp_path / "taxa.sqlite")
+    path = str(tmp_path / "index" / "names.sqlite")
+    _make_taxonomy_db(dbfile)
+
+    def build(_):
+        return build_name_index(path, dbfile, [("562", "E. coli")])
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(build, range(8)))
+
+    assert NameIndex(path).resolve("E. coli").tax_id == "562"
+    assert os.listdir(tmp_path / "index") == ["names.sqlite"]
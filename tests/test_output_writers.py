@@ -0,0 +1,134 @@
+import csv
+import json
+
+import pytest
+
+from output_writers import (
+    AtomicJsonWriter,
+    JsonlWriter,
+    ReportWriter,
+    compact_jsonl,
+    missing_dependency,
+    open_writer,
+    read_jsonl_reports,
+)
+
+INFO = {"Name": "Escherichia coli", "Size": "4641652", "Family": "Enterobacteriaceae"}
+
+
+def test_jsonl_writer_appends_records(tmp_path):
+    path = tmp_path / "reports.jsonl"
+
+    with JsonlWriter(str(path), fsync_every=2) as writer:
+        writer.write(562, "Report A", organism_info=INFO, sample_id="S1")
+        writer.write("1280", "Report B")
+    with JsonlWriter(str(path)) as writer:
+        writer.write("562", "Report A v2")
+
+    records = read_jsonl_reports(str(path))
+    assert [record["tax_id"] for record in records] == ["562", "1280", "562"]
+    assert records[0]["organism_info"] == INFO
+    assert records[0]["sample_id"] == "S1"
+
+
+def test_truncated_jsonl_line_is_skipped_and_compaction_keeps_layout(tmp_path):
+    jsonl_path = tmp_path / "reports.jsonl"
+    json_path = tmp_path / "reports.json"
+    json_path.write_text(json.dumps({"999": "Older report"}))
+    with JsonlWriter(str(jsonl_path)) as writer:
+        writer.write(562, "Report A")
+        writer.write(1280, "Report B")
+        writer.write(562, "Report A v2")
+    with open(jsonl_path, "a", encoding="utf-8") as f:
+        f.write('{"tax_id": "7", "rep')
+
+    total = compact_jsonl(str(jsonl_path), str(json_path))
+
+    assert total == 3
+    assert json.loads(json_path.read_text()) == {
+        "999": "Older report",
+        "562": "Report A v2",
+        "1280": "Report B",
+    }
+
+
+def test_atomic_json_writer_keeps_the_taxid_layout(tmp_path):
+    (tmp_path / "reports.json").write_text(json.dumps({"1280": "Report B"}))
+
+    with open_writer(str(tmp_path / "reports"), "json") as writer:
+        assert isinstance(writer, AtomicJsonWriter)
+        writer.write(562, "Relatório A")
+
+    assert (tmp_path / "reports.json").read_text(encoding="utf-8") == (
+        '{\n    "1280": "Report B",\n    "562": "Relatório A"\n}'
+    )
+    assert not (tmp_path / "reports.json.tmp").exists()
+
+
+def test_atomic_json_writer_rewrites_in_batches(tmp_path):
+    path = tmp_path / "reports.json"
+    writer = AtomicJsonWriter(str(path), flush_every=2)
+
+    writer.write(1, "one")
+    assert not path.exists()
+    writer.write(2, "two")
+    assert json.loads(path.read_text()) == {"1": "one", "2": "two"}
+    writer.write(3, "three")
+    writer.close()
+
+    assert json.loads(path.read_text()) == {"1": "one", "2": "two", "3": "three"}
+
+
+def test_csv_writer_has_trusted_knowledge_columns(tmp_path):
+    with open_writer(str(tmp_path / "reports"), "csv") as writer:
+        writer.write(562, "Report, with comma", organism_info=INFO, sample_id="S1")
+    with open_writer(str(tmp_path / "reports"), "csv") as writer:
+        writer.write(1280, "Report B")
+
+    with open(tmp_path / "reports.csv", newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 2
+    assert rows[0]["sample_id"] == "S1"
+    assert rows[0]["Family"] == "Enterobacteriaceae"
+    assert rows[0]["report"] == "Report, with comma"
+    assert rows[1]["tax_id"] == "1280"
+    assert rows[1]["Name"] == ""
+
+
+def test_parquet_writer_round_trip(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    with open_writer(str(tmp_path / "reports"), "parquet") as writer:
+        writer.write(562, "Report A", organism_info=INFO)
+        writer.write(1280, "Report B")
+
+    table = pq.read_table(tmp_path / "reports.parquet")
+    assert table.column("tax_id").to_pylist() == ["562", "1280"]
+    assert table.column("Name").to_pylist() == ["Escherichia coli", ""]
+
+    # a later run appends, as with the other formats
+    with open_writer(str(tmp_path / "reports"), "parquet") as writer:
+        writer.write(7, "Report C")
+
+    table = pq.read_table(tmp_path / "reports.parquet")
+    assert table.column("tax_id").to_pylist() == ["562", "1280", "7"]
+
+
+def test_writers_must_implement_write(tmp_path):
+    class Incomplete(ReportWriter):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete(str(tmp_path / "reports.txt"))
+
+
+def test_open_writer_rejects_unknown_type(tmp_path):
+    with pytest.raises(ValueError):
+        open_writer(str(tmp_path / "reports"), "xml")
+
+
+def test_parquet_without_pyarrow_is_reported_up_front(monkeypatch):
+    assert missing_dependency("csv") is None
+    monkeypatch.setattr("importlib.util.find_spec", lambda name: None)
+
+    assert "pip install pyarrow" in missing_dependency("parquet")
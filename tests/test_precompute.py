@@ -0,0 +1,105 @@
+import json
+import threading
+
+from precompute import Checkpoint, curated_tax_ids, run_precompute
+from report_store import ReportStore
+
+LANGUAGES = ["English", "Brazilian Portuguese"]
+
+
+class _FakeKnowledgeBase:
+    content_hash = "kb-1"
+
+    def annotated_tax_ids(self, table):
+        return {"data": ["562", "1280", "not-a-taxid"], "acronyms": ["1280", "11676"]}[
+            table
+        ]
+
+
+class _FakeAssistant:
+    """Stands in for MetagenomicsAssistant, counting the work it does."""
+
+    def __init__(self, failing=()):
+        self.kb = _FakeKnowledgeBase()
+        self.failing = set(failing)
+        self.lookups = []
+        self.reports = []
+        self._lock = threading.Lock()
+
+    def set_organism_fields(self, tax_id):
+        with self._lock:
+            self.lookups.append(tax_id)
+        return {"Name": f"Organism {tax_id}"}
+
+    def generate_report(self, tax_id, language, organism_info=None):
+        if (tax_id, language) in self.failing:
+            raise RuntimeError("quota exceeded")
+        with self._lock:
+            self.reports.append((tax_id, language))
+        return f"{organism_info['Name']} in {language}"
+
+    def generate_reports(self, tax_id, languages, organism_info=None):
+        reports = {}
+        for language in languages:
+            try:
+                reports[language] = self.generate_report(
+                    tax_id, language, organism_info
+                )
+            except RuntimeError as e:
+                reports[language] = f"Error: {e}"
+        return reports
+
+
+def test_curated_tax_ids_are_deduplicated_in_order():
+    assert curated_tax_ids(_FakeKnowledgeBase()) == ["562", "1280", "11676"]
+
+
+def test_precompute_stores_every_report_looking_each_organism_up_once(tmp_path):
+    assistant = _FakeAssistant()
+    store = ReportStore(str(tmp_path / "reports.sqlite"))
+
+    summary = run_precompute(
+        assistant, store, str(tmp_path / "checkpoint.jsonl"), LANGUAGES, workers=2
+    )
+
+    assert summary == {"skipped": 0, "generated": 6, "failed": 0}
+    assert sorted(assistant.lookups) == ["11676", "1280", "562"]
+    assert store.get("1280", "Brazilian Portuguese").report == (
+        "Organism 1280 in Brazilian Portuguese"
+    )
+
+
+def test_resumed_run_skips_finished_pairs_and_retries_failures(tmp_path):
+    store = ReportStore(str(tmp_path / "reports.sqlite"))
+    checkpoint_path = str(tmp_path / "checkpoint.jsonl")
+
+    first = run_precompute(
+        _FakeAssistant(failing={("562", "English")}),
+        store,
+        checkpoint_path,
+        LANGUAGES,
+    )
+    assert (first["generated"], first["failed"]) == (5, 1)
+    assert Checkpoint(checkpoint_path, "kb-1").done == store.keys("kb-1")
+
+    assistant = _FakeAssistant()
+    second = run_precompute(assistant, store, checkpoint_path, LANGUAGES)
+
+    assert second == {"skipped": 5, "generated": 1, "failed": 0}
+    assert assistant.reports == [("562", "English")]
+    with open(checkpoint_path, encoding="utf-8") as f:
+        statuses = [json.loads(line)["status"] for line in f]
+    assert statuses.count("failed") == 1
+
+
+def test_reports_of_an_older_knowledge_base_are_generated_again(tmp_path):
+    store = ReportStore(str(tmp_path / "reports.sqlite"))
+    checkpoint_path = str(tmp_path / "checkpoint.jsonl")
+    run_precompute(_FakeAssistant(), store, checkpoint_path, ["English"])
+
+    assistant = _FakeAssistant()
+    assistant.kb.content_hash = "kb-2"
+    summary = run_precompute(assistant, store, checkpoint_path, ["English"])
+
+    assert summary == {"skipped": 0, "generated": 3, "failed": 0}
+    assert store.get("562", "English").kb_hash == "kb-2"
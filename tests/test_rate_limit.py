@@ -0,0 +1,229 @@
+import asyncio
+
+import pytest
+
+from rate_limit import (
+    FATAL,
+    THROTTLED,
+    TRANSIENT,
+    AdaptiveConcurrency,
+    CircuitBreaker,
+    CircuitOpenError,
+    LLMScheduler,
+    TokenBucket,
+    parse_retry_after,
+    shared_bucket,
+)
+
+
+class _FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_allows_burst_then_waits():
+    clock = _FakeClock()
+    bucket = TokenBucket(rate=3, clock=clock)
+
+    assert [bucket.try_acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.try_acquire() == pytest.approx(1 / 3)
+
+    clock.now += 1 / 3
+    assert bucket.try_acquire() == 0.0
+
+
+def test_shared_bucket_is_reused_per_name_and_rate():
+    assert shared_bucket("svc", 3) is shared_bucket("svc", 3)
+    assert shared_bucket("svc", 3) is not shared_bucket("svc", 10)
+
+
+class _Throttled(Exception):
+    pass
+
+
+class _Unavailable(Exception):
+    pass
+
+
+def _classify(error):
+    if isinstance(error, _Throttled):
+        return THROTTLED, 7.0
+    if isinstance(error, _Unavailable):
+        return TRANSIENT, None
+    return FATAL, None
+
+
+def _scheduler(**kwargs):
+    sleeps = []
+    scheduler = LLMScheduler(
+        "test",
+        requests_per_minute=60_000,
+        tokens_per_minute=1_000_000,
+        classify_error=_classify,
+        sleep=sleeps.append,
+        **kwargs,
+    )
+    return scheduler, sleeps
+
+
+def _failing(*errors, result="ok"):
+    errors = list(errors)
+
+    def call():
+        if errors:
+            raise errors.pop(0)
+        return result
+
+    return call
+
+
+def test_adaptive_concurrency_grows_additively_and_halves_on_throttle():
+    clock = _FakeClock()
+    limiter = AdaptiveConcurrency(initial=4, maximum=8, clock=clock)
+
+    # about one more slot per `limit` successes
+    for _ in range(5):
+        limiter.on_success()
+    assert limiter.limit == 5
+
+    limiter.on_throttle()
+    limiter.on_throttle()  # same burst: ignored within the cooldown
+    assert limiter.limit == 2
+
+    clock.now += 2
+    limiter.on_throttle()
+    assert limiter.limit == 1
+
+    assert limiter.try_enter()
+    assert not limiter.try_enter()
+    limiter.leave()
+    assert limiter.in_flight == 0
+
+
+def test_circuit_breaker_opens_then_lets_one_trial_through():
+    clock = _FakeClock()
+    breaker = CircuitBreaker("svc", failure_threshold=2, reset_timeout=30, clock=clock)
+
+    breaker.on_failure()
+    breaker.before_call()
+    breaker.on_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    clock.now += 30
+    assert breaker.state == "half-open"
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # only one trial at a time
+    breaker.on_success()
+    assert breaker.state == "closed"
+
+
+def test_scheduler_retries_throttles_honouring_retry_after():
+    scheduler, sleeps = _scheduler()
+    limit = scheduler.concurrency.limit
+
+    result = scheduler.call(_failing(_Throttled(), _Unavailable()))
+
+    assert result == "ok"
+    assert sleeps[0] >= 7.0
+    assert len(sleeps) == 2
+    assert scheduler.concurrency.limit < limit
+    assert scheduler.concurrency.in_flight == 0
+
+
+def test_scheduler_raises_fatal_errors_at_once_and_opens_the_circuit():
+    scheduler, sleeps = _scheduler(
+        max_retries=1, breaker=CircuitBreaker("test", failure_threshold=1)
+    )
+
+    with pytest.raises(ValueError):
+        scheduler.call(_failing(ValueError("bad request")))
+    assert sleeps == []
+
+    with pytest.raises(_Unavailable):
+        scheduler.call(_failing(_Unavailable(), _Unavailable()))
+    with pytest.raises(CircuitOpenError):
+        scheduler.call(_failing())
+
+
+def test_cancelled_trial_call_lets_the_next_call_through():
+    clock = _FakeClock()
+    breaker = CircuitBreaker("test", failure_threshold=1, clock=clock)
+    scheduler, _ = _scheduler(max_retries=0, breaker=breaker)
+    with pytest.raises(_Unavailable):
+        scheduler.call(_failing(_Unavailable()))
+    clock.now += breaker.reset_timeout
+
+    async def hang():
+        await asyncio.sleep(5)
+
+    async def cancel_trial():
+        trial = asyncio.create_task(scheduler.acall(hang))
+        await asyncio.sleep(0.01)
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+
+    asyncio.run(cancel_trial())
+
+    assert breaker.state == "half-open"
+    assert scheduler.call(_failing(result="ok")) == "ok"
+    assert breaker.state == "closed"
+    assert scheduler.concurrency.in_flight == 0
+
+
+def test_interrupted_trial_stream_lets_the_next_call_through():
+    clock = _FakeClock()
+    breaker = CircuitBreaker("test", failure_threshold=1, clock=clock)
+    scheduler, _ = _scheduler(max_retries=0, breaker=breaker)
+    with pytest.raises(_Unavailable):
+        scheduler.call(_failing(_Unavailable()))
+    clock.now += breaker.reset_timeout
+
+    def interrupted():
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        next(scheduler.stream(interrupted))
+
+    assert breaker.state == "half-open"
+    assert scheduler.call(_failing(result="ok")) == "ok"
+    assert breaker.state == "closed"
+    assert scheduler.concurrency.in_flight == 0
+
+
+def test_scheduler_settles_the_token_estimate():
+    scheduler, _ = _scheduler()
+    capacity = scheduler.tokens.capacity
+
+    scheduler.call(_failing(result="text"), tokens=1000, used_tokens=lambda _: 400)
+
+    assert scheduler.tokens.try_acquire(capacity - 400) == 0.0
+
+
+def test_async_call_and_stream_retry_before_the_answer():
+    scheduler, sleeps = _scheduler(base_delay=0)
+    errors = [_Unavailable()]
+
+    async def call():
+        if errors:
+            raise errors.pop()
+        return "async ok"
+
+    assert asyncio.run(scheduler.acall(call)) == "async ok"
+
+    chunks = scheduler.stream(_failing(_Unavailable(), result=["Part one, ", "two."]))
+    assert list(chunks) == ["Part one, ", "two."]
+    assert len(sleeps) == 1
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("30") == 30.0
+    assert parse_retry_after("1.5s") == 1.5
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") is None
@@ -0,0 +1,64 @@
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from relative_index import RelativeIndex, load_or_build_relative_index
+
+
+def _make_taxonomy_db(path):
+    """Tiny ete-like taxonomy: 1 > 10 (family) > 100 (genus) > 1000, 1001."""
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE species (taxid INT PRIMARY KEY, parent INT, spname TEXT,
+                              common TEXT, rank TEXT, track TEXT);
+        CREATE TABLE merged (taxid_old INT, taxid_new INT);
+        INSERT INTO species VALUES (1, 1, 'root', '', 'no rank', '1');
+        INSERT INTO species VALUES (10, 1, 'Familiaceae', '', 'family', '10,1');
+        INSERT INTO species VALUES (100, 10, 'Genus', '', 'genus', '100,10,1');
+        INSERT INTO species VALUES (1000, 100, 'Genus a', '', 'species', '1000,100,10,1');
+        INSERT INTO species VALUES (1001, 100, 'Genus b', '', 'species', '1001,100,10,1');
+        INSERT INTO merged VALUES (555, 1001);
+        """)
+    conn.commit()
+    conn.close()
+
+
+def test_build_maps_ancestors_and_merged_ids(tmp_path):
+    dbfile = str(tmp_path / "taxa.sqlite")
+    _make_taxonomy_db(dbfile)
+
+    index = RelativeIndex.build(dbfile, {"data": ["1000", "555"]})
+
+    # descendants resolve to the closest annotated TaxID, first row on ties
+    assert index.lookup("data", 100) == "1000"
+    assert index.lookup("data", "10") == "1000"
+    # an old ID merged into 1001 is found from the current TaxID
+    assert index.lookup("data", 1001) == "555"
+    assert index.lookup("data", 999) is None
+    assert index.lookup("acronyms", 100) is None
+
+
+def test_load_or_build_reuses_saved_index_until_sources_change(tmp_path):
+    dbfile = str(tmp_path / "taxa.sqlite")
+    path = str(tmp_path / "relative_index.json")
+    _make_taxonomy_db(dbfile)
+
+    first = load_or_build_relative_index(path, dbfile, {"data": ["1000"]})
+    loaded = load_or_build_relative_index(path, dbfile, {"data": ["1000"]})
+    rebuilt = load_or_build_relative_index(path, dbfile, {"data": ["1001"]})
+
+    assert loaded.tables == first.tables
+    assert rebuilt.lookup("data", 100) == "1001"
+
+
+def test_concurrent_saves_do_not_clash(tmp_path):
+    dbfile = str(tmp_path / "taxa.sqlite")
+    path = str(tmp_path / "index" / "relative_index.json")
+    _make_taxonomy_db(dbfile)
+    index = RelativeIndex.build(dbfile, {"data": ["1000"]})
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(lambda _: index.save(path), range(8)))
+
+    assert RelativeIndex.load(path).tables == index.tables
+    assert os.listdir(tmp_path / "index") == ["relative_index.json"]
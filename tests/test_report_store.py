@@ -0,0 +1,44 @@
+import sqlite3
+
+from report_store import ReportStore
+
+
+def test_store_round_trip_and_keys(tmp_path):
+    store = ReportStore(str(tmp_path / "reports.sqlite"))
+
+    assert store.get(562, "English") is None
+    assert len(store) == 0
+
+    store.put(562, "English", "First", {"Name": "E. coli"}, "gemini")
+    store.put("562", "English", "Second", {"Name": "E. coli"}, "gemini", "kb-1")
+    store.put(562, "Brazilian Portuguese", "Relatório")
+
+    stored = store.get("562", "English")
+    assert stored.report == "Second"
+    assert stored.organism_info == {"Name": "E. coli"}
+    assert (stored.provider, stored.kb_hash) == ("gemini", "kb-1")
+    assert store.get(562, "Brazilian Portuguese").organism_info == {}
+    assert store.keys() == {("562", "English"), ("562", "Brazilian Portuguese")}
+    assert store.keys("kb-1") == {("562", "English")}
+    assert len(store) == 2
+
+
+def test_store_from_before_kb_hashes_is_upgraded(tmp_path):
+    path = str(tmp_path / "reports.sqlite")
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE reports (tax_id TEXT NOT NULL, language TEXT NOT NULL, "
+            "report TEXT NOT NULL, organism_info TEXT NOT NULL, "
+            "provider TEXT NOT NULL, generated_at REAL NOT NULL, "
+            "PRIMARY KEY (tax_id, language))"
+        )
+        conn.execute(
+            "INSERT INTO reports VALUES ('562', 'English', 'Old', '{}', 'aws', 0)"
+        )
+    conn.close()
+
+    store = ReportStore(path)
+
+    assert store.get(562, "English").kb_hash == ""
+    store.put(562, "English", "New", kb_hash="kb-1")
+    assert store.get(562, "English").kb_hash == "kb-1"
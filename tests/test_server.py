@@ -0,0 +1,167 @@
+import threading
+import time
+
+import pytest
+
+from report_store import StoredReport
+from server import ReportService, SingleFlight, request_service, start_servers
+
+
+class _FakeAssistant:
+    """Stands in for MetagenomicsAssistant, counting the work it does."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.reports = 0
+        self.lookups = 0
+        self.stored = {}
+        self._lock = threading.Lock()
+
+    def get_stored_report(self, tax_id, language):
+        return self.stored.get((str(tax_id), language))
+
+    def get_organism_tax_id(self, organism_name):
+        return {"Escherichia coli": 562}.get(organism_name, "")
+
+    def set_organism_fields(self, tax_id, timings=None):
+        with self._lock:
+            self.lookups += 1
+        return {"Name": f"Organism {tax_id}"}
+
+    def generate_report(self, tax_id, language="english", organism_info=None):
+        time.sleep(self.delay)
+        with self._lock:
+            self.reports += 1
+        return f"Report for {organism_info['Name']} in {language}"
+
+    def generate_reports(self, tax_id, languages, organism_info=None):
+        return {
+            language: self.generate_report(tax_id, language, organism_info)
+            for language in languages
+        }
+
+
+@pytest.fixture
+def running_service(tmp_path):
+    assistant = _FakeAssistant(delay=0.2)
+    service = ReportService(assistant)
+    socket_path = str(tmp_path / "service.sock")
+    servers = start_servers(service, host="127.0.0.1", port=0, socket_path=socket_path)
+    host, port = servers[0].server_address
+    yield assistant, service, f"http://{host}:{port}", f"unix:{socket_path}"
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_single_flight_shares_concurrent_calls():
+    single_flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def work():
+        calls.append(1)
+        release.wait(1)
+        return "done"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(single_flight.do("k", work)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert all(result == "done" for result, _ in results)
+
+
+def test_single_flight_propagates_errors_and_forgets_key():
+    single_flight = SingleFlight()
+
+    def boom():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        single_flight.do("k", boom)
+
+    assert single_flight.do("k", lambda: 1) == (1, False)
+
+
+def test_concurrent_report_requests_are_coalesced(running_service):
+    assistant, service, http_address, _ = running_service
+    payloads = []
+
+    def call():
+        payloads.append(
+            request_service(http_address, "/report", {"taxid": "562", "language": "pt"})
+        )
+
+    threads = [threading.Thread(target=call) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert assistant.reports == 1
+    assert len(payloads) == 4
+    assert payloads[0]["report"] == "Report for Organism 562 in Brazilian Portuguese"
+    stats = request_service(http_address, "/stats")
+    assert stats["coalesced"] == 3
+    assert stats["requests"]["/report"] == 4
+    assert stats["latency"]["/report"]["max"] >= 0.15
+
+
+def test_stored_report_skips_lookup_and_llm(running_service):
+    assistant, _, http_address, _ = running_service
+    assistant.stored[("562", "English")] = StoredReport(
+        "Stored report", {"Name": "Stored"}, "gemini", 0.0
+    )
+
+    payload = request_service(http_address, "/report", {"taxid": "562"})
+
+    assert payload["report"] == "Stored report"
+    assert (assistant.reports, assistant.lookups) == (0, 0)
+
+
+def test_several_languages_share_one_request(running_service):
+    assistant, _, http_address, _ = running_service
+
+    payload = request_service(
+        http_address, "/report", {"taxid": "562", "language": "en,PT"}
+    )
+
+    assert payload["languages"] == ["EN", "PT"]
+    assert payload["reports"] == {
+        "EN": "Report for Organism 562 in English",
+        "PT": "Report for Organism 562 in Brazilian Portuguese",
+    }
+    assert (assistant.reports, assistant.lookups) == (2, 1)
+
+
+def test_unix_socket_resolve_and_trusted_knowledge(running_service):
+    assistant, _, _, unix_address = running_service
+
+    assert request_service(unix_address, "/health") == {"status": "ok"}
+    assert request_service(unix_address, "/resolve", {"name": "Escherichia coli"}) == {
+        "name": "Escherichia coli",
+        "tax_id": 562,
+    }
+    payload = request_service(unix_address, "/trusted-knowledge", {"taxid": "562"})
+    assert payload["organism_info"] == {"Name": "Organism 562"}
+
+
+def test_bad_requests_are_reported(running_service):
+    _, _, http_address, _ = running_service
+
+    with pytest.raises(RuntimeError, match="Missing 'taxid'"):
+        request_service(http_address, "/report")
+    with pytest.raises(RuntimeError, match="Unsupported language"):
+        request_service(http_address, "/report", {"taxid": "562", "language": "FR"})
+    with pytest.raises(RuntimeError, match="Unknown endpoint"):
+        request_service(http_address, "/nope")
@@ -0,0 +1,126 @@
+import json
+
+import pytest
+
+from batch import BatchRow, read_batch_file
+from shards import (
+    collect_shards,
+    merge_shards,
+    rerun_failed,
+    run_shard,
+    shard_of,
+    split_manifest,
+)
+
+
+class _FakeAssistant:
+    """Stands in for MetagenomicsAssistant with canned answers."""
+
+    def __init__(self, failing_tax_ids=(), failing_reports=()):
+        self.failing_tax_ids = set(failing_tax_ids)
+        self.failing_reports = set(failing_reports)
+        self.generated = []
+
+    def prefetch_genome_sizes(self, tax_ids):
+        pass
+
+    def get_stored_report(self, tax_id, language):
+        return None
+
+    def set_organism_fields(self, tax_id, timings=None):
+        if str(tax_id) in self.failing_tax_ids:
+            raise RuntimeError("lookup exploded")
+        return {"Name": f"Organism {tax_id}"}
+
+    def generate_reports(self, tax_id, languages, organism_info=None):
+        self.generated.append(tax_id)
+        return {
+            language: (
+                "Error: quota exceeded"
+                if (tax_id, language) in self.failing_reports
+                else f"Report {tax_id} in {language}"
+            )
+            for language in languages
+        }
+
+
+ROWS = [BatchRow(sample_id=f"S{n}", tax_id=str(1000 + n)) for n in range(8)]
+
+
+def test_split_is_deterministic_and_covers_every_row(tmp_path):
+    shard_dir = str(tmp_path / "run")
+
+    counts = split_manifest(ROWS, 3, shard_dir, ["English"])
+
+    assert sum(counts) == len(ROWS)
+    for index in range(3):
+        rows = read_batch_file(
+            str(tmp_path / "run" / f"shard-{index:04d}" / "input.tsv")
+        )
+        assert rows == [row for row in ROWS if shard_of(row, 3) == index]
+    # rows without a TaxID go by their normalized name
+    assert shard_of(BatchRow("a", organism_name=" Escherichia coli"), 3) == shard_of(
+        BatchRow("b", organism_name="escherichia coli"), 3
+    )
+    with pytest.raises(ValueError):
+        split_manifest(ROWS, 3, shard_dir, ["English"])
+
+
+def test_merge_reports_missing_shards_and_reruns_failed_rows(tmp_path):
+    shard_dir = str(tmp_path / "run")
+    counts = split_manifest(ROWS, 3, shard_dir, ["English"])
+    failing = next(row.tax_id for row in ROWS if shard_of(row, 3) == 0)
+    assistant = _FakeAssistant(failing_tax_ids=[failing])
+
+    run_shard(assistant, shard_dir, 0)
+    run_shard(assistant, shard_dir, 1)
+    # a done shard is not run again
+    assert run_shard(assistant, shard_dir, 0) == []
+
+    output = str(tmp_path / "merged")
+    run = merge_shards(shard_dir, output)
+
+    assert run.missing == [2]
+    assert [row.tax_id for row in run.failed] == [failing]
+    with open(f"{output}.json", encoding="utf-8") as f:
+        merged = json.load(f)
+    assert len(merged) == counts[0] - 1 + counts[1]
+
+    run_shard(assistant, shard_dir, 2)
+    assistant.failing_tax_ids.clear()
+    generated = len(assistant.generated)
+    rerun_failed(assistant, shard_dir)
+
+    # only the failed row was generated again
+    assert assistant.generated[generated:] == [failing]
+    assert collect_shards(shard_dir).complete
+    merge_shards(shard_dir, output)
+    with open(f"{output}.json", encoding="utf-8") as f:
+        merged = json.load(f)
+    assert set(merged) == {row.tax_id for row in ROWS}
+
+
+def test_rerun_generates_only_the_failed_languages(tmp_path):
+    shard_dir = str(tmp_path / "run")
+    languages = ["English", "Brazilian Portuguese"]
+    split_manifest(ROWS, 2, shard_dir, languages)
+    failing = ROWS[0].tax_id
+    assistant = _FakeAssistant(failing_reports=[(failing, "Brazilian Portuguese")])
+    for index in range(2):
+        run_shard(assistant, shard_dir, index)
+
+    run = collect_shards(shard_dir)
+    assert run.failed_languages == {ROWS[0].sample_id: ["Brazilian Portuguese"]}
+
+    assistant.failing_reports.clear()
+    rerun_failed(assistant, shard_dir)
+    output = str(tmp_path / "merged")
+    assert merge_shards(shard_dir, output).complete
+
+    for code, language in (("EN", "English"), ("PT", "Brazilian Portuguese")):
+        with open(f"{output}_{code}.json", encoding="utf-8") as f:
+            merged = json.load(f)
+        assert merged[failing] == f"Report {failing} in {language}"
+        assert len(merged) == len(ROWS)
+    with open(tmp_path / "run" / "rerun-0001" / "done.json", encoding="utf-8") as f:
+        assert json.load(f)["languages"] == ["Brazilian Portuguese"]
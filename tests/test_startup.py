@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+
+# Cumulative import time allowed for the CLI module, in microseconds
+STARTUP_IMPORT_BUDGET_US = 500_000
+
+HEAVY_MODULES = {
+    "pandas",
+    "numpy",
+    "ete4",
+    "boto3",
+    "botocore",
+    "google.genai",
+    "Bio",
+    "requests",
+}
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _import_times(module: str) -> dict[str, int]:
+    """Run `python -X importtime -c "import module"` and parse its report."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_cli_import_skips_heavy_dependencies():
+    times = _import_times("parse_config")
+
+    assert HEAVY_MODULES.isdisjoint(times)
+    assert times["parse_config"] < STARTUP_IMPORT_BUDGET_US
+
+
+def test_help_does_not_load_datasets_or_providers():
+    script = (
+        "import sys\n"
+        "sys.argv = ['bio_jarvis.py', '--help']\n"
+        "import parse_config\n"
+        "try:\n"
+        "    parse_config.parse_handle()\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        f"heavy = {sorted(HEAVY_MODULES)!r}\n"
+        "print('LOADED:', [name for name in heavy if name in sys.modules])\n"
+    )
+    completed = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert "--batch" in completed.stdout
+    assert "LOADED: []" in completed.stdout
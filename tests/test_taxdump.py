@@ -0,0 +1,177 @@
+import io
+import sqlite3
+import tarfile
+from contextlib import closing
+
+from assistant import MetagenomicsAssistant
+from genome_cache import GenomeSizeCache
+from knowledge_base import create_knowledge_base
+from report_store import ReportStore
+from taxdump import read_taxdump, update_taxonomy_db
+from taxonomy_db import TaxonomyDB
+
+NODES = {
+    1: (1, "no rank", "root"),
+    10: (1, "family", "Familiaceae"),
+    100: (10, "genus", "Genus"),
+    1000: (100, "species", "Genus a"),
+    1001: (100, "species", "Genus b"),
+}
+
+
+def _write_taxdump(path, nodes, synonyms=(), merged=()):
+    def dmp(rows):
+        return "".join("\t|\t".join(map(str, row)) + "\t|\n" for row in rows)
+
+    names = [
+        (tax_id, name, "", "scientific name") for tax_id, (_, _, name) in nodes.items()
+    ]
+    names += [(tax_id, name, "", "synonym") for tax_id, name in synonyms]
+    files = {
+        "nodes.dmp": dmp(
+            (tax_id, parent, rank) for tax_id, (parent, rank, _) in nodes.items()
+        ),
+        "names.dmp": dmp(names),
+        "merged.dmp": dmp(merged),
+    }
+    with tarfile.open(path, "w:gz") as tar:
+        for name, text in files.items():
+            data = text.encode("utf-8")
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return str(path)
+
+
+def _dump_tables(dbfile):
+    with closing(sqlite3.connect(dbfile)) as conn:
+        return {
+            table: sorted(conn.execute(f"SELECT * FROM {table}").fetchall())
+            for table in ("species", "synonym", "merged")
+        }
+
+
+def test_read_taxdump_parses_nodes_names_and_merged(tmp_path):
+    path = _write_taxdump(
+        tmp_path / "taxdump.tar.gz",
+        NODES,
+        synonyms=[(1001, "Oldgenus b")],
+        merged=[(555, 1001)],
+    )
+
+    taxonomy = read_taxdump(path)
+
+    assert taxonomy.nodes[1] == (None, "root", "", "no rank")
+    assert taxonomy.nodes[1000] == (100, "Genus a", "", "species")
+    assert taxonomy.synonyms == {(1001, "Oldgenus b")}
+    assert taxonomy.merged == {555: 1001}
+
+
+def test_incremental_update_matches_a_full_rebuild(tmp_path):
+    dbfile = str(tmp_path / "taxa.sqlite")
+    first = _write_taxdump(tmp_path / "first.tar.gz", NODES, merged=[(555, 1001)])
+
+    initial = update_taxonomy_db(dbfile, first)
+    assert (initial.full_rebuild, initial.reason) == (True, "no usable database")
+    assert TaxonomyDB(dbfile).get_lineage(1000) == [1, 10, 100, 1000]
+
+    assert update_taxonomy_db(dbfile, first).unchanged
+
+    # Genus b moves to a new genus, Genus a is renamed, 1001 gains a synonym
+    nodes = dict(NODES)
+    nodes[101] = (10, "genus", "Othergenus")
+    nodes[1001] = (101, "species", "Othergenus b")
+    nodes[1000] = (100, "species", "Genus alpha")
+    second = _write_taxdump(
+        tmp_path / "second.tar.gz",
+        nodes,
+        synonyms=[(1001, "Genus b")],
+        merged=[(556, 1000)],
+    )
+
+    changes = update_taxonomy_db(dbfile, second)
+
+    assert not changes.full_rebuild
+    assert changes.added == {101}
+    assert changes.renamed == {1000, 1001}
+    assert changes.relineaged == {101, 1001}
+    assert changes.below_renamed == set()
+    assert changes.merged == {555, 556}
+    assert changes.synonyms_added == 1
+    assert TaxonomyDB(dbfile).get_lineage(1001) == [1, 10, 101, 1001]
+
+    rebuilt = str(tmp_path / "rebuilt.sqlite")
+    update_taxonomy_db(rebuilt, second)
+    assert _dump_tables(dbfile) == _dump_tables(rebuilt)
+
+    forced = update_taxonomy_db(dbfile, second, full_rebuild=True)
+    assert (forced.full_rebuild, forced.reason) == (True, "requested")
+    assert forced.unchanged
+
+
+def test_refresh_keeps_indexes_and_drops_stale_entries(tmp_path):
+    dbfile = str(tmp_path / "taxa.sqlite")
+    update_taxonomy_db(dbfile, _write_taxdump(tmp_path / "first.tar.gz", NODES))
+
+    store = ReportStore(str(tmp_path / "reports.sqlite"))
+    cache = GenomeSizeCache(str(tmp_path / "sizes.sqlite"))
+    for tax_id in (1000, 1001):
+        store.put(tax_id, "English", f"Report {tax_id}")
+        cache.set(tax_id, f"Name {tax_id}", 5000)
+    kb = create_knowledge_base(
+        str(tmp_path / "kb.sqlite"), [], {"data": [], "acronyms": []}
+    )
+    assistant = MetagenomicsAssistant(
+        llm_handler=None,
+        kb=kb,
+        taxonomy_db=dbfile,
+        genome_cache=cache,
+        report_store=store,
+        relative_index_path=str(tmp_path / "relative_index.json"),
+        name_index_path=str(tmp_path / "names.sqlite"),
+    )
+    assistant._get_row_with_fallback(1000, "data")
+    assert len(assistant._row_cache["data"]) == 1
+    # Unknown changes: nothing derived from the old taxonomy is kept
+    assert assistant.refresh_after_taxonomy_update() == {
+        "relative index": "rebuilt",
+        "name index": "rebuilt",
+        "cached genome sizes dropped": 2,
+        "stored reports dropped": 2,
+    }
+    assert len(store) == 0 and cache.get(1000, "Name 1000") is None
+    assert not any(len(rows) for rows in assistant._row_cache.values())
+    for tax_id in (1000, 1001):
+        store.put(tax_id, "English", f"Report {tax_id}")
+        cache.set(tax_id, f"Name {tax_id}", 5000)
+
+    # Only a rank changes: neither index depends on it
+    nodes = dict(NODES)
+    nodes[1001] = (100, "subspecies", "Genus b")
+    changes = update_taxonomy_db(
+        dbfile, _write_taxdump(tmp_path / "second.tar.gz", nodes)
+    )
+
+    assert assistant.refresh_after_taxonomy_update(changes) == {
+        "relative index": "kept",
+        "name index": "kept",
+        "cached genome sizes dropped": 1,
+        "stored reports dropped": 1,
+    }
+    assert store.keys() == {("1000", "English")}
+    assert assistant.taxonomy.get_ranks([1001]) == {1001: "subspecies"}
+    # the kept index now matches the updated database and is not rebuilt
+    signature = assistant.relative_index.signature
+    assistant.refresh_after_taxonomy_update(changes)
+    assert assistant.relative_index.signature == signature
+
+    # A renamed genus goes stale in the reports of its species too
+    nodes[100] = (10, "genus", "Newgenus")
+    changes = update_taxonomy_db(
+        dbfile, _write_taxdump(tmp_path / "third.tar.gz", nodes)
+    )
+
+    assert changes.below_renamed == {1000, 1001}
+    outcome = assistant.refresh_after_taxonomy_update(changes)
+    assert outcome["stored reports dropped"] == 1
+    assert store.keys() == set()
@@ -0,0 +1,82 @@
+import sqlite3
+import threading
+
+import pytest
+
+from taxonomy_db import TaxonomyDB, select_in
+
+
+@pytest.fixture
+def taxonomy(tmp_path):
+    """Tiny ete-like taxonomy: 1 > 10 (family) > 100 (genus) > 1000, 1001."""
+    dbfile = str(tmp_path / "taxa.sqlite")
+    conn = sqlite3.connect(dbfile)
+    conn.executescript("""
+        CREATE TABLE species (taxid INT PRIMARY KEY, parent INT,
+                              spname VARCHAR(50) COLLATE NOCASE, common TEXT,
+                              rank TEXT, track TEXT);
+        CREATE TABLE synonym (taxid INT, spname VARCHAR(50) COLLATE NOCASE);
+        CREATE TABLE merged (taxid_old INT, taxid_new INT);
+        INSERT INTO species VALUES (1, 1, 'root', '', 'no rank', '1');
+        INSERT INTO species VALUES (10, 1, 'Familiaceae', '', 'family', '10,1');
+        INSERT INTO species VALUES (100, 10, 'Genus', '', 'genus', '100,10,1');
+        INSERT INTO species VALUES (1000, 100, 'Genus a', '', 'species',
+                                    '1000,100,10,1');
+        INSERT INTO species VALUES (1001, 100, 'Genus b', '', 'species',
+                                    '1001,100,10,1');
+        INSERT INTO synonym VALUES (1001, 'Oldgenus b');
+        INSERT INTO merged VALUES (555, 1001);
+        """)
+    conn.commit()
+    conn.close()
+    db = TaxonomyDB(dbfile)
+    yield db
+    db.close()
+
+
+def test_lookups_follow_merged_ids(taxonomy):
+    assert taxonomy.get_lineage(1000) == [1, 10, 100, 1000]
+    with pytest.warns(UserWarning, match="translated into 1001"):
+        assert taxonomy.get_lineage("555") == [1, 10, 100, 1001]
+    assert taxonomy.get_names(["1000", 555, 999]) == {1000: "Genus a", 555: "Genus b"}
+    assert taxonomy.get_ranks([10, 100]) == {10: "family", 100: "genus"}
+    assert taxonomy.get_parents([1000, 1001]) == {1000: 100, 1001: 100}
+    assert taxonomy.translate_merged([555, 1000]) == {555: 1001}
+    with pytest.raises(ValueError, match="Could not find taxid"):
+        taxonomy.get_lineage(999)
+
+
+def test_get_taxids_ignores_case_and_uses_synonyms(taxonomy):
+    assert taxonomy.get_taxids(["Genus a", "genus A", "Oldgenus b", "Unknown"]) == {
+        "Genus a": [1000],
+        "genus A": [1000],
+        "Oldgenus b": [1001],
+    }
+
+
+def test_each_thread_gets_its_own_read_only_connection(taxonomy):
+    connections, names = [], []
+
+    def lookup():
+        connections.append(taxonomy._conn)
+        names.append(taxonomy.get_names([1000])[1000])
+
+    threads = [threading.Thread(target=lookup) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert names == ["Genus a"] * 4
+    assert len({id(conn) for conn in connections}) == 4
+    with pytest.raises(sqlite3.OperationalError, match="readonly"):
+        taxonomy._conn.execute("DELETE FROM species")
+
+
+def test_select_in_splits_long_id_lists(taxonomy):
+    rows = select_in(
+        taxonomy._conn,
+        "SELECT taxid FROM species WHERE taxid IN (%s)",
+        list(range(5000)),
+    )
+    assert sorted(row[0] for row in rows) == [1, 10, 100, 1000, 1001]
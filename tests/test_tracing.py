@@ -0,0 +1,108 @@
+import json
+import threading
+
+import pytest
+
+import tracing
+from benchmarks.fakes import fake_aws_handler, fake_gemini_handler
+from tracing import Tracer, count, profile_session, record_usage, span
+
+
+@pytest.fixture(autouse=True)
+def _no_global_tracer():
+    yield
+    tracing.set_tracer(None)
+
+
+def test_helpers_do_nothing_without_tracer():
+    with span("stage"):
+        count("requests")
+        record_usage("bedrock", 10, 20)
+
+    assert tracing.get_tracer() is None
+
+
+def test_tracer_aggregates_spans_counters_and_usage():
+    tracer = Tracer()
+    tracing.set_tracer(tracer)
+
+    def work():
+        with span("field:Name"):
+            count("cache.data.hit")
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    record_usage("bedrock", 10, 20)
+    record_usage("bedrock", 5, 1)
+
+    assert tracer.stages["field:Name"]["count"] == 4
+    assert tracer.counters == {"cache.data.hit": 4}
+    assert tracer.usage == {
+        "bedrock": {"calls": 2, "input_tokens": 15, "output_tokens": 21}
+    }
+    summary = tracer.summary()
+    assert "field:Name" in summary
+    assert "bedrock: 15 in / 21 out over 2 calls" in summary
+
+
+def test_tracer_keeps_aggregates_past_event_limit():
+    tracer = Tracer(max_events=2)
+    tracing.set_tracer(tracer)
+
+    for _ in range(5):
+        with span("lookup"):
+            pass
+
+    assert len(tracer.events) == 2
+    assert tracer.dropped_events == 3
+    assert tracer.stages["lookup"]["count"] == 5
+
+
+def test_write_chrome_trace_and_json_lines(tmp_path):
+    tracer = Tracer()
+    tracing.set_tracer(tracer)
+    with span("generate_report", tax_id="562"):
+        count("network.bedrock")
+
+    chrome_path = tmp_path / "trace.json"
+    lines_path = tmp_path / "trace.jsonl"
+    tracer.write(str(chrome_path))
+    tracer.write(str(lines_path))
+
+    chrome = json.loads(chrome_path.read_text())
+    complete = [event for event in chrome["traceEvents"] if event["ph"] == "X"]
+    assert complete[0]["name"] == "generate_report"
+    assert complete[0]["args"] == {"tax_id": "562"}
+    assert chrome["otherData"]["counters"] == {"network.bedrock": 1}
+
+    records = [json.loads(line) for line in lines_path.read_text().splitlines()]
+    assert records[0]["type"] == "span"
+    assert records[0]["name"] == "generate_report"
+    assert records[-2] == {"type": "counters", "values": {"network.bedrock": 1}}
+
+
+def test_profile_session_records_handler_usage_and_writes_outputs(tmp_path, capsys):
+    trace_path = tmp_path / "trace.json"
+    cprofile_path = tmp_path / "run.prof"
+
+    with profile_session(True, str(trace_path), str(cprofile_path)) as tracer:
+        fake_aws_handler().generate_text("prompt text")
+        "".join(fake_gemini_handler().stream_text("prompt text"))
+
+    assert tracing.get_tracer() is None
+    assert tracer.counters["network.bedrock"] == 1
+    assert tracer.counters["network.gemini"] == 1
+    assert tracer.usage["bedrock"]["output_tokens"] > 0
+    assert tracer.usage["gemini"]["calls"] == 1
+    assert "bedrock:invoke_model" in tracer.stages
+    assert trace_path.exists() and cprofile_path.exists()
+    assert "LLM token usage" in capsys.readouterr().out
+
+
+def test_profile_session_without_options_is_inert():
+    with profile_session() as tracer:
+        assert tracer is None
+        assert tracing.get_tracer() is None
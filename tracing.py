@@ -0,0 +1,238 @@
+import contextlib
+import json
+import os
+import threading
+import time
+from collections.abc import Iterator
+
+# Past this many spans only the aggregated statistics keep growing
+MAX_TRACE_EVENTS = 200_000
+
+_tracer = None
+
+
+class Tracer:
+    """
+    Collect timed spans, counters and LLM token usage.
+
+    Spans are kept as events for the trace file and aggregated per name for
+    the summary. Safe to use from several threads.
+    """
+
+    def __init__(self, max_events: int = MAX_TRACE_EVENTS):
+        self.max_events = max_events
+        self.started = time.perf_counter()
+        self.events = []
+        self.dropped_events = 0
+        self.stages = {}
+        self.counters = {}
+        self.usage = {}
+        self._lock = threading.Lock()
+
+    def add_span(
+        self, name: str, category: str, started: float, duration: float, args: dict
+    ) -> None:
+        with self._lock:
+            stage = self.stages.setdefault(
+                name, {"category": category, "count": 0, "total": 0.0, "max": 0.0}
+            )
+            stage["count"] += 1
+            stage["total"] += duration
+            stage["max"] = max(stage["max"], duration)
+
+            if len(self.events) >= self.max_events:
+                self.dropped_events += 1
+                return
+            self.events.append(
+                {
+                    "name": name,
+                    "cat": category,
+                    "start": started - self.started,
+                    "duration": duration,
+                    "thread": threading.current_thread().name,
+                    "tid": threading.get_ident(),
+                    "args": args,
+                }
+            )
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_usage(self, provider: str, input_tokens: int, output_tokens: int) -> None:
+        with self._lock:
+            usage = self.usage.setdefault(
+                provider, {"calls": 0, "input_tokens": 0, "output_tokens": 0}
+            )
+            usage["calls"] += 1
+            usage["input_tokens"] += input_tokens or 0
+            usage["output_tokens"] += output_tokens or 0
+
+    def summary(self) -> str:
+        """
+        Human-readable table of stages, counters and token usage
+        """
+        with self._lock:
+            stages = sorted(self.stages.items(), key=lambda item: -item[1]["total"])
+            counters = sorted(self.counters.items())
+            usage = sorted(self.usage.items())
+
+        lines = [f"Profile ({time.perf_counter() - self.started:.2f}s wall time)"]
+        if stages:
+            lines.append(
+                f"  {'stage':<36}{'calls':>7}{'total s':>10}{'mean ms':>10}{'max ms':>10}"
+            )
+            for name, stage in stages:
+                mean = stage["total"] / stage["count"] * 1000
+                lines.append(
+                    f"  {name:<36}{stage['count']:>7}{stage['total']:>10.3f}"
+                    f"{mean:>10.1f}{stage['max'] * 1000:>10.1f}"
+                )
+        if counters:
+            lines.append("  Counters:")
+            lines.extend(f"    {name}: {value}" for name, value in counters)
+        if usage:
+            lines.append("  LLM token usage:")
+            lines.extend(
+                f"    {provider}: {values['input_tokens']} in / "
+                f"{values['output_tokens']} out over {values['calls']} calls"
+                for provider, values in usage
+            )
+        if self.dropped_events:
+            lines.append(f"  ({self.dropped_events} spans not kept in the trace)")
+        return "\n".join(lines)
+
+    def write(self, path: str) -> None:
+        """
+        Write the trace as JSON lines (.jsonl) or, for any other extension,
+        in Chrome trace format (open it in chrome://tracing or Perfetto)
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._lock:
+            events = list(self.events)
+            counters = dict(self.counters)
+            usage = {provider: dict(values) for provider, values in self.usage.items()}
+
+        with open(path, "w", encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                for event in events:
+                    f.write(json.dumps({"type": "span", **event}) + "\n")
+                f.write(json.dumps({"type": "counters", "values": counters}) + "\n")
+                f.write(json.dumps({"type": "usage", "values": usage}) + "\n")
+                return
+
+            pid = os.getpid()
+            trace_events = [
+                {
+                    "name": event["name"],
+                    "cat": event["cat"],
+                    "ph": "X",
+                    "ts": event["start"] * 1e6,
+                    "dur": event["duration"] * 1e6,
+                    "pid": pid,
+                    "tid": event["tid"],
+                    "args": event["args"],
+                }
+                for event in events
+            ]
+            trace_events.extend(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": pid,
+                    "tid": tid,
+                    "args": {"name": name},
+                }
+                for tid, name in {
+                    event["tid"]: event["thread"] for event in events
+                }.items()
+            )
+            json.dump(
+                {
+                    "traceEvents": trace_events,
+                    "otherData": {"counters": counters, "usage": usage},
+                },
+                f,
+            )
+
+
+def get_tracer() -> Tracer | None:
+    return _tracer
+
+
+def set_tracer(tracer: Tracer | None) -> None:
+    global _tracer
+    _tracer = tracer
+
+
+@contextlib.contextmanager
+def _timed_span(tracer: Tracer, name: str, category: str, args: dict):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        tracer.add_span(name, category, started, time.perf_counter() - started, args)
+
+
+def span(name: str, category: str = "stage", **args):
+    """
+    Context manager timing a stage. Does nothing unless tracing is on.
+    """
+    if _tracer is None:
+        return contextlib.nullcontext()
+    return _timed_span(_tracer, name, category, args)
+
+
+def count(name: str, n: int = 1) -> None:
+    """
+    Increment a counter (requests, cache hits...) when tracing is on
+    """
+    if _tracer is not None:
+        _tracer.count(name, n)
+
+
+def record_usage(provider: str, input_tokens: int, output_tokens: int) -> None:
+    """
+    Add the token usage reported by an LLM call when tracing is on
+    """
+    if _tracer is not None:
+        _tracer.add_usage(provider, input_tokens, output_tokens)
+
+
+@contextlib.contextmanager
+def profile_session(
+    summary: bool = False, trace_out: str | None = None, cprofile_out: str | None = None
+) -> Iterator[Tracer | None]:
+    """
+    Trace (and optionally cProfile) the enclosed work. On exit the summary
+    is printed, the trace file written and the cProfile stats dumped as
+    requested. Without any option this does nothing.
+    """
+    if not (summary or trace_out or cprofile_out):
+        yield None
+        return
+
+    tracer = Tracer()
+    set_tracer(tracer)
+    profiler = None
+    if cprofile_out:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        yield tracer
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(cprofile_out)
+            print(f"cProfile stats written to {cprofile_out}")
+        set_tracer(None)
+        if trace_out:
+            tracer.write(trace_out)
+            print(f"Trace written to {trace_out}")
+        if summary:
+            print(f"\n{tracer.summary()}")
@@ -1,12 +1,15 @@
 import os
 import json
+import threading
+from collections import OrderedDict
 from pathlib import Path
 
 from pathlib import Path
-from constants import PROMPT_TEMPLATE
+from constants import LANGUAGES, PROMPT_TEMPLATE
 
 ENV_PATH = Path(".env")
 
+
 def write_env_var(key: str, value: str):
     """
     Create or update a variable inside .env file.
@@ -35,44 +38,71 @@ def is_null(value: any) -> bool:
     return value in [None, "", [], {}]
 
 
-def save_output(
-    output_path: str, tax_id: str | int, content: str, file_type: str = "json"
-) -> None:
-    file_type = file_type.lower().lstrip(".")
+def parse_languages(value: str) -> list[str]:
+    """
+    Language codes of a comma-separated list such as 'EN,PT', without repeats.
+    """
+    codes = list(
+        dict.fromkeys(code.strip().upper() for code in value.split(",") if code.strip())
+    )
+    if not codes or any(code not in LANGUAGES for code in codes):
+        raise ValueError(
+            f"Unsupported language '{value}'. Use {', '.join(LANGUAGES)} or a comma-separated list of them."
+        )
+    return codes
 
-    directory = os.path.dirname(output_path)
-    archive_name = os.path.basename(output_path)
 
-    if directory:
-        os.makedirs(directory, exist_ok=True)
+class LRUCache:
+    """
+    Small thread-safe least-recently-used cache with a bounded size.
+    """
 
-    file_path = (
-        os.path.join(directory, f"{archive_name}.{file_type}")
-        if directory
-        else f"{archive_name}.{file_type}"
-    )
+    _MISSING = object()
 
-    if file_type == "json":
-        if os.path.exists(file_path):
-            with open(file_path, "r", encoding="utf-8") as f:
-                try:
-                    existing_data = json.load(f)
-                except json.JSONDecodeError:
-                    existing_data = {}
-        else:
-            existing_data = {}
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
 
-        existing_data[str(tax_id)] = content
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._data.get(key, self._MISSING)
+            if value is self._MISSING:
+                return default
+            self._data.move_to_end(key)
+            return value
 
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(existing_data, f, indent=4, ensure_ascii=False)
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            return key in self._data
 
-    elif file_type == "txt":
-        with open(file_path, "a", encoding="utf-8") as f:
-            f.write(f"{tax_id}: {content}\n")
+    def set(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
 
-    else:
-        raise ValueError("Unsupported file type. Use 'json' or 'txt'.")
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+def atomic_write_json(path: str, data) -> None:
+    """
+    Write JSON to a temporary file next to path and rename it into place,
+    so readers never see a half-written file.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
 
 
 def set_prompt_text(
@@ -90,8 +120,7 @@ def set_prompt_text(
 
 
 def farwell_to_user():
-    print(
-        """
+    print("""
     ████████╗██╗  ██╗ █████╗ ███╗   ██╗██╗  ██╗    ██╗   ██╗ ██████╗ ██╗   ██╗
     ╚══██╔══╝██║  ██║██╔══██╗████╗  ██║██║ ██╔╝    ╚██╗ ██╔╝██╔═══██╗██║   ██║
        ██║   ███████║███████║██╔██╗ ██║█████╔╝      ╚████╔╝ ██║   ██║██║   ██║
@@ -103,5 +132,4 @@ def farwell_to_user():
                     🧪 THANK YOU FOR USING BIO-J.A.R.V.I.S! 🧪              
                       🔬 See you in the next discovery! 🔬              
     ╚═══════════════════════════════════════════════════════════════════╝
-    """
-    )
+    """)